@@ -0,0 +1,5 @@
+"""
+Benchmarks for WhatsApp Auto Sender
+
+Run from the project root, e.g. ``python -m benchmarks.bench_file_watcher``
+"""
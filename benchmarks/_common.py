@@ -0,0 +1,107 @@
+"""
+Shared helpers for the benchmark scripts
+"""
+
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MAIN_FOLDER_NAME = "منظورة تجربة"
+
+
+def prepare_environment(base_dir: str = None) -> Path:
+    """
+    Point the application at a throwaway watch folder before any src module is imported
+
+    Its data and log folders go there too, so a benchmark never touches the project's
+    data/ or logs/.
+
+    Returns:
+        Path: The folder the application will watch
+    """
+    base_dir = base_dir or tempfile.mkdtemp(prefix="was_bench_")
+    watch_root = Path(base_dir) / MAIN_FOLDER_NAME
+    watch_root.mkdir(parents=True, exist_ok=True)
+    os.environ["DEFAULT_FOLDER_TO_WATCH"] = str(watch_root)
+    os.environ["MAIN_WATCH_FOLDER_NAME"] = MAIN_FOLDER_NAME
+    os.environ["DATA_DIR"] = os.path.join(base_dir, "data")
+    os.environ["LOG_DIR"] = os.path.join(base_dir, "logs")
+    return watch_root
+
+
+def quiet_logger():
+    """Keep benchmark output readable by only letting warnings through"""
+    from src.core.logger import logger
+    logger.logger.setLevel(logging.WARNING)
+
+
+def build_tree(watch_root: Path, folders: int, files_per_folder: int = 1, age: float = 3600) -> None:
+    """Create `folders` contact folders holding `files_per_folder` files each, all `age` seconds old"""
+    mtime = time.time() - age
+    for index in range(folders):
+        folder = watch_root / f"contact_{index:05d}"
+        folder.mkdir(exist_ok=True)
+        for file_index in range(files_per_folder):
+            file_path = folder / f"memo_{file_index}.pdf"
+            file_path.write_bytes(b"%PDF-1.4\n")
+            os.utime(file_path, (mtime, mtime))
+
+
+def read_syscall_counters() -> int:
+    """Return read+write syscalls made by this process so far (Linux only, 0 elsewhere)"""
+    try:
+        with open("/proc/self/io") as io_file:
+            counters = dict(line.split(": ") for line in io_file.read().splitlines())
+        return int(counters["syscr"]) + int(counters["syscw"])
+    except (OSError, KeyError, ValueError):
+        return 0
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in megabytes (0 where unsupported)"""
+    if resource is None:
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class FsCallCounter:
+    """
+    Count filesystem metadata calls (directory listings and stats) while active
+
+    Path.glob, Path.stat and os.walk all go through these os functions, so the count
+    is a portable stand-in for the syscalls a scan costs.
+    """
+
+    FUNCTIONS = ("scandir", "stat", "lstat", "listdir")
+
+    def __init__(self):
+        self.counts = {name: 0 for name in self.FUNCTIONS}
+        self._originals = {}
+
+    def __enter__(self):
+        for name in self.FUNCTIONS:
+            original = getattr(os, name)
+            self._originals[name] = original
+            setattr(os, name, self._wrap(name, original))
+        return self
+
+    def __exit__(self, *exc_info):
+        for name, original in self._originals.items():
+            setattr(os, name, original)
+
+    def _wrap(self, name, original):
+        def counted(*args, **kwargs):
+            self.counts[name] += 1
+            return original(*args, **kwargs)
+        return counted
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
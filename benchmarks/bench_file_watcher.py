@@ -0,0 +1,92 @@
+"""
+Idle-cost benchmark for the FileWatcher backends
+
+Builds a synthetic watch tree (10k contact folders by default) in which nothing changes
+and measures, per idle second, the CPU time and filesystem calls spent by the polling
+backend and by the watchdog backend.
+
+Usage:
+    python -m benchmarks.bench_file_watcher [--folders 10000] [--seconds 5]
+"""
+
+import argparse
+import json
+import time
+
+from benchmarks._common import (FsCallCounter, build_tree, prepare_environment, quiet_logger,
+                                read_syscall_counters)
+
+
+def measure_polling(watcher, seconds: int) -> dict:
+    """Run one poll per simulated idle second, exactly like each polling FileWatcher.step does"""
+    # The first poll builds the directory index, like the watchdog observer registering its watches
+    setup_start = time.perf_counter()
+    watcher._check_files()
+    setup_seconds = time.perf_counter() - setup_start
+
+    with FsCallCounter() as counter:
+        syscalls_before = read_syscall_counters()
+        cpu_before = time.process_time()
+        for _ in range(seconds):
+            watcher._check_files()
+        cpu = time.process_time() - cpu_before
+        syscalls = read_syscall_counters() - syscalls_before
+    return {
+        "setup_seconds": setup_seconds,
+        "cpu_seconds_per_idle_second": cpu / seconds,
+        "fs_calls_per_idle_second": counter.total / seconds,
+        "fs_calls_breakdown": {name: count / seconds for name, count in counter.counts.items()},
+        "io_syscalls_per_idle_second": syscalls / seconds,
+    }
+
+
+def measure_watchdog(watcher, seconds: int) -> dict:
+    """Start the event backend, then measure the process while the tree stays idle"""
+    setup_start = time.perf_counter()
+    # Idle, the observer thread is all the watcher runs: there is nothing for step() to do
+    watcher.open()
+    # Give the observer time to register its watches before measuring the idle period
+    time.sleep(1)
+    setup_seconds = time.perf_counter() - setup_start
+
+    with FsCallCounter() as counter:
+        syscalls_before = read_syscall_counters()
+        cpu_before = time.process_time()
+        time.sleep(seconds)
+        cpu = time.process_time() - cpu_before
+        syscalls = read_syscall_counters() - syscalls_before
+
+    backend = watcher.active_backend
+    watcher.close()
+    return {
+        "active_backend": backend,
+        "setup_seconds": setup_seconds,
+        "cpu_seconds_per_idle_second": cpu / seconds,
+        "fs_calls_per_idle_second": counter.total / seconds,
+        "fs_calls_breakdown": {name: count / seconds for name, count in counter.counts.items()},
+        "io_syscalls_per_idle_second": syscalls / seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folders", type=int, default=10000, help="number of contact folders to create")
+    parser.add_argument("--seconds", type=int, default=5, help="idle seconds to measure per backend")
+    args = parser.parse_args()
+
+    watch_root = prepare_environment()
+    build_tree(watch_root, args.folders)
+
+    from src.core.file_watcher import FileWatcher
+    quiet_logger()
+
+    results = {
+        "folders": args.folders,
+        "polling": measure_polling(FileWatcher(str(watch_root), lambda path: None, backend="polling"), args.seconds),
+        "watchdog": measure_watchdog(FileWatcher(str(watch_root), lambda path: None, backend="watchdog"), args.seconds),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+End-to-end pipeline benchmark: replay file-drop traces through the whole application
+
+Writes the files of a trace into a synthetic watch tree at the trace's times and runs
+them through the real pipeline: the Orchestrator driving FileWatcher, stability detection,
+coalescer, priority queue, senders, process_files and WhatsAppSender, sending to the fake transport
+with a configurable latency. It reports detection lag (file written -> detected),
+end-to-end latency (file written -> notification sent), throughput and peak RSS.
+
+Built-in synthetic traces:
+    trickle  one file every --interval seconds, spread over --contacts contacts
+    burst    500 files at once (--files), spread over --contacts contacts
+    deep     files eight folders below their contact folder, one every --interval seconds
+A recorded trace is a JSON file {"name": ..., "events": [{"t": 0.0, "path": "acme/memo.pdf", "size": 1024}]}
+with `t` in seconds from the start and `path` relative to the watched folder;
+--save-trace writes a synthetic trace in that format.
+
+Results are printed as JSON and can be stored with --output. --compare reads an earlier
+result and reports the change of the key metrics, failing with exit code 1 when one got
+worse by more than --max-regression, so runs can be compared between commits.
+
+Usage:
+    python -m benchmarks.bench_pipeline [--scenario trickle|burst|deep|all] [--latency 0.05]
+    python -m benchmarks.bench_pipeline --trace drops.json --output results.json --compare baseline.json
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks._common import peak_rss_mb, prepare_environment, quiet_logger
+
+SCENARIOS = ("trickle", "burst", "deep")
+# Metrics compared by --compare, and whether a higher value is better
+COMPARED_METRICS = {
+    ("detection_lag_seconds", "p50"): False,
+    ("end_to_end_seconds", "p50"): False,
+    ("end_to_end_seconds", "p99"): False,
+    ("throughput_files_per_second",): True,
+    ("peak_rss_mb",): False,
+}
+
+
+def synthetic_trace(scenario: str, files: int, contacts: int, interval: float, seed: int = 1) -> dict:
+    """Build one of the built-in traces"""
+    rng = random.Random(seed)
+    events = []
+    for index in range(files):
+        contact = f"contact_{rng.randrange(contacts):03d}"
+        if scenario == "trickle":
+            t, path = index * interval, f"{contact}/memo_{index:05d}.pdf"
+        elif scenario == "burst":
+            t, path = 0.0, f"{contact}/memo_{index:05d}.pdf"
+        elif scenario == "deep":
+            nested = "/".join(f"level_{depth}" for depth in range(8))
+            t, path = index * interval, f"{contact}/{nested}/memo_{index:05d}.pdf"
+        else:
+            raise ValueError(f"Unknown scenario: {scenario}")
+        events.append({"t": t, "path": path, "size": rng.randint(10_000, 200_000)})
+    return {"name": scenario, "events": events}
+
+
+def load_trace(path: str) -> dict:
+    with open(path, 'r', encoding='utf-8') as file:
+        trace = json.load(file)
+    trace.setdefault("name", os.path.splitext(os.path.basename(path))[0])
+    trace["events"].sort(key=lambda event: event["t"])
+    return trace
+
+
+def percentiles(values: list) -> dict:
+    """p50/p90/p99/max/mean of a list of seconds"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def at(fraction: float) -> float:
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+    return {"count": len(ordered), "p50": at(0.5), "p90": at(0.9), "p99": at(0.99), "max": ordered[-1],
+            "mean": sum(ordered) / len(ordered)}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def replay(trace: dict, args) -> dict:
+    """Run one trace through the pipeline in this process and return its measurements"""
+    base_dir = tempfile.mkdtemp(prefix="was_bench_")
+    watch_root = prepare_environment(base_dir)
+    # The pipeline reads these when it is imported
+    os.environ["WHATSAPP_TRANSPORT"] = "fake"
+    os.environ["FAKE_TRANSPORT_LATENCY"] = str(args.latency)
+    os.environ["STABILITY_QUIET_PERIOD"] = str(args.quiet_period)
+    os.environ["COALESCE_WINDOW"] = str(args.window)
+    os.environ["SENDER_WORKERS"] = str(args.workers)
+    quiet_logger()
+
+    import run
+    from src.core.coalescer import NotificationCoalescer
+    from src.core.config import config
+    from src.core.file_watcher import FileWatcher
+    from src.core.orchestrator import Orchestrator
+    from src.core.priority import PriorityPolicy, PriorityWorkQueue
+    from src.whatsapp.sender import WhatsAppSender
+    from src.whatsapp.session import get_session
+
+    written_at, detected_at, sent_at = {}, {}, {}
+    batches = []
+    done = threading.Event()
+    expected = {os.path.join(str(watch_root), *event["path"].split("/")) for event in trace["events"]}
+
+    def on_detected(path: str) -> None:
+        detected_at.setdefault(path, time.time())
+        run.on_file_detected(coalescer, path)
+
+    def handler(batch: list) -> bool:
+        sent = run.process_files(batch)
+        if sent is True:
+            now = time.time()
+            batches.append(len(batch))
+            for path in batch:
+                sent_at.setdefault(path, now)
+            if expected.issubset(sent_at):
+                done.set()
+        return sent
+
+    # Wired like run.main, the event loop runs on a thread while this one writes the trace
+    sender = WhatsAppSender()
+    work_queue = PriorityWorkQueue(PriorityPolicy.from_settings(
+        config.settings["priorities"], folder_func=sender.get_contact_and_folder))
+    orchestrator = Orchestrator(work_queue, handler, breaker=run.circuit_breaker, sender_count=args.workers)
+    run.retry_scheduler.requeue = work_queue.put
+    run.retry_scheduler.timer = orchestrator.call_later
+    coalescer = NotificationCoalescer(sender.get_batch_key, work_queue.put)
+    watcher = FileWatcher(str(watch_root), on_detected, backend=args.backend)
+    orchestrator.add_watcher(watcher)
+    orchestrator.on_shutdown(coalescer.stop)
+    orchestrator.on_shutdown(run.retry_scheduler.stop)
+    orchestrator.on_shutdown(lambda: get_session().close(), after_drain=True)
+    runtime = threading.Thread(target=orchestrator.run, name="orchestrator", daemon=True)
+    runtime.start()
+    wait_until_watching(watcher)
+
+    start = time.time()
+    for event in trace["events"]:
+        delay = start + event["t"] - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        path = os.path.join(str(watch_root), *event["path"].split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(b"%PDF-1.4\n" + b"0" * max(int(event.get("size", 1024)) - 9, 0))
+        written_at.setdefault(path, time.time())
+    finished = done.wait(args.timeout)
+    end = max(sent_at.values(), default=time.time())
+
+    orchestrator.stop()
+    runtime.join()
+
+    detection = [detected_at[path] - written_at[path] for path in written_at if path in detected_at]
+    end_to_end = [sent_at[path] - written_at[path] for path in written_at if path in sent_at]
+    return {
+        "trace": trace["name"],
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {"backend": watcher.active_backend, "latency": args.latency, "quiet_period": args.quiet_period,
+                     "window": args.window, "workers": args.workers},
+        "files": len(expected),
+        "files_sent": len(sent_at),
+        "completed": finished,
+        "notifications": len(batches),
+        "detection_lag_seconds": percentiles(detection),
+        "end_to_end_seconds": percentiles(end_to_end),
+        "throughput_files_per_second": len(sent_at) / (end - start) if end > start else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def wait_until_watching(watcher, timeout: float = 30) -> None:
+    """Wait until the watcher has recorded its baseline, files written before that are not notified"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if watcher.active_backend == "watchdog" or (watcher.active_backend == "polling" and not watcher._baseline_scan):
+            return
+        time.sleep(0.01)
+    raise RuntimeError("File watcher did not start")
+
+
+def compare(result: dict, baseline: dict, max_regression: float) -> list:
+    """Relative change of the key metrics, returns the ones that regressed beyond max_regression"""
+    regressions = []
+    for keys, higher_is_better in COMPARED_METRICS.items():
+        new, old = result, baseline
+        for key in keys:
+            new, old = (new or {}).get(key), (old or {}).get(key)
+        if not new or not old:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        name = ".".join(keys)
+        print(f"{name}: {old:.4g} -> {new:.4g} ({change:+.1%})", file=sys.stderr)
+        if worse > max_regression:
+            regressions.append(name)
+    return regressions
+
+
+def run_scenarios_in_subprocesses(args) -> list:
+    """Every scenario gets a fresh interpreter, the application keeps process-wide state"""
+    results = []
+    for scenario in SCENARIOS:
+        command = [sys.executable, "-m", "benchmarks.bench_pipeline", "--scenario", scenario,
+                   "--latency", str(args.latency), "--quiet-period", str(args.quiet_period),
+                   "--window", str(args.window), "--workers", str(args.workers), "--backend", args.backend,
+                   "--contacts", str(args.contacts), "--interval", str(args.interval), "--timeout", str(args.timeout)]
+        if args.files:
+            command += ["--files", str(args.files)]
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run(command, cwd=project_root, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="trickle", help="built-in trace to replay")
+    parser.add_argument("--trace", help="recorded trace (JSON) to replay instead of a built-in one")
+    parser.add_argument("--save-trace", help="write the built-in trace to this file and exit")
+    parser.add_argument("--files", type=int, help="files in a built-in trace (trickle 50, burst 500, deep 100)")
+    parser.add_argument("--contacts", type=int, default=20, help="contact folders in a built-in trace")
+    parser.add_argument("--interval", type=float, default=0.05, help="seconds between files for trickle and deep")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake WhatsApp step")
+    parser.add_argument("--quiet-period", type=float, default=0.5, help="stability quiet period in seconds")
+    parser.add_argument("--window", type=float, default=0.5, help="coalescing window in seconds")
+    parser.add_argument("--workers", type=int, default=1, help="concurrent senders")
+    parser.add_argument("--backend", choices=("polling", "watchdog", "auto"), default="polling", help="watcher backend")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for all notifications")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--compare", help="earlier results (JSON) to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="tolerated relative regression for --compare")
+    args = parser.parse_args()
+
+    if args.scenario == "all" and not args.trace:
+        results = run_scenarios_in_subprocesses(args)
+    else:
+        if args.trace:
+            trace = load_trace(args.trace)
+        else:
+            default_files = {"trickle": 50, "burst": 500, "deep": 100}[args.scenario]
+            trace = synthetic_trace(args.scenario, args.files or default_files, args.contacts, args.interval)
+        if args.save_trace:
+            with open(args.save_trace, 'w', encoding='utf-8') as file:
+                json.dump(trace, file, indent=1)
+            return
+        results = [replay(trace, args)]
+
+    output = results[0] if len(results) == 1 else results
+    print(json.dumps(output, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(output, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        baselines = {entry["trace"]: entry for entry in (baseline if isinstance(baseline, list) else [baseline])}
+        regressions = []
+        for result in results:
+            if result["trace"] in baselines:
+                print(f"[{result['trace']}]", file=sys.stderr)
+                regressions += [f"{result['trace']}: {name}" for name in
+                                compare(result, baselines[result["trace"]], args.max_regression)]
+        if regressions:
+            print(f"Regressions beyond {args.max_regression:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Routing benchmark: resolving contact, relative folder and link for many file paths
+
+Generates synthetic file paths below a few watch roots (nothing is written to disk) and
+compares the per-file linear resolution (innermost root by scanning all roots,
+`parts.index` of the main folder, `relative_to` and quoting the link every time) with
+the RoutingTable trie, once with every folder new to it and once with its memo warm.
+
+Usage:
+    python -m benchmarks.bench_routing [--paths 100000] [--folders 2000] [--roots 4]
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+import urllib.parse
+from pathlib import Path
+
+from benchmarks._common import MAIN_FOLDER_NAME, prepare_environment, quiet_logger
+
+
+def make_paths(roots, count: int, folders: int, seed: int = 1) -> list:
+    """`count` file paths spread over `folders` contact folders per root, some in subfolders"""
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        root = roots[i % len(roots)]
+        parts = [root.folder_to_watch, f"عميل {rng.randrange(folders)}"]
+        if rng.random() < 0.5:
+            parts.append(f"جلسة {rng.randrange(5)}")
+        parts.append(f"file_{i}.pdf")
+        paths.append(os.path.join(*parts))
+    return paths
+
+
+def resolve_linear(roots, file_path: str) -> tuple:
+    """How a file was resolved before the routing table"""
+    # Innermost root containing the file, by checking every root
+    matches = [root for root in roots if root.contains(file_path)]
+    if not matches:
+        raise Exception(f"File is not inside any watch root: {file_path}")
+    root = max(matches, key=lambda root: len(root.folder_to_watch))
+
+    # Contact folder counted from the main folder, relative folder from the watched folder
+    path = Path(file_path)
+    parts = path.absolute().parts
+    index = parts.index(root.main_folder_name)
+    if index + root.contact_level >= len(parts) - 1:
+        raise Exception(f"No folder found {root.contact_level} level(s) below '{root.main_folder_name}' in path: {file_path}")
+    contact = parts[index + root.contact_level]
+    try:
+        relative_folder = str(path.parent.relative_to(root.folder_to_watch))
+    except ValueError:
+        relative_folder = path.parent.name
+    return contact, relative_folder, root.root_path + "/" + urllib.parse.quote(contact)
+
+
+def measure(resolve, paths: list) -> dict:
+    start = time.perf_counter()
+    for path in paths:
+        resolve(path)
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "microseconds_per_path": seconds / len(paths) * 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paths", type=int, default=100000, help="number of file paths to resolve")
+    parser.add_argument("--folders", type=int, default=2000, help="contact folders per watch root")
+    parser.add_argument("--roots", type=int, default=4, help="number of watch roots")
+    args = parser.parse_args()
+
+    base = prepare_environment().parent
+    quiet_logger()
+    from src.core.routing import RoutingRule, RoutingTable
+    from src.core.watch_roots import WatchRoot
+
+    roots = [WatchRoot(f"root{i}", str(base / f"root{i}" / MAIN_FOLDER_NAME), "https://example.invalid/docs",
+                       "template.txt") for i in range(args.roots)]
+    rules = [RoutingRule(os.path.join(roots[0].folder_to_watch, f"عميل {i}"), priority="urgent") for i in range(10)]
+    paths = make_paths(roots, args.paths, args.folders)
+
+    # Both must agree before their speed is compared
+    table = RoutingTable(roots, rules, cache_size=args.paths)
+    for path in paths[:1000]:
+        route = table.resolve(path)
+        assert (route.contact, route.relative_folder, route.link) == resolve_linear(roots, path), path
+
+    results = {
+        "paths": args.paths,
+        "roots": args.roots,
+        "linear": measure(lambda path: resolve_linear(roots, path), paths),
+        # Every path walks the trie, as if each file were in a folder seen for the first time
+        "trie_cold": measure(lambda path: table._resolve_folder(os.path.dirname(path), path), paths),
+    }
+    table.clear_cache()
+    measure(table.resolve, paths)
+    results["trie_memoized"] = measure(table.resolve, paths)
+    results["speedup_memoized"] = results["linear"]["seconds"] / results["trie_memoized"]["seconds"]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
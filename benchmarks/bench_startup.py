@@ -0,0 +1,85 @@
+"""
+Startup benchmark: import cost and time to the first completed poll
+
+Each measurement runs in a fresh interpreter so nothing is cached in sys.modules. It
+reports how long importing run.py takes, whether the import left side effects behind
+(config built, log file opened, GUI libraries loaded), and how long it then takes to
+build the config and finish the first poll of a synthetic watch tree.
+
+Usage:
+    python -m benchmarks.bench_startup [--folders 1000] [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks._common import build_tree, prepare_environment
+
+PROBE = r"""
+import json, sys, time
+start = time.perf_counter()
+import run
+imported = time.perf_counter()
+
+import src.core.config as config_module
+import src.core.logger as logger_module
+side_effects = {
+    "config_built": config_module._config is not None,
+    "logger_configured": logger_module.logger._logger is not None,
+    "gui_modules_loaded": sorted(name for name in ("pyautogui", "pywinauto", "selenium") if name in sys.modules),
+}
+
+from src.core.config import config
+from src.core.file_watcher import FileWatcher
+watcher = FileWatcher(config.folder_to_watch, lambda path: None, backend="polling")
+configured = time.perf_counter()
+watcher._check_files()
+polled = time.perf_counter()
+
+print(json.dumps({
+    "import_seconds": imported - start,
+    "config_and_watcher_seconds": configured - imported,
+    "first_poll_seconds": polled - configured,
+    "total_seconds": polled - start,
+    "side_effects": side_effects,
+}))
+"""
+
+
+def run_probe(project_root: str) -> dict:
+    """Run one cold start in a subprocess and return its timings"""
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=project_root, env=os.environ.copy(),
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folders", type=int, default=1000, help="number of contact folders to create")
+    parser.add_argument("--runs", type=int, default=5, help="number of cold starts to measure")
+    args = parser.parse_args()
+
+    base_dir = tempfile.mkdtemp(prefix="was_bench_")
+    watch_root = prepare_environment(base_dir)
+    build_tree(watch_root, args.folders)
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    runs = [run_probe(project_root) for _ in range(args.runs)]
+    summary = {
+        key: {"median": statistics.median(run[key] for run in runs), "max": max(run[key] for run in runs)}
+        for key in ("import_seconds", "config_and_watcher_seconds", "first_poll_seconds", "total_seconds")
+    }
+    summary["folders"] = args.folders
+    summary["side_effects_at_import"] = runs[0]["side_effects"]
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
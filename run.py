@@ -8,85 +8,214 @@ Purpose : This script monitors a specific folder for new files and sends a Whats
 Modules :
     - config: Contains configuration settings like folder paths.
     - logger: Handles logging of information and errors.
-    - file_watcher: Watches a directory for new files.
+    - orchestrator: One asyncio event loop hosting the watchers, senders, retry timers and periodic tasks.
+    - file_watcher: Watches a directory for new files, one watcher per configured watch root.
+    - coalescer: Collapses bursts of files for the same contact into one notification.
+    - work_queue: Hands detected files to the senders so detection never waits on sending.
+    - priority: Orders queued notifications by folder, file type and age.
     - sender: Sends WhatsApp messages using an internal API.
-    - screenshot_utils: Takes screenshots on failure for diagnostics.
+    - retry: Retries failed sends with backoff and pauses sending while WhatsApp is unhealthy.
+    - diagnostics: Captures screenshots or element-tree dumps on failure, off the sender thread and rate-limited.
+    - outbox: Durable delivery state, unfinished notifications are replayed after a restart.
+    - metrics: Counters, histograms and stage timings, exported when METRICS_ENABLED is set.
 """
 
 # Importing required standard and custom modules
 import os                    # For interacting with the operating system (like checking/creating directories)
 import time                  # For handling time-based operations (like delays)
 import sys                   # For system-level operations like exiting the script
+import argparse              # Command-line options, the highest settings layer
+from typing import Union     # process_files returns True, False or REQUEUED
 
 # Importing internal project modules
-from src.core.config import config                   # Configuration settings (e.g., folder paths)
+from src.core.config import config, configure        # Configuration settings (e.g., folder paths)
 from src.core.logger import logger                   # Custom logger for logging information and errors
 from src.core.file_watcher import FileWatcher        # Class that monitors a folder for new files
+from src.core.coalescer import NotificationCoalescer  # Batches files per contact within a debounce window
+from src.core.work_queue import REQUEUED             # Outcome of a batch handed back to the queue for a retry
+from src.core.orchestrator import Orchestrator      # Event loop running watchers, senders and periodic tasks
+from src.core.priority import PriorityPolicy, PriorityWorkQueue  # Most urgent notifications are sent first
 from src.whatsapp.sender import WhatsAppSender       # Class responsible for sending WhatsApp messages
-from src.core.screenshot_utils import take_screenshot  # Utility function for taking screenshots on error
-from src.core.constants import MAX_RETRIES, RETRY_DELAY
+from src.whatsapp.session import get_session         # WhatsApp session shared by all sends
+from src.whatsapp.waits import wait_stats            # Observed UI wait times for tuning timeouts
+from src.core.diagnostics import get_diagnostics     # Rate-limited screenshots/element dumps on failure
+from src.core.metrics import metrics, start_metrics_exporter  # Pipeline metrics and their exporter
+from src.core.outbox import SENT, FAILED, get_outbox  # Durable record of every detected file until it is sent
+from src.core.retry import CircuitBreaker, RetryPolicies, RetryScheduler  # Backoff per error class, pause while WhatsApp is down
+from src.core.constants import METRICS_ENABLED, DIAGNOSTICS_TREE_DEPTH, SETTINGS_RELOAD_INTERVAL, WORK_QUEUE_STATS_INTERVAL
+from src.core.whatsapp_constants import SESSION_IDLE_CHECK_INTERVAL
 
-def process_file(file_path: str):
+# Attempts per batch and the pause switch for all sends, shared by the senders
+retry_scheduler = RetryScheduler()
+circuit_breaker = CircuitBreaker(probe=lambda: get_session().probe())
+
+@metrics.timed("process")
+def process_files(file_paths: list) -> Union[bool, str]:
     """
-    Attempts to process a detected file by sending a WhatsApp notification.
-    Retries up to MAX_RETRIES if an exception occurs, and logs the outcome.
+    Attempts to process a batch of detected files for one contact by sending a single
+    WhatsApp notification, and logs the outcome. A failed attempt is retried according to
+    the retry policy for its error: handed back to the work queue after its backoff when
+    retry_scheduler has one (REQUEUED is returned then), otherwise after waiting here.
+    Runs on the WhatsApp UI executor, never on the event loop or a watcher.
     """
-    for attempt in range(1, MAX_RETRIES + 1):
+    file_path = ", ".join(file_paths)
+    outbox = get_outbox()
+    start_time = time.time()
+    contact_name = ""
+    if metrics.enabled:
+        try:
+            contact_name = config.route_for(file_paths[0]).contact
+        except Exception:
+            pass  # The send below fails too, logs why and marks the batch in the outbox
+    while True:
+        attempt = retry_scheduler.attempts(file_paths) + 1
         try:
             logger.log_info(f"Processing file: {file_path} (Attempt {attempt})")
-            sender = WhatsAppSender()
-            if sender.notify_file_ready(file_path):
+            metrics.inc("send_attempts_total", help_text="Notification attempts, retries included", contact=contact_name)
+            sender = WhatsAppSender(outbox=outbox)
+            if sender.notify_files_ready(file_paths):
+                outbox.mark(file_paths, SENT)
+                retry_scheduler.succeeded(file_paths)
+                circuit_breaker.record_success()
                 logger.log_info(f"Successfully sent notification for file: {file_path}")
-                break
-            else:
-                error_msg = f"Failed to send notification for file: {file_path}"
-                logger.log_error(None, error_msg)
-                if attempt < MAX_RETRIES:
-                    time.sleep(RETRY_DELAY)
-                else:
-                    take_screenshot("Error")
-                    logger.log_error(None, error_msg)
+                logger.log_performance(f"Notification for {file_path}", start_time)
+                metrics.inc("notifications_total", help_text="Notifications by outcome", result="sent")
+                return True
+            error = Exception(f"Failed to send notification for file: {file_path}")
+            logger.log_error(None, str(error))
         except Exception as e:
+            error = e
             logger.log_error(e, f"Error processing file {file_path} on attempt {attempt}")
-            if attempt < MAX_RETRIES:
-                time.sleep(RETRY_DELAY)
-            else:
-                take_screenshot("file_check_error")
-                logger.log_error(e, f"All {MAX_RETRIES} attempts raised errors for file: {file_path}")
 
-def main():
+        if retry_scheduler.policies.for_error(error).trips_breaker:
+            circuit_breaker.record_failure()
+        delay = retry_scheduler.next_delay(file_paths, error)
+        if delay is None:
+            break
+        if retry_scheduler.requeue is not None:
+            logger.log_info(f"Retrying {file_path} in {delay:.1f}s")
+            retry_scheduler.schedule(file_paths, delay)
+            return REQUEUED
+        time.sleep(delay)
+
+    get_diagnostics().capture(type(error).__name__, "file_check_error", element_tree=get_session().take_failure_tree())
+    logger.log_error(error, f"All {attempt} attempts failed for file: {file_path}")
+    outbox.mark(file_paths, FAILED, str(error))
+    metrics.inc("notifications_total", help_text="Notifications by outcome", result="failed")
+    return False
+
+def replay_outbox(coalescer: NotificationCoalescer) -> None:
+    """Re-queue files whose notification was not sent before the last shutdown or crash"""
+    outbox = get_outbox()
+    outbox.purge()
+    pending = outbox.pending()
+    if not pending:
+        return
+    logger.log_info(f"Replaying {len(pending)} unfinished notifications from the outbox")
+    for file_path in pending:
+        if not os.path.exists(file_path):
+            outbox.mark([file_path], FAILED, "File no longer exists")
+            logger.log_warning(f"Dropping outbox entry for missing file: {file_path}")
+            continue
+        coalescer.add(file_path)
+
+def on_file_detected(coalescer: NotificationCoalescer, file_path: str) -> None:
+    """Record a detected file in the outbox before it enters the in-memory pipeline"""
+    get_outbox().record_detected(file_path)
+    coalescer.add(file_path)
+
+def on_handoff_failed(file_paths: list, error: Exception) -> None:
+    """A batch that could not be queued is never sent, fail it instead of replaying it at every start"""
+    get_outbox().mark(file_paths, FAILED, f"Could not queue notification: {error}")
+
+def create_watcher(root, coalescer: NotificationCoalescer) -> FileWatcher:
+    """Create the watcher for one watch root, it is driven by the orchestrator"""
+    # Ensure the folder to watch exists
+    if not os.path.exists(root.folder_to_watch):
+        os.makedirs(root.folder_to_watch, exist_ok=True)
+        logger.log_info(f"Created folder: {root.folder_to_watch}")
+
+    watcher = FileWatcher(root.folder_to_watch, lambda path: on_file_detected(coalescer, path),
+                          index_file=root.index_file, file_filter=root.file_filter)
+    logger.log_info(f"Watching folder: {root.folder_to_watch} ({root.name})")
+    return watcher
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Command-line options: another settings file and individual settings"""
+    parser = argparse.ArgumentParser(description="Send WhatsApp notifications for new files in watched folders")
+    parser.add_argument("--config", help="settings file to use instead of resources/config.yaml")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="override a setting, e.g. --set retry_attempts=5 or --set logging.level=DEBUG (repeatable)")
+    args = parser.parse_args(argv)
+    args.overrides = {}
+    for item in args.set:
+        key, separator, value = item.partition("=")
+        if not separator:
+            parser.error(f"--set expects KEY=VALUE, got {item!r}")
+        args.overrides[key.strip()] = value.strip()
+    return args
+
+def apply_reloaded_settings(watchers: dict, changed: list) -> None:
+    """Hand reloaded settings to the parts of the running pipeline that keep their own copy"""
+    retry_scheduler.policies = RetryPolicies.from_settings(config.settings)
+    for root in config.watch_roots:
+        watcher = watchers.get(root.name)
+        if watcher is not None:
+            watcher.update_settings(root.file_filter)
+
+def main(argv=None):
     """
-    Initializes the folder watcher and keeps the application running indefinitely.
-    Handles all exceptions gracefully and ensures the application never terminates unexpectedly.
+    Runs the watchers, senders and periodic tasks on one event loop until Ctrl+C or SIGTERM,
+    then stops detecting, sends what is already queued and exits.
     """
-    while True:
-        try:
-            # Ensure the folder to watch exists
-            if not os.path.exists(config.folder_to_watch):
-                os.makedirs(config.folder_to_watch, exist_ok=True)
-                logger.log_info(f"Created folder: {config.folder_to_watch}")
-
-            # Initialize and start watching the folder
-            watcher = FileWatcher(config.folder_to_watch, process_file)
-            watcher.start()
-
-            logger.log_info("WhatsApp Auto Sender started. Monitoring for files...")
-            logger.log_info(f"Watching folder: {config.folder_to_watch}")
-            logger.log_info("Press Ctrl+C to stop the application")
-
-            # Keep the script running indefinitely
-            while True:
-                time.sleep(1)
-        except KeyboardInterrupt:
-            logger.log_info("Stopping WhatsApp Auto Sender...")
-            try:
-                watcher.stop()
-            except Exception:
-                pass
-            sys.exit(0)
-        except Exception as e:
-            logger.log_error(e, "Unhandled exception in main loop. Application will recover and continue running.")
-            time.sleep(5)  # Wait a bit before retrying the main loop
+    args = parse_args(argv)
+    configure(args.overrides, args.config)
+    if METRICS_ENABLED:
+        start_metrics_exporter(data_dir=config.data_dir)
+    # The element tree of a failed send is dumped on the UI thread before the session resets
+    get_session().keep_failure_tree = get_diagnostics().wants_element_tree
+    get_session().tree_depth = DIAGNOSTICS_TREE_DEPTH
+
+    retry_scheduler.policies = RetryPolicies.from_settings(config.settings)
+    sender = WhatsAppSender()
+    work_queue = PriorityWorkQueue(PriorityPolicy.from_settings(
+        config.settings["priorities"], folder_func=sender.get_contact_and_folder, route_func=lambda path: config.route_for(path).priority))
+    orchestrator = Orchestrator(work_queue, process_files, breaker=circuit_breaker)
+    # Backoffs are loop timers instead of a scheduler thread
+    retry_scheduler.requeue = work_queue.put
+    retry_scheduler.timer = orchestrator.call_later
+    coalescer = NotificationCoalescer(sender.get_batch_key, work_queue.put, error_callback=on_handoff_failed)
+    replay_outbox(coalescer)
+
+    # One watcher per watch root, all feeding the same coalescer and queue
+    watchers = {root.name: create_watcher(root, coalescer) for root in config.watch_roots}
+    for watcher in watchers.values():
+        orchestrator.add_watcher(watcher)
+    config.on_reload(lambda changed: apply_reloaded_settings(watchers, changed))
+    # Apply config.yaml changes without restarting anything
+    orchestrator.every(SETTINGS_RELOAD_INTERVAL, config.reload_if_changed, "settings reload")
+    # Closing an idle WhatsApp is UI automation, so it runs on the UI executor between sends
+    orchestrator.every(SESSION_IDLE_CHECK_INTERVAL, get_session().close_if_idle, "idle session check", ui=True)
+    orchestrator.every(WORK_QUEUE_STATS_INTERVAL, lambda: logger.log_info(f"Work queue stats: {work_queue.stats()}"),
+                       "work queue stats")
+    # Release coalesced batches into the queue before it is drained, pending retries stay in the outbox
+    orchestrator.on_shutdown(coalescer.stop)
+    orchestrator.on_shutdown(retry_scheduler.stop)
+    orchestrator.on_shutdown(lambda: get_session().close(), after_drain=True)
+
+    logger.log_info("WhatsApp Auto Sender started. Monitoring for files...")
+    logger.log_info("Press Ctrl+C to stop the application")
+    orchestrator.run()
+
+    logger.log_info(f"Work queue stats: {work_queue.stats()}")
+    logger.log_info(f"Outbox: {get_outbox().counts()}")
+    for root in config.watch_roots:
+        logger.log_info(f"File filter matches ({root.name}): {root.file_filter.stats()}")
+    get_outbox().close()
+    wait_stats.log_summary()
+    get_diagnostics().flush()
+    logger.log_info(f"Diagnostics: {get_diagnostics().stats()}")
+    sys.exit(0)
 
 # Entry point of the script
 if __name__ == "__main__":
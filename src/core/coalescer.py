@@ -0,0 +1,151 @@
+"""
+Per-contact coalescing of detected files into notification batches
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional
+from src.core.constants import *
+from src.core.logger import logger
+
+
+class _Batch:
+    """Files collected for one contact while its debounce window is open"""
+
+    __slots__ = ("files", "first_added", "last_added")
+
+    def __init__(self, now: float):
+        self.files = []
+        self.first_added = now
+        self.last_added = now
+
+
+class NotificationCoalescer:
+    """
+    Collapse bursts of files for the same contact into one batch
+
+    A contact's batch is released once no new file arrived for `window` seconds, or at
+    the latest `max_wait` seconds after its first file, so a steady trickle still goes out.
+    A single timer thread sleeps until the next deadline, there is no busy waiting.
+    Files added after stop() are handed off at once, one batch each.
+    """
+
+    def __init__(self, key_func: Callable[[str], str], flush_callback: Callable[[List[str]], None],
+                 window: float = COALESCE_WINDOW, max_wait: float = COALESCE_MAX_WAIT,
+                 error_callback: Optional[Callable[[List[str], Exception], None]] = None):
+        """
+        Args:
+            key_func: Returns the contact a file belongs to
+            flush_callback: Receives the list of files collected for one contact
+            window: Debounce window in seconds, 0 disables coalescing
+            max_wait: Upper bound in seconds on how long a batch is held back
+            error_callback: Receives a batch and the error when flush_callback failed on it
+        """
+        self.key_func = key_func
+        self.flush_callback = flush_callback
+        self.error_callback = error_callback
+        self.window = window
+        self.max_wait = max(max_wait, window)
+        self._batches: "OrderedDict[str, _Batch]" = OrderedDict()
+        self._condition = threading.Condition()
+        self._running = False
+        self._stopped = False
+        self._thread = None
+        self.files_added = 0
+        self.batches_flushed = 0
+
+    def add(self, file_path: str) -> None:
+        """Add a detected file to its contact's batch"""
+        if self.window <= 0:
+            self._flush(file_path, [file_path])
+            return
+
+        try:
+            key = self.key_func(file_path)
+        except Exception as e:
+            # Queued on its own: its priority falls back to the folder rules, the sender fails it with the real error
+            logger.log_error(e, f"Could not determine contact for {file_path}, sending it without coalescing")
+            self._flush(file_path, [file_path])
+            return
+
+        with self._condition:
+            if not self._stopped:
+                now = time.time()
+                batch = self._batches.get(key)
+                if batch is None:
+                    batch = self._batches[key] = _Batch(now)
+                if file_path not in batch.files:
+                    batch.files.append(file_path)
+                batch.last_added = now
+                self.files_added += 1
+                self._ensure_thread()
+                self._condition.notify()
+                return
+        # Added during shutdown: no timer thread would release its batch any more
+        self._flush(key, [file_path])
+
+    def flush_all(self) -> None:
+        """Release every pending batch immediately"""
+        with self._condition:
+            batches = list(self._batches.items())
+            self._batches.clear()
+        for key, batch in batches:
+            self._flush(key, batch.files)
+
+    def stop(self) -> None:
+        """Stop the timer thread and release pending batches, later files are not coalesced"""
+        with self._condition:
+            self._stopped = True
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush_all()
+
+    def pending(self) -> int:
+        """Number of files waiting in open batches"""
+        with self._condition:
+            return sum(len(batch.files) for batch in self._batches.values())
+
+    def _deadline(self, batch: _Batch) -> float:
+        return min(batch.last_added + self.window, batch.first_added + self.max_wait)
+
+    def _ensure_thread(self) -> None:
+        """Start the timer thread on first use (condition held)"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="coalescer", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if not self._running:
+                    return
+                now = time.time()
+                due = [key for key, batch in self._batches.items() if self._deadline(batch) <= now]
+                ready = [(key, self._batches.pop(key).files) for key in due]
+                if not ready:
+                    timeout = min((self._deadline(batch) for batch in self._batches.values()), default=None)
+                    self._condition.wait(None if timeout is None else max(timeout - now, 0.01))
+                    continue
+            for key, files in ready:
+                self._flush(key, files)
+
+    def _flush(self, key: str, files: List[str]) -> None:
+        """Hand one batch to the flush callback"""
+        self.batches_flushed += 1
+        if len(files) > 1:
+            logger.log_info(f"Coalesced {len(files)} files for {key} into one notification")
+        try:
+            self.flush_callback(files)
+        except Exception as e:
+            logger.log_error(e, f"Failed to hand off notification batch for {key}")
+            if self.error_callback is not None:
+                try:
+                    self.error_callback(files, e)
+                except Exception as callback_error:
+                    logger.log_error(callback_error, f"Failed to record the lost notification batch for {key}")
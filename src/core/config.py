@@ -3,19 +3,51 @@ Configuration module for WhatsApp Auto Sender
 """
 
 import os
+import re
 import sys
+import threading
 from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
 from src.core.constants import *
 from src.core.logger import logger
+from src.core.settings import (SettingsError, load_layered_settings, settings_path, settings_signature,
+                               unknown_settings, use_overrides, use_settings_file)
+from src.core.file_filter import FileFilter
+from src.core.routing import Route, RoutingRule, RoutingTable
+from src.core.watch_roots import WatchRoot, validate_watch_roots
+
+# Settings that only take effect after a restart, a changed config.yaml keeps their old values
+RESTART_SETTINGS = ("folder_to_watch", "logging", "priorities")
+
 
 class Config:
-    def __init__(self):
+    def __init__(self, overrides: Dict[str, Any] = None):
+        """
+        Args:
+            overrides: Command-line settings, applied over config.yaml and the environment
+        """
+        self.overrides = dict(overrides or {})
+        self._reload_listeners: List[Callable[[List[str]], None]] = []
+        self._load_settings()
         self._setup_paths()
+        self._setup_watch_roots()
         self._setup_logging()
         self._setup_file_watching()
         self._setup_message_template()
         self._validate_config()
 
+    def _load_settings(self):
+        """Layer defaults, config.yaml, environment and command line into self.settings"""
+        try:
+            self._settings_signature = settings_signature()
+            self.settings = load_layered_settings(overrides=self.overrides)
+            unknown = unknown_settings(self.settings)
+            if unknown:
+                logger.log_warning(f"Ignoring unknown settings in {settings_path()}: {', '.join(unknown)}")
+        except Exception as e:
+            logger.log_error(e, "Failed to load settings")
+            raise
+
     def _setup_paths(self):
         """Setup file system paths"""
         try:
@@ -28,18 +60,74 @@ class Config:
                 self.base_dir = Path(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
             # Base paths
-            self.folder_to_watch = DEFAULT_FOLDER_TO_WATCH
-            self.TempMessageForGroupPath = os.path.join(self.base_dir, DEFAULT_TEMP_MESSAGE_PATH)
-            self.root_path = DEFAULT_ROOT_PATH
+            self.folder_to_watch = self.settings["folder_to_watch"]
+            self.TempMessageForGroupPath = self._resolve_path(self.settings["TempMessageForGroupPath"])
+            self.root_path = self.settings["root_path"]
+
+            # Persistent state such as the directory index lives next to the logs
+            if DATA_DIR:
+                self.data_dir = os.path.abspath(DATA_DIR)
+            elif getattr(sys, 'frozen', False):
+                self.data_dir = os.path.join(os.environ.get('LOCALAPPDATA', os.path.expanduser('~')), "WhatsAppAutoSender", "data")
+            else:
+                self.data_dir = os.path.join(self.base_dir, "data")
 
             # Create necessary directories
             os.makedirs(self.folder_to_watch, exist_ok=True)
+            os.makedirs(self.data_dir, exist_ok=True)
             logger.log_info(f"Created/verified folder to watch: {self.folder_to_watch}")
 
         except Exception as e:
             logger.log_error(e, "Failed to setup paths")
             raise
 
+    def _setup_watch_roots(self):
+        """Setup the watched folders from the config.yaml `watch_roots` list, or the single default folder"""
+        try:
+            self.watch_roots, self.routing = self._build_watch_roots(self.settings)
+            for root in self.watch_roots:
+                os.makedirs(root.folder_to_watch, exist_ok=True)
+            logger.log_info(f"Watching {len(self.watch_roots)} root(s): {', '.join(root.name for root in self.watch_roots)}")
+        except Exception as e:
+            logger.log_error(e, "Failed to setup watch roots")
+            raise
+
+    def _build_watch_roots(self, settings: Dict[str, Any]) -> tuple:
+        """Build (watch_roots, routing) from settings without touching the current ones"""
+        default_filter = FileFilter.from_settings(settings["file_filter"], FileFilter(include=settings["file_patterns"]))
+        default_root = WatchRoot(DEFAULT_WATCH_ROOT_NAME, self.folder_to_watch, settings["root_path"],
+                                 self._resolve_path(settings["TempMessageForGroupPath"]), MAIN_WATCH_FOLDER_NAME,
+                                 file_filter=default_filter)
+        entries = settings["watch_roots"]
+        if entries:
+            roots = [WatchRoot.from_settings(entry, str(self.base_dir), default_root) for entry in entries]
+        else:
+            roots = [default_root]
+        validate_watch_roots(roots)
+        rules = [RoutingRule.from_settings(entry, roots, str(self.base_dir)) for entry in settings["routes"]]
+        # A class the priority policy does not know would fail every enqueue of these files
+        classes = settings["priorities"].get("classes")
+        classes = PRIORITY_CLASSES if classes is None else classes
+        errors = [f"route {rule.path} has unknown priority class '{rule.priority}', expected one of {sorted(classes)}"
+                  for rule in rules if rule.priority is not None and rule.priority not in classes]
+        if errors:
+            raise SettingsError(errors)
+        return roots, RoutingTable(roots, rules)
+
+    def _resolve_path(self, path: str) -> str:
+        """Make a path from the settings absolute, relative paths may use either slash"""
+        if os.path.isabs(path):
+            return path
+        return os.path.join(self.base_dir, *re.split(r"[\\/]", path))
+
+    def root_for(self, file_path: str) -> WatchRoot:
+        """The watch root a file belongs to"""
+        return self.routing.root_for(file_path)
+
+    def route_for(self, file_path: str) -> Route:
+        """Contact, template, link and priority of a file"""
+        return self.routing.resolve(file_path)
+
     def _setup_logging(self):
         """Setup logging configuration"""
         try:
@@ -54,9 +142,13 @@ class Config:
     def _setup_file_watching(self):
         """Setup file watching configuration"""
         try:
-            self.file_check_interval = FILE_CHECK_INTERVAL
-            self.max_file_age = MAX_FILE_AGE
-            self.file_patterns = FILE_PATTERNS
+            self.file_check_interval = self.settings["file_check_interval"]
+            self.stability_quiet_period = self.settings["stability_quiet_period"]
+            self.file_patterns = self.settings["file_patterns"]
+            self.retry_attempts = self.settings["retry_attempts"]
+            self.retry_delay = self.settings["retry_delay"]
+            self.timeout = self.settings["timeout"]
+            self.wait_time = self.settings["wait_time"]
             logger.log_info("File watching configuration loaded")
         except Exception as e:
             logger.log_error(e, "Failed to setup file watching")
@@ -91,5 +183,100 @@ class Config:
             logger.log_error(e, "Configuration validation failed")
             raise
 
-# Create global config instance
-config = Config()
+    def on_reload(self, callback: Callable[[List[str]], None]) -> None:
+        """Call `callback` with the changed setting names after config.yaml was reloaded"""
+        self._reload_listeners.append(callback)
+
+    def reload_if_changed(self) -> bool:
+        """
+        Apply a changed config.yaml without restarting, returns True if anything changed
+
+        The new settings are validated and every derived object is built before any of
+        them replaces the current one, so an invalid file leaves the running
+        configuration untouched. Watch roots can change their templates, links, filters
+        and contact rules but not their folders; those and RESTART_SETTINGS need a restart.
+        """
+        signature = settings_signature()
+        if signature == self._settings_signature:
+            return False
+        self._settings_signature = signature
+        try:
+            settings = load_layered_settings(overrides=self.overrides)
+            for key in RESTART_SETTINGS:
+                if settings[key] != self.settings[key]:
+                    logger.log_warning(f"Setting '{key}' changed, it takes effect after a restart")
+                    settings[key] = self.settings[key]
+            roots, routing = self._build_watch_roots(settings)
+            folders = [(root.name, os.path.normcase(os.path.abspath(root.folder_to_watch))) for root in roots]
+            current = [(root.name, os.path.normcase(os.path.abspath(root.folder_to_watch))) for root in self.watch_roots]
+            if folders != current:
+                raise SettingsError(["watch root names and folders can only change with a restart"])
+        except Exception as e:
+            logger.log_error(e, f"Ignoring changed settings in {settings_path()}, keeping the current ones")
+            return False
+
+        changed = sorted(key for key in set(settings) | set(self.settings) if settings.get(key) != self.settings.get(key))
+        if not changed:
+            return False
+        # Running watchers hold the root objects, update them in place
+        for root, new_root in zip(self.watch_roots, roots):
+            root.update_from(new_root)
+        self.settings = settings
+        self.routing = RoutingTable(self.watch_roots, routing.rules)
+        self.root_path = settings["root_path"]
+        self.TempMessageForGroupPath = self._resolve_path(settings["TempMessageForGroupPath"])
+        self._setup_file_watching()
+        logger.log_info(f"Reloaded settings from {settings_path()}: {', '.join(changed)}")
+        for callback in self._reload_listeners:
+            try:
+                callback(changed)
+            except Exception as e:
+                logger.log_error(e, "Failed to apply reloaded settings")
+        return True
+
+
+_config = None
+_config_lock = threading.Lock()
+_overrides: Dict[str, Any] = {}
+
+
+def configure(overrides: Dict[str, Any] = None, settings_file: Optional[str] = None) -> None:
+    """
+    Set command-line settings before the global Config is first used
+
+    Args:
+        overrides: Setting name -> value, the highest settings layer
+        settings_file: Read this file instead of resources/config.yaml
+    """
+    global _overrides
+    if _config is not None:
+        raise RuntimeError("configure() must be called before the configuration is used")
+    if settings_file:
+        use_settings_file(settings_file)
+    _overrides = dict(overrides or {})
+    # The logger is set up on first use, possibly before Config, and reads them from there
+    use_overrides(_overrides)
+
+
+def get_config() -> Config:
+    """Return the global Config, building it (and its folders) on first use"""
+    global _config
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                _config = Config(_overrides)
+    return _config
+
+
+class _LazyConfig:
+    """Stand-in for the global Config that builds it on first attribute access"""
+
+    def __getattr__(self, name):
+        return getattr(get_config(), name)
+
+    def __setattr__(self, name, value):
+        setattr(get_config(), name, value)
+
+
+# Global config instance, importing it has no side effects
+config = _LazyConfig()
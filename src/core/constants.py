@@ -10,6 +10,8 @@ load_dotenv()
 # File System Constants
 DEFAULT_FOLDER_TO_WATCH = os.getenv('DEFAULT_FOLDER_TO_WATCH', r"C:\Users\Lenovo\OneDrive\قضايا التحكيم\منظورة تجربة")
 DEFAULT_TEMP_MESSAGE_PATH = "src/MessageTemplates/NotificationToGroup.txt"
+DEFAULT_WATCH_ROOT_NAME = "default"  # name of the root built from the settings above when config.yaml lists no watch_roots
+DATA_DIR = os.getenv('DATA_DIR')  # persistent state, by default data/ next to the code (LOCALAPPDATA when bundled)
 DEFAULT_ROOT_PATH = os.getenv('DEFAULT_ROOT_PATH', "https://ta7kem-my.sharepoint.com/personal/contact_ta7kem_com/Documents/%D9%82%D8%B6%D8%A7%D9%8A%D8%A7%20%D8%A7%D9%84%D8%AA%D8%AD%D9%83%D9%8A%D9%85/%D9%85%D9%86%D8%B8%D9%88%D8%B1%D8%A9%20%D8%AA%D8%AC%D8%B1%D8%A8%D8%A9")
 
 # Logging Constants
@@ -17,16 +19,90 @@ LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
 LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 LOG_LEVEL = "INFO"
 LOG_FILE = "whatsapp_auto_sender.log"
+LOG_DIR = os.getenv('LOG_DIR')  # by default logs/ next to the code (LOCALAPPDATA when bundled)
+LOG_MAX_SIZE = 10 * 1024 * 1024  # bytes before the day's log file rolls over
+LOG_BACKUP_COUNT = 5  # size-based backups kept per day
+LOG_RETENTION_DAYS = 30  # daily log files older than this are deleted
 
 # File Watching Constants
 FILE_CHECK_INTERVAL = 1  # seconds
-MAX_FILE_AGE = 5  # seconds (5 minutes)
+SETTINGS_RELOAD_INTERVAL = 5  # seconds between checks of config.yaml for changes
+STABILITY_QUIET_PERIOD = float(os.getenv('STABILITY_QUIET_PERIOD', 2))  # seconds a file's size and mtime must stay unchanged
+PLACEHOLDER_MAX_RECHECK_INTERVAL = 300  # seconds, empty placeholders are re-checked less and less often, up to this
+PLACEHOLDER_MAX_HOLD = 24 * 60 * 60  # seconds an empty placeholder is tracked before the watcher gives up on it
 FILE_PATTERNS = ["*.pdf", "*.doc", "*.docx", "*.xls", "*.xlsx"]
+FILE_EXCLUDE_PATTERNS = ["~$*", ".~lock.*", "*.tmp", "*.crdownload", "*.part"]  # Office lock files and partial downloads
+FILE_MIN_SIZE = 1  # bytes, smaller files are placeholders still being synced
+FILE_MAX_SIZE = None  # bytes, None for no limit
+WATCHER_BACKEND = os.getenv('WATCHER_BACKEND', "auto")  # auto, watchdog or polling
+SNAPSHOT_INDEX_FILE = "directory_index.json"
+ROUTE_CACHE_SIZE = 4096  # folders whose contact/template/link route is memoized
+SNAPSHOT_SAVE_INTERVAL = 60  # seconds
+SNAPSHOT_DIRTY_WINDOW = 2  # seconds, folders listed this close to their mtime are listed again (FAT/SMB timestamp granularity)
+
+# Processed File Store Constants
+PROCESSED_STORE_FILE = "processed_files.db"
+PROCESSED_STORE_MAX_AGE = 30 * 24 * 60 * 60  # seconds (30 days)
+PROCESSED_STORE_MAX_ENTRIES = 100000
+PROCESSED_STORE_PRUNE_INTERVAL = 60 * 60  # seconds
+PROCESSED_CACHE_SIZE = 10000  # records kept in memory
+PROCESSED_STORE_HASH = os.getenv('PROCESSED_STORE_HASH', "false").lower() == "true"
+
+# Outbox Constants
+OUTBOX_FILE = "outbox.db"
+OUTBOX_RETENTION = 30 * 24 * 60 * 60  # seconds sent notifications are kept for inspection
+
+# Work Queue Constants
+WORK_QUEUE_SIZE = 1000  # detected files waiting to be sent
+SENDER_WORKERS = int(os.getenv('SENDER_WORKERS', 1))  # a single WhatsApp window drives one chat at a time
+WORK_QUEUE_STATS_INTERVAL = 300  # seconds
+SHUTDOWN_DRAIN_TIMEOUT = int(os.getenv('SHUTDOWN_DRAIN_TIMEOUT', 60))  # seconds Ctrl+C waits for queued sends
+ORCHESTRATOR_SPARE_THREADS = 4  # I/O threads for retry timers, periodic tasks and shutdown steps
+
+# Priority Scheduling Constants (overridable in the config.yaml `priorities` section)
+PRIORITY_CLASSES = {"urgent": 0, "normal": 1, "bulk": 2}  # class name -> rank, lower is sent first
+PRIORITY_DEFAULT_CLASS = "normal"
+PRIORITY_FOLDERS = {}  # contact or subfolder name -> class
+PRIORITY_EXTENSIONS = {".xls": "bulk", ".xlsx": "bulk"}  # extension from FILE_PATTERNS -> class
+PRIORITY_AGING_SECONDS = 300  # waiting this long lifts an item by one class, 0 for strict priorities
+
+# Notification Coalescing Constants
+COALESCE_WINDOW = float(os.getenv('COALESCE_WINDOW', 10))  # seconds without new files before a contact's batch is sent, 0 disables
+COALESCE_MAX_WAIT = 60  # seconds a batch can be held back by a steady trickle of files
+
+# Diagnostics Constants
+DIAGNOSTICS_MODE = os.getenv('DIAGNOSTICS_MODE', "screenshot")  # screenshot, uia (element tree dump), both or off
+DIAGNOSTICS_MIN_INTERVAL = 5 * 60  # seconds between captures for the same error class
+DIAGNOSTICS_QUEUE_SIZE = 10  # pending captures, more are dropped
+DIAGNOSTICS_TREE_DEPTH = 8  # levels of the WhatsApp element tree to dump
+SCREENSHOTS_DIR = os.path.join(LOG_DIR or "logs", "screenshots")
+SCREENSHOTS_MAX_AGE = 7 * 24 * 60 * 60  # seconds diagnostics files are kept
+SCREENSHOTS_MAX_BYTES = 50 * 1024 * 1024  # total size of the diagnostics files in the screenshots directory
+
+# Metrics Constants
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', "false").lower() == "true"
+METRICS_EXPORT = os.getenv('METRICS_EXPORT', "prometheus")  # "prometheus" or "jsonl"
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9464))
+METRICS_JSONL_FILE = "metrics.jsonl"
+METRICS_EXPORT_INTERVAL = 60  # seconds between JSONL snapshots
 
 # Error Handling Constants
 MAX_RETRIES = 3
-RETRY_DELAY = 5  # seconds
+RETRY_DELAY = 5  # seconds before the first retry, doubled for every further one
+RETRY_MAX_DELAY = 120  # seconds, cap for the exponential backoff
+RETRY_BACKOFF = 2
+RETRY_JITTER = 0.5  # up to this fraction of each delay is randomized so retries do not line up
+# Per error class (exception type name) overrides of the settings above
+RETRY_POLICIES = {
+    "ContactNotFoundError": {"max_attempts": 1, "trips_breaker": False},  # retrying cannot create the chat
+    "WaitTimeoutError": {"max_attempts": 5, "base_delay": 2},  # a slow UI usually recovers quickly
+}
+CIRCUIT_FAILURE_THRESHOLD = 3  # consecutive transport failures that pause all sends
+CIRCUIT_RESET_TIMEOUT = 30  # seconds before the first health probe of a paused transport
+CIRCUIT_MAX_RESET_TIMEOUT = 5 * 60  # seconds, cap for the probe interval after failed probes
 ERROR_WAIT_TIME = 10  # seconds
+DEFAULT_TIMEOUT = 30  # seconds, upper bound for browser element waits
+DEFAULT_WAIT_TIME = 2  # seconds to wait for the user in the interactive helpers
 
 # Message Template Constants
 MESSAGE_PLACEHOLDERS = {
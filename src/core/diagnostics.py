@@ -0,0 +1,182 @@
+"""
+Failure diagnostics captured off the calling thread, rate-limited and with retention
+"""
+
+import os
+import queue
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+from src.core.constants import *
+from src.core.logger import logger
+from src.core.screenshot_utils import take_screenshot
+
+# Names of the files written here, retention never touches anything else in the directory
+_SCREENSHOT_PREFIX = "diagnostics_screenshot"
+_TREE_PREFIX = "diagnostics_uia"
+_FILE_NAME = re.compile(rf"^(?:{_SCREENSHOT_PREFIX}|{_TREE_PREFIX})_\d{{8}}_\d{{6}}.*\.(?:png|txt)$")
+
+
+class DiagnosticsCapture:
+    """
+    Save a screenshot and/or an element-tree dump when a send finally fails
+
+    `capture()` only enqueues the request, a single background thread does the slow
+    work (grabbing and encoding the screen, writing files). The element tree is not
+    walked here: it must be dumped on the thread that drives WhatsApp, before the failed
+    session is reset, and is handed to `capture()` as text. Per error class at
+    most one capture is taken every `min_interval` seconds, so a flapping failure does
+    not fill the disk. After each capture its own files are trimmed to `max_bytes` and
+    the ones older than `max_age` are deleted, other files in the directory are kept.
+    """
+
+    def __init__(self, mode: str = DIAGNOSTICS_MODE, directory: str = SCREENSHOTS_DIR,
+                 min_interval: float = DIAGNOSTICS_MIN_INTERVAL, max_age: float = SCREENSHOTS_MAX_AGE,
+                 max_bytes: int = SCREENSHOTS_MAX_BYTES, queue_size: int = DIAGNOSTICS_QUEUE_SIZE):
+        """
+        Args:
+            mode: "screenshot", "uia" for an element-tree dump, "both" or "off"
+            directory: Folder the diagnostics files are written to
+            min_interval: Seconds between captures for the same error class
+            max_age: Seconds files are kept
+            max_bytes: Upper bound on the total size of the diagnostics files in `directory`
+            queue_size: Captures that may wait for the background thread, more are dropped
+        """
+        if mode not in ("screenshot", "uia", "both", "off"):
+            raise ValueError(f"Unknown diagnostics mode: {mode}")
+        self.mode = mode
+        self.directory = directory
+        self.min_interval = min_interval
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._queue = queue.Queue(queue_size)
+        self._last_capture: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.captured = 0
+        self.suppressed = 0
+        self.dropped = 0
+
+    @property
+    def wants_element_tree(self) -> bool:
+        """Whether failures should keep an element tree for `capture()`"""
+        return self.mode in ("uia", "both")
+
+    def capture(self, error_class: str, context: str = None, element_tree: str = None) -> bool:
+        """
+        Request diagnostics for a failure, returns False if it was rate-limited or dropped
+
+        Args:
+            error_class: Failures of the same class share one rate limit, e.g. the exception type
+            context: Extra text for the file name
+            element_tree: Element-tree dump taken when the failure happened, written in "uia" and "both" modes
+        """
+        if self.mode == "off":
+            return False
+        now = time.time()
+        with self._lock:
+            if now - self._last_capture.get(error_class, 0.0) < self.min_interval:
+                self.suppressed += 1
+                logger.log_debug("Diagnostics for %s suppressed by rate limit", error_class)
+                return False
+            self._last_capture[error_class] = now
+            self._ensure_thread()
+        try:
+            self._queue.put_nowait((error_class, context, element_tree))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.log_warning(f"Diagnostics queue is full, dropping capture for {error_class}")
+            return False
+
+    def flush(self, timeout: float = 10) -> None:
+        """Wait up to `timeout` seconds for pending captures, e.g. on shutdown"""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.05)
+
+    def stats(self) -> dict:
+        return {"captured": self.captured, "suppressed": self.suppressed, "dropped": self.dropped}
+
+    def _ensure_thread(self) -> None:
+        """Start the capture thread on first use (lock held)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="diagnostics", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            error_class, context, element_tree = self._queue.get()
+            try:
+                self._capture_now(error_class, context, element_tree)
+                self.enforce_retention()
+            except Exception as e:
+                logger.log_error(e, f"Failed to capture diagnostics for {error_class}")
+            finally:
+                self._queue.task_done()
+
+    def _capture_now(self, error_class: str, context: str = None, element_tree: str = None) -> None:
+        label = _safe_name("_".join(part for part in (error_class, context) if part))
+        if self.mode in ("screenshot", "both"):
+            if take_screenshot(label, self.directory, prefix=_SCREENSHOT_PREFIX):
+                self.captured += 1
+        if self.wants_element_tree:
+            if element_tree is None:
+                logger.log_warning(f"No element tree was kept for {error_class}, skipping UIA dump")
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            path = os.path.join(self.directory, f"{_TREE_PREFIX}_{timestamp}_{label}.txt")
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(element_tree)
+            self.captured += 1
+            logger.log_info(f"Element tree saved: {path}")
+
+    def enforce_retention(self) -> int:
+        """Delete expired diagnostics files, then the oldest ones until they fit `max_bytes`"""
+        try:
+            entries = []
+            with os.scandir(self.directory) as scan:
+                for entry in scan:
+                    if _FILE_NAME.match(entry.name) and entry.is_file():
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            return 0
+        entries.sort()
+        cutoff = time.time() - self.max_age
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError as e:
+                logger.log_error(e, f"Failed to delete old diagnostics file: {path}")
+        if removed:
+            logger.log_info(f"Deleted {removed} old diagnostics files from {self.directory}")
+        return removed
+
+
+def _safe_name(text: str) -> str:
+    """Make text usable in a file name"""
+    return re.sub(r'[\\/:*?"<>|\s]+', "_", text)[:80]
+
+
+_diagnostics: Optional[DiagnosticsCapture] = None
+_diagnostics_lock = threading.Lock()
+
+
+def get_diagnostics() -> DiagnosticsCapture:
+    """The application's diagnostics capture, created on first use"""
+    global _diagnostics
+    if _diagnostics is None:
+        with _diagnostics_lock:
+            if _diagnostics is None:
+                _diagnostics = DiagnosticsCapture()
+    return _diagnostics
@@ -0,0 +1,185 @@
+"""
+Incremental directory snapshot index used by the polling file watcher
+"""
+
+import json
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from src.core.constants import SNAPSHOT_DIRTY_WINDOW
+from src.core.file_filter import FileFilter
+from src.core.logger import logger
+
+SNAPSHOT_FORMAT_VERSION = 2
+
+
+class IndexedFile(NamedTuple):
+    """A matching file that is new or changed since the previous scan"""
+    path: str
+    size: int
+    mtime_ns: int
+
+    @property
+    def mtime(self) -> float:
+        return self.mtime_ns / 1e9
+
+
+class DirectorySnapshot:
+    """The state of one directory as of its last listing"""
+
+    __slots__ = ("mtime_ns", "subdirs", "files", "listed_at_ns")
+
+    def __init__(self, mtime_ns: int, subdirs: List[str], files: Dict[str, Tuple[int, int]], listed_at_ns: int):
+        self.mtime_ns = mtime_ns
+        self.subdirs = subdirs
+        self.files = files  # name -> (size, mtime_ns), matching files only
+        self.listed_at_ns = listed_at_ns
+
+    def is_dirty(self, mtime_ns: int, dirty_window_ns: int) -> bool:
+        """
+        Whether the directory must be listed again: its mtime changed, or it was listed
+        so soon after its last change that a file created or overwritten in the same
+        timestamp tick (2 s on FAT, coarse on SMB/OneDrive) would not move the mtime
+        """
+        return mtime_ns != self.mtime_ns or self.listed_at_ns - mtime_ns < dirty_window_ns
+
+
+class DirectoryIndex:
+    """
+    Snapshot of a directory tree keyed by directory path
+
+    Every scan stats each known directory once and re-lists (with a single os.scandir)
+    only the directories whose mtime changed, so its cost grows with the number of
+    changed directories instead of the number of files. Directories listed within
+    `dirty_window` seconds of their mtime stay dirty and are listed again, so changes
+    hidden by coarse filesystem timestamps are picked up on a later scan. Only names accepted by
+    `file_filter` are indexed, their sizes are checked by the watcher.
+    """
+
+    def __init__(self, root: str, file_filter: FileFilter = None, dirty_window: float = SNAPSHOT_DIRTY_WINDOW):
+        self.root = os.path.abspath(str(root))
+        self.file_filter = file_filter or FileFilter()
+        self.dirty_window_ns = int(dirty_window * 1e9)
+        self._snapshots: Dict[str, DirectorySnapshot] = {}
+        self.last_listed = 0
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+    @property
+    def patterns(self) -> list:
+        """The filter settings a saved index was built with"""
+        return self.file_filter.signature()
+
+    def scan(self) -> List[IndexedFile]:
+        """Update the index and return matching files that appeared or changed since the last scan"""
+        changed = []
+        self.last_listed = 0
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except FileNotFoundError:
+                self._forget(directory)
+                continue
+            except OSError as e:
+                logger.log_error(e, f"Error checking subfolder: {directory}")
+                continue
+
+            snapshot = self._snapshots.get(directory)
+            if snapshot is None or snapshot.is_dirty(mtime_ns, self.dirty_window_ns):
+                snapshot = self._relist(directory, mtime_ns, snapshot, changed)
+                if snapshot is None:
+                    continue
+            stack.extend(os.path.join(directory, name) for name in snapshot.subdirs)
+        return changed
+
+    def _relist(self, directory: str, mtime_ns: int, previous: Optional[DirectorySnapshot],
+                changed: List[IndexedFile]) -> Optional[DirectorySnapshot]:
+        """List a changed directory once and record new or modified matching files in `changed`"""
+        subdirs = []
+        files = {}
+        listed_at_ns = time.time_ns()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+                        elif self.file_filter.match_name(entry.name):
+                            # DirEntry caches its stat result (for free on Windows)
+                            stat = entry.stat()
+                            files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+                    except FileNotFoundError:
+                        continue
+        except FileNotFoundError:
+            self._forget(directory)
+            return None
+        except OSError as e:
+            logger.log_error(e, f"Error checking subfolder: {directory}")
+            return None
+        self.last_listed += 1
+
+        previous_files = previous.files if previous else {}
+        for name, (size, file_mtime_ns) in files.items():
+            if previous_files.get(name) != (size, file_mtime_ns):
+                changed.append(IndexedFile(os.path.join(directory, name), size, file_mtime_ns))
+
+        if previous:
+            for name in set(previous.subdirs).difference(subdirs):
+                self._forget(os.path.join(directory, name))
+
+        snapshot = DirectorySnapshot(mtime_ns, subdirs, files, listed_at_ns)
+        self._snapshots[directory] = snapshot
+        return snapshot
+
+    def _forget(self, directory: str) -> None:
+        """Drop a removed directory and everything indexed below it"""
+        snapshot = self._snapshots.pop(directory, None)
+        if snapshot is None:
+            return
+        for name in snapshot.subdirs:
+            self._forget(os.path.join(directory, name))
+
+    def save(self, path: str) -> None:
+        """Persist the index so the next run can diff against it instead of starting cold"""
+        try:
+            data = {
+                "version": SNAPSHOT_FORMAT_VERSION,
+                "root": self.root,
+                "patterns": self.patterns,
+                "directories": {
+                    directory: [snapshot.mtime_ns, snapshot.subdirs, snapshot.files, snapshot.listed_at_ns]
+                    for directory, snapshot in self._snapshots.items()
+                },
+            }
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(data, file, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except Exception as e:
+            logger.log_error(e, f"Failed to save directory index to {path}")
+
+    def load(self, path: str) -> bool:
+        """Load a previously saved index, returns False if it is missing or does not match this tree"""
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            if (data.get("version") != SNAPSHOT_FORMAT_VERSION or data.get("root") != self.root
+                    or data.get("patterns") != self.patterns):
+                logger.log_info(f"Ignoring directory index at {path}: saved for a different tree or patterns")
+                return False
+            self._snapshots = {
+                directory: DirectorySnapshot(mtime_ns, subdirs, {name: tuple(value) for name, value in files.items()},
+                                             listed_at_ns)
+                for directory, (mtime_ns, subdirs, files, listed_at_ns) in data["directories"].items()
+            }
+            logger.log_info(f"Loaded directory index with {len(self._snapshots)} folders from {path}")
+            return True
+        except Exception as e:
+            logger.log_error(e, f"Failed to load directory index from {path}")
+            self._snapshots = {}
+            return False
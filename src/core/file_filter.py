@@ -0,0 +1,133 @@
+"""
+Compiled include/exclude filter deciding which files in a watched tree are notified
+"""
+
+import collections
+import fnmatch
+import os
+import re
+from typing import Dict, List, Optional
+from src.core.constants import *
+
+
+class FileFilter:
+    """
+    Match file names and sizes against include/exclude globs and size bounds
+
+    The globs are compiled once: "*.ext" patterns become a dictionary lookup on the
+    extension, every other pattern joins one regular expression with a named group per
+    pattern, so a name is matched with at most one lookup and one regex call no matter
+    how many patterns there are. Exclusions win over inclusions. Names are compared
+    case-insensitively on Windows, like Path.glob. Every decision is counted per rule.
+    """
+
+    def __init__(self, include: List[str] = None, exclude: List[str] = None,
+                 min_size: int = FILE_MIN_SIZE, max_size: Optional[int] = FILE_MAX_SIZE):
+        """
+        Args:
+            include: Globs a file name must match
+            exclude: Globs of names that are never notified, e.g. Office lock files
+            min_size: Smallest size in bytes that is notified, smaller files are placeholders
+            max_size: Largest size in bytes that is notified, None for no limit
+        """
+        self.include = list(FILE_PATTERNS if include is None else include)
+        self.exclude = list(FILE_EXCLUDE_PATTERNS if exclude is None else exclude)
+        self.min_size = min_size
+        self.max_size = max_size
+        self._include_extensions, self._include_regex = _compile(self.include)
+        self._exclude_extensions, self._exclude_regex = _compile(self.exclude)
+        self.counts = collections.Counter()
+
+    @classmethod
+    def from_settings(cls, settings: dict = None, defaults: "FileFilter" = None) -> "FileFilter":
+        """Build a filter from a config.yaml `file_filter` section, unset keys come from `defaults`"""
+        settings = settings or {}
+        defaults = defaults or cls()
+        return cls(
+            include=settings.get("include", defaults.include),
+            exclude=settings.get("exclude", defaults.exclude),
+            min_size=int(settings.get("min_size", defaults.min_size)),
+            max_size=settings.get("max_size", defaults.max_size),
+        )
+
+    def match_name(self, name: str, count: bool = True) -> bool:
+        """Whether a file name is included and not excluded, `count` records the decision"""
+        name = os.path.normcase(name)
+        rule = _find(name, self._exclude_extensions, self._exclude_regex, self.exclude)
+        if rule is not None:
+            self._count(f"exclude:{rule}", count)
+            return False
+        rule = _find(name, self._include_extensions, self._include_regex, self.include)
+        if rule is None:
+            self._count("unmatched", count)
+            return False
+        self._count(f"include:{rule}", count)
+        return True
+
+    def match_size(self, size: int, count: bool = True) -> bool:
+        """Whether a file of `size` bytes is within the size bounds, `count` records the decision"""
+        if size < self.min_size:
+            self._count("min_size", count)
+            return False
+        if self.max_size is not None and size > self.max_size:
+            self._count("max_size", count)
+            return False
+        return True
+
+    def match(self, name: str, size: int, count: bool = True) -> bool:
+        return self.match_name(name, count) and self.match_size(size, count)
+
+    def matching_files(self, directory: str) -> List[str]:
+        """
+        Paths of the matching files in a directory, listed with a single scandir
+
+        Not counted: these files were counted when they were detected.
+        """
+        paths = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and self.match(entry.name, entry.stat().st_size, count=False):
+                        paths.append(entry.path)
+                except FileNotFoundError:
+                    continue
+        return sorted(paths)
+
+    def signature(self) -> list:
+        """What a saved directory index depends on, it is rebuilt when this changes"""
+        return [self.include, self.exclude]
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.counts)
+
+    def _count(self, rule: str, count: bool) -> None:
+        if count:
+            self.counts[rule] += 1
+
+
+def _compile(patterns: List[str]) -> tuple:
+    """Split globs into an extension -> pattern map and one regex for the rest"""
+    extensions = {}
+    groups = []
+    for index, pattern in enumerate(patterns):
+        normalized = os.path.normcase(pattern)
+        extension = normalized[1:]
+        if normalized.startswith("*.") and not any(char in extension[1:] for char in "*?[."):
+            extensions.setdefault(extension, pattern)
+        else:
+            groups.append(f"(?P<p{index}>{fnmatch.translate(normalized)})")
+    regex = re.compile("|".join(groups)) if groups else None
+    return extensions, regex
+
+
+def _find(name: str, extensions: dict, regex, patterns: List[str]) -> Optional[str]:
+    """The first pattern matching a normalized name, None if none does"""
+    if extensions:
+        extension = name[name.rfind("."):] if "." in name else None
+        if extension in extensions:
+            return extensions[extension]
+    if regex is not None:
+        match = regex.match(name)
+        if match is not None:
+            return patterns[int(match.lastgroup[1:])]
+    return None
@@ -3,66 +3,245 @@ File watcher module for monitoring directory changes
 """
 
 import os
+import queue
 import time
 from pathlib import Path
-from typing import Callable
+from typing import Callable, Optional
 from src.core.config import config
 from src.core.constants import *
+from src.core.dir_index import DirectoryIndex
+from src.core.file_filter import FileFilter
 from src.core.logger import logger
+from src.core.metrics import metrics
+from src.core.processed_store import ProcessedFileStore
+from src.core.stability import StabilityDetector, exclusive_open_probe
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # watchdog is optional, the polling backend is always available
+    Observer = None
+    FileSystemEventHandler = object
+
+
+class _WatchdogEventHandler(FileSystemEventHandler):
+    """Forward watchdog create/move/modify events to the watcher"""
+
+    def __init__(self, post: Callable[[str], None]):
+        super().__init__()
+        self.post = post
+
+    def on_created(self, event):
+        self.post(event.src_path)
+
+    def on_modified(self, event):
+        # Directory modifications only mean "an entry changed", the entry itself gets its own event
+        if not event.is_directory:
+            self.post(event.src_path)
+
+    def on_moved(self, event):
+        self.post(event.dest_path)
+
 
 class FileWatcher:
-    def __init__(self, directory: str, callback: Callable[[str], None]):
+    def __init__(self, directory: str, callback: Callable[[str], None], backend: str = WATCHER_BACKEND,
+                 index_file: str = SNAPSHOT_INDEX_FILE, file_filter: FileFilter = None):
         """
         Initialize file watcher
-        
+
         Args:
             directory: Directory to watch
             callback: Function to call when a file is found. This should be a function
                      that processes the file, such as sending it via WhatsApp.
+            backend: "watchdog" for filesystem events, "polling" for periodic scans,
+                     or "auto" to use watchdog when it is available and fall back to polling
+            index_file: File name of the saved directory index in the data folder,
+                        each watched directory needs its own
+            file_filter: Which files are notified, FILE_PATTERNS without lock files and placeholders by default
         """
         self.directory = Path(directory)
         self.callback = callback
+        self.backend = backend
+        self.active_backend = None
         self.running = False
-        self.processed_files = set()
+        self.processed_files = ProcessedFileStore(os.path.join(config.data_dir, PROCESSED_STORE_FILE))
+        self._events = queue.Queue()
+        # Called from the observer thread after each event, e.g. to wake an event loop
+        self.on_event: Optional[Callable[[], None]] = None
+        self._observer = None
+        self.file_filter = file_filter or FileFilter()
+        self._index = DirectoryIndex(self.directory, self.file_filter)
+        self._index_path = os.path.join(config.data_dir, index_file)
+        self._index_saved_at = 0.0
+        self._stability = StabilityDetector(config.stability_quiet_period)
+        # Without a saved index the first scan only records what already exists
+        self._baseline_scan = True
         logger.log_info(f"File watcher initialized for directory: {directory}")
 
-    def start(self):
-        """Start watching the directory"""
-        try:
-            if not self.directory.exists():
-                logger.log_error(None, f"Directory does not exist: {self.directory}")
-                return
+    def open(self) -> None:
+        """
+        Start the backend without blocking: the watchdog observer, or the saved index for polling
 
-            self.running = True
-            logger.log_info("File watcher started")
-            
-            while self.running:
-                try:
-                    self._check_files()
-                    time.sleep(FILE_CHECK_INTERVAL)
-                except Exception as e:
-                    logger.log_error(e, "Error in file watcher loop")
-                    time.sleep(ERROR_WAIT_TIME)
-                    continue
-                    
-        except Exception as e:
-            logger.log_error(e, "Failed to start file watcher")
-            raise
+        After open(), step() does one round of work at a time and returns when it wants
+        to run again; the orchestrator drives it and calls close() when it stops.
+        """
+        if not self.directory.exists():
+            error = FileNotFoundError(f"Directory does not exist: {self.directory}")
+            logger.log_error(error, "Failed to start file watcher")
+            raise error
+        self.running = True
+        if self._start_observer():
+            self.active_backend = "watchdog"
+            logger.log_info("File watcher started (watchdog events)")
+        else:
+            self._open_polling()
+            logger.log_info("File watcher started (polling)")
+
+    def step(self) -> float:
+        """Handle what is due now, returns seconds until the next step should run"""
+        if self.active_backend == "watchdog":
+            self._check_events()
+            if not self._observer.is_alive():
+                logger.log_warning("Watchdog observer stopped unexpectedly, falling back to polling")
+                self._stop_observer()
+                self._open_polling()
+                # Files created since startup are new even without a saved index, processed_files skips the notified ones
+                self._baseline_scan = False
+        else:
+            self._check_files()
+            if time.time() - self._index_saved_at > SNAPSHOT_SAVE_INTERVAL:
+                self._save_index()
+        return self._wait_timeout()
 
-    def stop(self):
-        """Stop watching the directory"""
+    def close(self) -> None:
+        """Stop the backend, saving the directory index when polling"""
         self.running = False
+        self._stop_observer()
+        if self.active_backend == "polling":
+            self._save_index()
         logger.log_info("File watcher stopped")
 
-    def _is_file_ready(self, file_path: str) -> bool:
-        """Check if a file is ready to be processed (not being written to)"""
+    def update_settings(self, file_filter: FileFilter = None) -> None:
+        """
+        Apply reloaded settings while running
+
+        A new filter applies to folders listed from now on, files in folders that do
+        not change are not looked at again.
+        """
+        if file_filter is not None:
+            self.file_filter = file_filter
+            self._index.file_filter = file_filter
+        self._stability.quiet_period = config.stability_quiet_period
+
+    def _start_observer(self) -> bool:
+        """Start the watchdog observer, returns False when polling should be used instead"""
+        if self.backend == "polling":
+            return False
+        if Observer is None:
+            if self.backend == "watchdog":
+                logger.log_warning("watchdog is not installed, falling back to polling")
+            return False
+
         try:
-            # Try to open the file in exclusive mode
-            with open(file_path, 'rb') as f:
-                return True
-        except IOError:
+            self._observer = Observer()
+            self._observer.schedule(_WatchdogEventHandler(self._post_event), str(self.directory), recursive=True)
+            self._observer.start()
+            return True
+        except Exception as e:
+            # e.g. inotify watch limit reached or a filesystem without change notifications
+            logger.log_error(e, "Failed to start watchdog observer, falling back to polling")
+            self._observer = None
             return False
 
+    def _stop_observer(self):
+        """Stop and join the watchdog observer if it is running"""
+        if self._observer is None:
+            return
+        try:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+        except Exception as e:
+            logger.log_error(e, "Failed to stop watchdog observer")
+        self._observer = None
+
+    def _open_polling(self) -> None:
+        """Switch to polling, diffing against the saved index when there is one"""
+        self.active_backend = "polling"
+        if self._index.load(self._index_path):
+            self._baseline_scan = False
+
+    def _post_event(self, path: str) -> None:
+        """Queue a path reported by the observer and wake whoever drives step()"""
+        self._events.put(path)
+        if self.on_event is not None:
+            self.on_event()
+
+    def _save_index(self):
+        """Persist the directory index for the next run"""
+        self._index.save(self._index_path)
+        self._index_saved_at = time.time()
+
+    @metrics.timed("detect")
+    def _check_events(self) -> None:
+        """Handle the paths watchdog reported since the last step, then the pending files"""
+        while True:
+            try:
+                event_path = self._events.get_nowait()
+            except queue.Empty:
+                break
+            self._handle_event_path(Path(event_path))
+        self._check_pending()
+
+    def _handle_event_path(self, path: Path) -> None:
+        """Handle a path reported by watchdog, expanding directories that were created or moved in"""
+        current_time = time.time()
+        if path.is_dir():
+            for root, _, files in os.walk(path):
+                for file_name in files:
+                    self._handle_candidate(Path(root) / file_name, current_time)
+        else:
+            self._handle_candidate(path, current_time)
+
+    def _handle_candidate(self, file_path: Path, current_time: float) -> None:
+        """Apply the subfolder and file name filters that polling applies while listing"""
+        if file_path.parent == self.directory:
+            return
+        if not self.file_filter.match_name(file_path.name):
+            return
+        try:
+            stat = file_path.stat()
+            self._handle_file(file_path, stat.st_size, stat.st_mtime_ns, current_time)
+        except FileNotFoundError:
+            # Temporary files are often gone again before the event is handled
+            return
+        except Exception as e:
+            logger.log_error(e, f"Error checking file: {file_path}")
+
+    def _is_file_ready(self, file_path: str) -> bool:
+        """Check if a file is ready to be processed (not being written to)"""
+        return exclusive_open_probe(file_path)
+
+    def _wait_timeout(self) -> float:
+        """Seconds until the next poll or the next pending file is due, whichever comes first"""
+        deadline = self._stability.next_deadline()
+        if deadline is None:
+            return config.file_check_interval
+        return min(config.file_check_interval, max(deadline - time.time(), 0.01))
+
+    def _check_pending(self) -> None:
+        """Look again at files that were still being written when last seen"""
+        current_time = time.time()
+        for file_path in self._stability.due(current_time):
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                self._stability.forget(file_path)
+                continue
+            except Exception as e:
+                logger.log_error(e, f"Error checking file: {file_path}")
+                continue
+            self._handle_file(Path(file_path), stat.st_size, stat.st_mtime_ns, current_time)
+
     def _process_file(self, file_path: str) -> bool:
         """Process a single file"""
         try:
@@ -71,57 +250,65 @@ class FileWatcher:
             logger.log_error(e, f"Error processing file {file_path}")
             return False
 
+    def _handle_file(self, file_path: Path, size: int, mtime_ns: int, current_time: float) -> None:
+        """Send a single matching file to the callback once it is complete, unless already processed"""
+        # Skip if this version of the file was already processed, also before a restart
+        if self.processed_files.contains(str(file_path), size, mtime_ns):
+            return
+
+        # Empty placeholders are looked at again until they have content, oversized files are skipped
+        if not self.file_filter.match_size(size):
+            if size < self.file_filter.min_size and not self._stability.hold(str(file_path), size, mtime_ns, current_time):
+                logger.log_warning(f"Giving up on file that stayed empty for {self._stability.max_hold:.0f}s: {file_path}")
+            return
+
+        # Wait until the file is no longer being written, it is looked at again when due
+        if not self._stability.observe(str(file_path), size, mtime_ns, current_time):
+            return
+        file_age = current_time - mtime_ns / 1e9
+
+        # Process the file
+        logger.log_info(f"Found new file in subfolder: {file_path}")
+        metrics.inc("files_detected_total", help_text="New files handed to the pipeline")
+        metrics.observe("detection_lag_seconds", file_age, help_text="Time from file write to detection")
+        try:
+            self.callback(str(file_path))
+            self.processed_files.add(str(file_path), size, mtime_ns)
+            logger.log_info(f"File processed successfully: {file_path}")
+        except Exception as e:
+            logger.log_error(e, f"Failed to process file: {file_path}")
+
+    @metrics.timed("detect")
     def _check_files(self) -> None:
         """Check for new files in the directory"""
         try:
             current_time = time.time()
-            
-            # Recursively get all subfolders
-            subfolders = []
-            for root, dirs, _ in os.walk(self.directory):
-                for dir_name in dirs:
-                    subfolders.append(Path(root) / dir_name)
-            
-            logger.log_debug(f"Found {len(subfolders)} subfolders in {self.directory}")
-            
-            # Check each subfolder
-            for subfolder in subfolders:
+
+            # Only folders whose mtime changed since the previous poll are listed again
+            changed_files = self._index.scan()
+            metrics.inc("folders_relisted_total", self._index.last_listed, help_text="Folders listed again by a poll")
+            logger.log_debug("Re-listed %d of %d folders in %s", self._index.last_listed, len(self._index), self.directory)
+
+            if self._baseline_scan:
+                # Files that existed before the first run are not notified
+                self._baseline_scan = False
+                logger.log_info(f"Recorded {len(changed_files)} existing files as the baseline")
+                return
+
+            for indexed_file in changed_files:
+                # Files directly in the watched folder have no contact folder
+                if os.path.dirname(indexed_file.path) == self._index.root:
+                    continue
+                file_path = Path(indexed_file.path)
                 try:
-                    # Check each file pattern in the subfolder
-                    for pattern in FILE_PATTERNS:
-                        for file_path in subfolder.glob(pattern):
-                            try:
-                                # Skip if file is too old
-                                file_age = current_time - file_path.stat().st_mtime
-                                if file_age > MAX_FILE_AGE:
-                                    logger.log_debug(f"Skipping old file: {file_path} (age: {file_age:.1f}s)")
-                                    continue
-
-                                # Skip if already processed
-                                if str(file_path) in self.processed_files:
-                                    continue
-                                
-                                # Process the file
-                                logger.log_info(f"Found new file in subfolder: {file_path}")
-                                try:
-                                    self.callback(str(file_path))
-                                    self.processed_files.add(str(file_path))
-                                    logger.log_info(f"File processed successfully: {file_path}")
-                                except Exception as e:
-                                    logger.log_error(e, f"Failed to process file: {file_path}")
-                                    # Continue to next file instead of raising the exception
-                                    continue
-                                
-                            except Exception as e:
-                                logger.log_error(e, f"Error checking file: {file_path}")
-                                # Continue to next file instead of raising the exception
-                                continue
-                            
+                    self._handle_file(file_path, indexed_file.size, indexed_file.mtime_ns, current_time)
                 except Exception as e:
-                    logger.log_error(e, f"Error checking subfolder: {subfolder}")
-                    # Continue to next subfolder instead of raising the exception
+                    logger.log_error(e, f"Error checking file: {file_path}")
+                    # Continue to next file instead of raising the exception
                     continue
-                
+
+            self._check_pending()
+
         except Exception as e:
             logger.log_error(e, "Error in file checking process")
             # Don't raise the exception, just log it and continue
@@ -2,23 +2,100 @@
 Enhanced logging module with detailed logging capabilities
 """
 
+import atexit
+import glob
 import logging
+import logging.handlers
 import os
+import queue
+import threading
 from datetime import datetime
 import sys
 from src.core.constants import *
+from src.core.settings import LOGGING_SCHEMA, load_logging_settings
 import time
 
+
+class DailyRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Write to ``<YYYYMMDD>_<name>`` and rotate both by size and at midnight
+
+    Within a day the file rolls over to numbered backups once it exceeds `max_bytes`
+    (keeping `backup_count` of them). At midnight logging moves on to the next day's
+    file, and daily files older than `retention_days` are deleted.
+    """
+
+    def __init__(self, log_dir: str, name: str, max_bytes: int, backup_count: int,
+                 retention_days: int = LOG_RETENTION_DAYS):
+        self.log_dir = log_dir
+        self.log_name = name
+        self.retention_days = retention_days
+        self._date = datetime.now().strftime('%Y%m%d')
+        super().__init__(self._path_for(self._date), maxBytes=max_bytes, backupCount=backup_count,
+                         encoding='utf-8', delay=True)
+
+    def _path_for(self, date: str) -> str:
+        return os.path.join(self.log_dir, f"{date}_{self.log_name}")
+
+    def shouldRollover(self, record) -> bool:
+        if datetime.now().strftime('%Y%m%d') != self._date:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        today = datetime.now().strftime('%Y%m%d')
+        if today == self._date:
+            super().doRollover()
+            return
+        # New day: switch to the new day's file instead of renaming the old one
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self._date = today
+        self.baseFilename = self._path_for(today)
+        self._delete_expired()
+
+    def _delete_expired(self):
+        cutoff = time.time() - self.retention_days * 24 * 60 * 60
+        for path in glob.glob(os.path.join(self.log_dir, f"*_{self.log_name}*")):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
 class Logger:
     def __init__(self):
-        self.logger = logging.getLogger("WhatsAppAutoSender")
-        self.setup_logger()
+        # Handlers (and today's log file) are only set up on first use, not at import time
+        self._logger = None
+        self._listener = None
+        self._setup_lock = threading.RLock()
+
+    @property
+    def logger(self) -> logging.Logger:
+        """The configured logging.Logger, set up on first access"""
+        if self._logger is None:
+            with self._setup_lock:
+                if self._logger is None:
+                    self.setup_logger()
+        return self._logger
 
     def setup_logger(self):
-        """Configure the logger with file and console handlers"""
+        """
+        Configure the logger with file and console handlers
+
+        Records are put on an in-memory queue and written by a background listener
+        thread, so callers never block on disk or console I/O.
+        """
         try:
+            log = logging.getLogger("WhatsAppAutoSender")
+            settings = self._logging_settings()
+
             # Determine log directory based on execution context
-            if getattr(sys, 'frozen', False):
+            if LOG_DIR:
+                base_log_dir = os.path.abspath(LOG_DIR)
+            elif getattr(sys, 'frozen', False):
                 # Running as a bundled executable: use LOCALAPPDATA
                 base_log_dir = os.path.join(os.environ.get('LOCALAPPDATA', os.path.expanduser('~')), "WhatsAppAutoSender", "logs")
             else:
@@ -26,58 +103,90 @@ class Logger:
                 base_log_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'logs'))
 
             os.makedirs(base_log_dir, exist_ok=True)
-            log_file = os.path.join(base_log_dir, f"{datetime.now().strftime('%Y%m%d')}_{LOG_FILE}")
 
             # Set log level
-            self.logger.setLevel(LOG_LEVEL)
-            
+            log.setLevel(settings["level"])
+
             # Create formatters
-            formatter = logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
-            
-            # File handler
-            file_handler = logging.FileHandler(log_file, encoding='utf-8')
+            formatter = logging.Formatter(settings["format"], datefmt=LOG_DATE_FORMAT)
+
+            # File handler, rotated by size and at midnight
+            file_handler = DailyRotatingFileHandler(base_log_dir, LOG_FILE, settings["max_size"], settings["backup_count"])
             file_handler.setFormatter(formatter)
-            
+
             # Console handler
             console_handler = logging.StreamHandler()
             console_handler.setFormatter(formatter)
-            
+
             # Remove any existing handlers
-            if self.logger.hasHandlers():
-                self.logger.handlers.clear()
-            
-            # Add handlers
-            self.logger.addHandler(file_handler)
-            self.logger.addHandler(console_handler)
-            
-            self.log_info(f"Logger initialized successfully. Log file: {log_file}")
-            
+            if log.hasHandlers():
+                log.handlers.clear()
+            if self._listener is not None:
+                self._listener.stop()
+
+            # Add handlers: the logger only enqueues, the listener thread does the writing
+            log_queue = queue.SimpleQueue()
+            log.addHandler(logging.handlers.QueueHandler(log_queue))
+            log.propagate = False
+            self._listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler,
+                                                            respect_handler_level=True)
+            self._listener.start()
+            atexit.register(self.shutdown)
+            self._logger = log
+
+            self.log_info(f"Logger initialized successfully. Log file: {file_handler.baseFilename}")
+
         except Exception as e:
             print(f"Failed to initialize logger: {str(e)}")
             raise
 
-    def log_info(self, message: str):
+    def shutdown(self):
+        """Flush queued records and stop the background writer"""
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.stop()
+
+    def _logging_settings(self) -> dict:
+        """The layered `logging` settings (config.yaml, environment, --set), falling back to the constants"""
+        try:
+            settings = load_logging_settings()
+        except Exception as e:
+            print(f"Failed to read logging settings, using defaults: {str(e)}")
+            settings = {key: setting.default for key, setting in LOGGING_SCHEMA.items()}
+        settings["level"] = settings["level"].upper()
+        return settings
+
+    def is_enabled_for(self, level: int) -> bool:
+        """Check a level before building an expensive message"""
+        return self.logger.isEnabledFor(level)
+
+    # Messages may use %-style arguments, which are only formatted if the level is enabled,
+    # e.g. logger.log_debug("Skipping old file: %s", path)
+
+    def log_info(self, message: str, *args):
         """Log an info message"""
-        self.logger.info(message)
+        self.logger.info(message, *args)
 
-    def log_error(self, exception: Exception, message: str):
+    def log_error(self, exception: Exception, message: str, *args):
         """Log an error message with optional exception"""
+        if args:
+            message = message % args
         if exception:
-            self.logger.error(f"{message} - Exception: {str(exception)}", exc_info=True)
+            self.logger.error("%s - Exception: %s", message, exception, exc_info=True)
         else:
-            self.logger.error(message)
+            self.logger.error("%s", message)
 
-    def log_warning(self, message: str):
+    def log_warning(self, message: str, *args):
         """Log a warning message"""
-        self.logger.warning(message)
+        self.logger.warning(message, *args)
 
-    def log_debug(self, message: str):
+    def log_debug(self, message: str, *args):
         """Log a debug message"""
-        self.logger.debug(message)
+        self.logger.debug(message, *args)
 
-    def log_critical(self, message: str):
+    def log_critical(self, message: str, *args):
         """Log a critical message"""
-        self.logger.critical(message)
+        self.logger.critical(message, *args)
 
     def log_exception(self, exception: Exception, message: str):
         """Log an exception with full traceback"""
@@ -86,7 +195,7 @@ class Logger:
     def log_performance(self, operation: str, start_time: float):
         """Log performance metrics for an operation"""
         duration = time.time() - start_time
-        self.logger.info(f"Performance - {operation}: {duration:.2f} seconds")
+        self.logger.info("Performance - %s: %.2f seconds", operation, duration)
 
 # Create global logger instance
-logger = Logger() 
\ No newline at end of file
+logger = Logger()
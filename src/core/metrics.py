@@ -0,0 +1,250 @@
+"""
+Counters, gauges, histograms and stage spans for the detect -> render -> send pipeline
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Tuple
+from src.core.constants import *
+from src.core.logger import logger
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def _label_key(labels: dict) -> Tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: Tuple) -> str:
+    parts = []
+    for name, value in key:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Monotonically increasing count, optionally split by labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Value that can go up and down, e.g. a queue depth"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            result = []
+            for key, series in self._series.items():
+                for bound, count in zip(self.buckets, series):
+                    result.append((f"{self.name}_bucket", key + (("le", bound),), count))
+                result.append((f"{self.name}_bucket", key + (("le", "+Inf"),), series[-1]))
+                result.append((f"{self.name}_sum", key, series[-2]))
+                result.append((f"{self.name}_count", key, series[-1]))
+            return result
+
+
+class _NullSpan:
+    """Shared no-op context manager returned while metrics are disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class MetricsRegistry:
+    """
+    Registry of all metrics with Prometheus-text and JSON rendering
+
+    While disabled, inc/observe/span return immediately, so instrumented code pays one
+    attribute check per call.
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, help_text: str, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = self._metrics[name] = cls(name, help_text, **kwargs)
+        return metric
+
+    def inc(self, name: str, amount: float = 1, help_text: str = "", **labels) -> None:
+        if self.enabled:
+            self._get(Counter, name, help_text).inc(amount, **labels)
+
+    def set_gauge(self, name: str, value: float, help_text: str = "", **labels) -> None:
+        if self.enabled:
+            self._get(Gauge, name, help_text).set(value, **labels)
+
+    def observe(self, name: str, value: float, help_text: str = "", **labels) -> None:
+        if self.enabled:
+            self._get(Histogram, name, help_text).observe(value, **labels)
+
+    def span(self, stage: str, **labels):
+        """Time a pipeline stage into stage_seconds{stage=...} and count its errors"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._span(stage, labels)
+
+    @contextmanager
+    def _span(self, stage: str, labels: dict):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("stage_errors_total", help_text="Pipeline stages that raised", stage=stage, **labels)
+            raise
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start,
+                         help_text="Time spent per pipeline stage", stage=stage, **labels)
+
+    def timed(self, stage: str, **labels):
+        """Decorator form of span()"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self._span(stage, labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in sorted(self._metrics.values(), key=lambda m: m.name):
+            if metric.help:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """All samples as a JSON-serializable dict"""
+        samples = []
+        for metric in list(self._metrics.values()):
+            for name, key, value in metric.samples():
+                samples.append({"name": name, "labels": {k: str(v) for k, v in key}, "value": value})
+        return {"timestamp": time.time(), "samples": samples}
+
+
+metrics = MetricsRegistry()
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = metrics.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are not worth a log line each
+        pass
+
+
+def start_metrics_exporter(export: str = METRICS_EXPORT, data_dir: str = None):
+    """
+    Enable metrics and start exporting them
+
+    Args:
+        export: "prometheus" serves /metrics on 127.0.0.1:METRICS_PORT,
+                "jsonl" appends a snapshot to METRICS_JSONL_FILE every METRICS_EXPORT_INTERVAL seconds
+        data_dir: Folder for the JSONL file
+    """
+    metrics.enabled = True
+    try:
+        if export == "prometheus":
+            server = ThreadingHTTPServer(("127.0.0.1", METRICS_PORT), _MetricsRequestHandler)
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            logger.log_info(f"Serving metrics on http://127.0.0.1:{METRICS_PORT}/metrics")
+            return server
+        if export == "jsonl":
+            path = os.path.join(data_dir or ".", METRICS_JSONL_FILE)
+            thread = threading.Thread(target=_export_jsonl, args=(path,), name="metrics-jsonl", daemon=True)
+            thread.start()
+            logger.log_info(f"Writing metrics snapshots to {path}")
+            return thread
+        raise ValueError(f"Unknown metrics exporter: {export}")
+    except Exception as e:
+        logger.log_error(e, "Failed to start metrics exporter")
+        raise
+
+
+def _export_jsonl(path: str) -> None:
+    while True:
+        time.sleep(METRICS_EXPORT_INTERVAL)
+        try:
+            with open(path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(metrics.snapshot(), ensure_ascii=False) + "\n")
+        except Exception as e:
+            logger.log_error(e, f"Failed to write metrics to {path}")
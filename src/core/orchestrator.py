@@ -0,0 +1,277 @@
+"""
+asyncio runtime hosting the watchers, senders, retry timers and periodic tasks in one event loop
+"""
+
+import asyncio
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Tuple
+from src.core.constants import *
+from src.core.logger import logger
+from src.core.work_queue import REQUEUED, WorkQueue
+
+
+class Orchestrator:
+    """
+    Run the application's long-lived work as tasks of one event loop
+
+    Every watcher, sender and periodic job is a task, so timers, health checks and
+    config reloads run next to any number of watchers without a thread of their own.
+    Blocking work leaves the loop: filesystem scans and queue waits go to an I/O thread
+    pool, every WhatsApp UI call goes to a dedicated executor, so UI automation always
+    runs on the same thread(s).
+
+    A watcher that fails to open is restarted after ERROR_WAIT_TIME seconds.
+
+    run() blocks until Ctrl+C, SIGTERM or stop(). Shutdown stops the watchers, runs
+    the `on_shutdown` steps (e.g. releasing coalesced batches), lets the senders drain
+    the queue and the sends in flight for up to `drain_timeout` seconds, then runs the
+    `after_drain` steps on the UI executor (e.g. closing WhatsApp). Items that are not
+    sent by then stay unfinished in the outbox and are replayed on the next start.
+    A second Ctrl+C exits without waiting for the queue.
+    """
+
+    def __init__(self, work_queue: WorkQueue, handler: Callable[[Any], Any], breaker=None,
+                 sender_count: int = SENDER_WORKERS, drain_timeout: float = SHUTDOWN_DRAIN_TIMEOUT):
+        """
+        Args:
+            work_queue: Queue drained by the senders
+            handler: Called on the UI executor with each item, returning False counts it as failed
+                     and REQUEUED as handed back for a retry
+            breaker: Optional CircuitBreaker, no items are taken while it is open
+            sender_count: Concurrent senders, and threads of the UI executor
+            drain_timeout: Seconds shutdown waits for queued and in-flight sends
+        """
+        self.work_queue = work_queue
+        self.handler = handler
+        self.breaker = breaker
+        self.sender_count = sender_count
+        self.drain_timeout = drain_timeout
+        self.watchers = []
+        self._periodic: List[Tuple[float, Callable[[], Any], str, bool]] = []
+        self._shutdown_steps: List[Callable[[], Any]] = []
+        self._after_drain_steps: List[Callable[[], Any]] = []
+        self._loop = None
+        self._stop_event = None
+        self._stop_requested = False
+        self._stopping = False
+        self._in_flight = 0
+        self._io = None
+        self._ui = None
+
+    def add_watcher(self, watcher) -> None:
+        """Host a FileWatcher, driven through its open/step/close methods"""
+        self.watchers.append(watcher)
+
+    def every(self, interval: float, func: Callable[[], Any], name: str, ui: bool = False) -> None:
+        """Run `func` every `interval` seconds on the I/O pool, or with `ui` on the UI executor"""
+        self._periodic.append((interval, func, name, ui))
+
+    def on_shutdown(self, func: Callable[[], Any], after_drain: bool = False) -> None:
+        """
+        Run `func` during shutdown: after the watchers stopped, or with `after_drain`
+        on the UI executor once the senders finished
+        """
+        (self._after_drain_steps if after_drain else self._shutdown_steps).append(func)
+
+    def call_later(self, delay: float, func: Callable[..., Any], *args) -> None:
+        """Run func(*args) on the I/O pool after `delay` seconds, safe to call from any thread"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            raise RuntimeError("The orchestrator is not running")
+        loop.call_soon_threadsafe(loop.call_later, delay, self._submit_io, func, *args)
+
+    def stop(self) -> None:
+        """Ask run() to shut down, safe to call from any thread and before run()"""
+        self._stop_requested = True
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self._stop_event.set)
+            except RuntimeError:
+                pass  # The loop closed in the meantime, it is already stopped
+
+    def run(self) -> None:
+        """Run until Ctrl+C, SIGTERM or stop(), then shut down gracefully"""
+        # Each watcher step and each sender's queue wait holds an I/O thread, keep some for timers and periodic tasks
+        self._io = ThreadPoolExecutor(max_workers=len(self.watchers) + self.sender_count + ORCHESTRATOR_SPARE_THREADS,
+                                      thread_name_prefix="io")
+        self._ui = ThreadPoolExecutor(max_workers=self.sender_count, thread_name_prefix="whatsapp-ui")
+        previous_handlers = self._install_signal_handlers()
+        try:
+            asyncio.run(self._main())
+        except KeyboardInterrupt:
+            logger.log_warning("Stopped without waiting for queued notifications, they are replayed on the next start")
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+            # Every submitted call was awaited by a task, the pools only have to finish the ones still running
+            self._io.shutdown(wait=True)
+            self._ui.shutdown(wait=True)
+
+    def _install_signal_handlers(self) -> dict:
+        """
+        Turn Ctrl+C and SIGTERM into stop(), returns the handlers they replace
+
+        signal.signal works on every platform and Python version, unlike loop signal
+        handlers, and only in the main thread.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return {}
+        previous = {}
+        for name in ("SIGINT", "SIGTERM", "SIGBREAK"):
+            signum = getattr(signal, name, None)
+            if signum is not None:
+                previous[signum] = signal.signal(signum, self._on_signal)
+        return previous
+
+    def _on_signal(self, signum, frame) -> None:
+        if self._stop_requested:
+            # A second Ctrl+C: stop waiting for the queue, asyncio.run cancels the tasks
+            raise KeyboardInterrupt
+        self.stop()
+
+    async def _main(self) -> None:
+        self._stop_event = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        if self._stop_requested:
+            self._stop_event.set()
+
+        watcher_tasks = [asyncio.create_task(self._watch(watcher)) for watcher in self.watchers]
+        periodic_tasks = [asyncio.create_task(self._every(*job)) for job in self._periodic]
+        sender_tasks = [asyncio.create_task(self._send(f"sender-{index + 1}")) for index in range(self.sender_count)]
+        cancelled = False
+        try:
+            await self._stop_event.wait()
+        except asyncio.CancelledError:
+            # Cancelled from outside: shut down gracefully first, then let the cancellation through
+            cancelled = True
+        logger.log_info("Stopping WhatsApp Auto Sender...")
+
+        for task in watcher_tasks + periodic_tasks:
+            task.cancel()
+        await asyncio.gather(*watcher_tasks, *periodic_tasks, return_exceptions=True)
+        for step in self._shutdown_steps:
+            await self._run_step(self._io, step)
+
+        logger.log_info("Waiting for queued notifications to be sent...")
+        deadline = time.time() + self.drain_timeout
+        while (len(self.work_queue) or self._in_flight) and time.time() < deadline:
+            await asyncio.sleep(0.1)
+        if len(self.work_queue) or self._in_flight:
+            logger.log_warning(f"{len(self.work_queue)} notifications not sent after {self.drain_timeout}s, "
+                               f"they are replayed on the next start")
+        # Senders finish the item they are sending and take no new ones
+        self._stopping = True
+        await asyncio.gather(*sender_tasks, return_exceptions=True)
+        for step in self._after_drain_steps:
+            await self._run_step(self._ui, step)
+        if cancelled:
+            raise asyncio.CancelledError()
+
+    async def _watch(self, watcher) -> None:
+        """Keep one watcher running, restarting it when it fails"""
+        while True:
+            try:
+                await self._run_watcher(watcher)
+            except asyncio.CancelledError:
+                # Listed first everywhere below: it is an Exception before Python 3.8
+                raise
+            except Exception as e:
+                logger.log_error(e, f"Watcher for {watcher.directory} stopped, restarting it in {ERROR_WAIT_TIME}s")
+                await asyncio.sleep(ERROR_WAIT_TIME)
+
+    async def _run_watcher(self, watcher) -> None:
+        """Open a watcher, then a step on the I/O pool and a wait for its next deadline or an event, until cancelled"""
+        loop = self._loop
+        wakeup = asyncio.Event()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                pass  # The loop closed while the observer was still reporting
+
+        watcher.on_event = wake
+        # Cancelling this task does not stop a call already running on the I/O pool
+        running = loop.run_in_executor(self._io, watcher.open)
+        try:
+            await asyncio.shield(running)
+            while True:
+                wakeup.clear()
+                running = loop.run_in_executor(self._io, watcher.step)
+                try:
+                    timeout = await asyncio.shield(running)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.log_error(e, "Error in file watcher loop")
+                    timeout = ERROR_WAIT_TIME
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            watcher.on_event = None
+            if not running.done():
+                # close() saves the directory index that the running step may still be changing
+                await asyncio.wait([running])
+            await asyncio.shield(loop.run_in_executor(self._io, watcher.close))
+
+    async def _send(self, name: str) -> None:
+        """Drain the work queue, sending each item on the UI executor"""
+        logger.log_info(f"Sender {name} started")
+        while not self._stopping:
+            if self.breaker is not None and self.breaker.state != self.breaker.CLOSED:
+                # The health probe drives WhatsApp, so it runs on the UI executor too
+                if not await self._loop.run_in_executor(self._ui, self.breaker.allow):
+                    await asyncio.sleep(min(max(self.breaker.seconds_until_probe(), 0.1), 1))
+                    continue
+            try:
+                item = await self._loop.run_in_executor(self._io, self.work_queue.get, 1)
+            except queue.Empty:
+                continue
+            self._in_flight += 1
+            success, requeued = True, False
+            try:
+                result = await self._loop.run_in_executor(self._ui, self.handler, item)
+                success, requeued = result is not False, result == REQUEUED
+            except asyncio.CancelledError:
+                # Only on a forced exit, the send itself finishes on the UI executor
+                raise
+            except Exception as e:
+                success = False
+                logger.log_error(e, f"Sender {name} failed to process {item}")
+            finally:
+                self.work_queue.task_done(success, requeued)
+                self._in_flight -= 1
+        logger.log_info(f"Sender {name} stopped")
+
+    async def _every(self, interval: float, func: Callable[[], Any], name: str, ui: bool) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._loop.run_in_executor(self._ui if ui else self._io, func)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.log_error(e, f"Periodic task '{name}' failed")
+
+    async def _run_step(self, executor: ThreadPoolExecutor, step: Callable[[], Any]) -> None:
+        try:
+            await self._loop.run_in_executor(executor, step)
+        except Exception as e:
+            logger.log_error(e, f"Shutdown step {getattr(step, '__name__', step)} failed")
+
+    def _submit_io(self, func: Callable[..., Any], *args) -> None:
+        """Run a timer callback on the I/O pool, logging its errors"""
+        def guarded():
+            try:
+                func(*args)
+            except Exception as e:
+                logger.log_error(e, f"Timer callback {getattr(func, '__name__', func)} failed")
+        if not self._stopping:
+            self._loop.run_in_executor(self._io, guarded)
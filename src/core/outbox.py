@@ -0,0 +1,232 @@
+"""
+Durable outbox tracking every detected file until its notification is sent
+
+Usage (inspection CLI):
+    python -m src.core.outbox stats
+    python -m src.core.outbox list [--state failed] [--limit 50]
+    python -m src.core.outbox retry [ID ...]
+    python -m src.core.outbox purge [--days 30]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Iterable, List, Optional
+from src.core.constants import *
+from src.core.logger import logger
+
+DETECTED = "detected"
+RENDERED = "rendered"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+STATES = (DETECTED, RENDERED, SENDING, SENT, FAILED)
+UNFINISHED_STATES = (DETECTED, RENDERED, SENDING)
+
+
+class Outbox:
+    """
+    Write-ahead record of each file's delivery state, stored in SQLite (WAL mode)
+
+    A file is recorded as `detected` before it enters the in-memory pipeline, then moves
+    through `rendered` and `sending` to `sent` or `failed`. Anything still unfinished
+    when the process dies is returned by `pending()` and replayed on the next start, so
+    a crash or a killed WhatsApp window never loses a notification. Delivery is
+    at-least-once: a file that was `sending` during a crash is sent again.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        try:
+            self._connection = sqlite3.connect(db_path, check_same_thread=False)
+            self._connection.row_factory = sqlite3.Row
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " path TEXT NOT NULL,"
+                " size INTEGER,"
+                " mtime_ns INTEGER,"
+                " contact TEXT,"
+                " state TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " last_error TEXT,"
+                " detected_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS outbox_state ON outbox (state, detected_at)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS outbox_path ON outbox (path)")
+            self._connection.commit()
+        except Exception as e:
+            logger.log_error(e, f"Failed to open outbox: {db_path}")
+            raise
+
+    def record_detected(self, file_path: str, size: int = None, mtime_ns: int = None, contact: str = None) -> int:
+        """
+        Record a newly detected file, returns its outbox id
+
+        A file that already has an unfinished entry keeps that entry.
+        """
+        if size is None or mtime_ns is None:
+            try:
+                stat = os.stat(file_path)
+                size, mtime_ns = stat.st_size, stat.st_mtime_ns
+            except OSError:
+                pass
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT id FROM outbox WHERE path = ? AND state IN ({_placeholders(UNFINISHED_STATES)})",
+                (file_path, *UNFINISHED_STATES),
+            ).fetchone()
+            if row is not None:
+                return row["id"]
+            cursor = self._connection.execute(
+                "INSERT INTO outbox (path, size, mtime_ns, contact, state, detected_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (file_path, size, mtime_ns, contact, DETECTED, now, now),
+            )
+            self._connection.commit()
+            return cursor.lastrowid
+
+    def mark(self, file_paths: Iterable[str], state: str, error: str = None) -> int:
+        """
+        Move the unfinished entries of `file_paths` to `state`
+
+        Entering `sending` counts as a delivery attempt. Returns the number of entries updated.
+        """
+        if state not in STATES:
+            raise ValueError(f"Unknown outbox state: {state}")
+        file_paths = list(file_paths)
+        if not file_paths:
+            return 0
+        attempts = 1 if state == SENDING else 0
+        with self._lock:
+            cursor = self._connection.execute(
+                f"UPDATE outbox SET state = ?, attempts = attempts + ?, last_error = COALESCE(?, last_error),"
+                f" updated_at = ? WHERE path IN ({_placeholders(file_paths)})"
+                f" AND state IN ({_placeholders(UNFINISHED_STATES)})",
+                (state, attempts, error, time.time(), *file_paths, *UNFINISHED_STATES),
+            )
+            self._connection.commit()
+            return cursor.rowcount
+
+    def pending(self) -> List[str]:
+        """Paths of all unfinished entries, oldest first"""
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT path FROM outbox WHERE state IN ({_placeholders(UNFINISHED_STATES)}) ORDER BY detected_at",
+                UNFINISHED_STATES,
+            ).fetchall()
+        return [row["path"] for row in rows]
+
+    def entries(self, state: str = None, limit: int = 50) -> List[sqlite3.Row]:
+        """Most recent entries, optionally only those in `state`"""
+        query = "SELECT * FROM outbox"
+        params = []
+        if state:
+            query += " WHERE state = ?"
+            params.append(state)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return self._connection.execute(query, params).fetchall()
+
+    def counts(self) -> dict:
+        """Number of entries per state"""
+        with self._lock:
+            rows = self._connection.execute("SELECT state, COUNT(*) AS count FROM outbox GROUP BY state").fetchall()
+        counts = {state: 0 for state in STATES}
+        counts.update({row["state"]: row["count"] for row in rows})
+        return counts
+
+    def retry(self, ids: Optional[Iterable[int]] = None) -> int:
+        """Reset failed entries (all of them, or only `ids`) to detected so the next start replays them"""
+        query = "UPDATE outbox SET state = ?, updated_at = ? WHERE state = ?"
+        params = [DETECTED, time.time(), FAILED]
+        if ids:
+            ids = list(ids)
+            query += f" AND id IN ({_placeholders(ids)})"
+            params.extend(ids)
+        with self._lock:
+            cursor = self._connection.execute(query, params)
+            self._connection.commit()
+            return cursor.rowcount
+
+    def purge(self, older_than: float = OUTBOX_RETENTION) -> int:
+        """Delete sent entries last updated more than `older_than` seconds ago"""
+        try:
+            with self._lock:
+                cursor = self._connection.execute(
+                    "DELETE FROM outbox WHERE state = ? AND updated_at < ?", (SENT, time.time() - older_than)
+                )
+                self._connection.commit()
+            if cursor.rowcount:
+                logger.log_info(f"Purged {cursor.rowcount} sent entries from the outbox")
+            return cursor.rowcount
+        except Exception as e:
+            logger.log_error(e, "Failed to purge outbox")
+            return 0
+
+    def close(self) -> None:
+        """Close the database connection"""
+        with self._lock:
+            self._connection.close()
+
+
+def _placeholders(values) -> str:
+    return ", ".join("?" for _ in values)
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    """The application's outbox in the data folder, opened on first use"""
+    global _outbox
+    if _outbox is None:
+        with _outbox_lock:
+            if _outbox is None:
+                from src.core.config import config
+                _outbox = Outbox(os.path.join(config.data_dir, OUTBOX_FILE))
+    return _outbox
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.core.outbox", description="Inspect the notification outbox")
+    parser.add_argument("--db", help="outbox database, defaults to the one in the data folder")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="number of entries per state")
+    list_parser = commands.add_parser("list", help="most recent entries")
+    list_parser.add_argument("--state", choices=STATES)
+    list_parser.add_argument("--limit", type=int, default=50)
+    retry_parser = commands.add_parser("retry", help="replay failed entries on the next start")
+    retry_parser.add_argument("ids", nargs="*", type=int, help="entry ids, all failed entries if omitted")
+    purge_parser = commands.add_parser("purge", help="delete old sent entries")
+    purge_parser.add_argument("--days", type=float, default=OUTBOX_RETENTION / (24 * 60 * 60))
+    args = parser.parse_args(argv)
+
+    outbox = Outbox(args.db) if args.db else get_outbox()
+    if args.command == "stats":
+        for state, count in outbox.counts().items():
+            print(f"{state:<10}{count}")
+    elif args.command == "list":
+        for entry in outbox.entries(args.state, args.limit):
+            updated = time.strftime(LOG_DATE_FORMAT, time.localtime(entry["updated_at"]))
+            error = f"  {entry['last_error']}" if entry["last_error"] else ""
+            print(f"{entry['id']:>6}  {entry['state']:<9} {entry['attempts']:>2}  {updated}  {entry['path']}{error}")
+    elif args.command == "retry":
+        print(f"{outbox.retry(args.ids)} entries will be replayed on the next start")
+    elif args.command == "purge":
+        print(f"Purged {outbox.purge(args.days * 24 * 60 * 60)} sent entries")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Priority scheduling of pending notifications by folder, file type and age
+"""
+
+import itertools
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional, Tuple
+from src.core.constants import *
+from src.core.logger import logger
+from src.core.metrics import metrics
+from src.core.settings import load_yaml_settings
+from src.core.work_queue import WorkQueue
+
+
+class PriorityPolicy:
+    """
+    Assign a priority class to a detected file or batch of files
+
+    A file's class comes from the first rule that matches: the class its route assigns
+    (`route_func`), its contact or any component
+    of its relative folder (`folders`), then its extension (`extensions`), otherwise
+    `default_class`. A batch gets the most urgent class of its files. Classification
+    never fails, a file that cannot be routed is classified by the other rules.
+    """
+
+    def __init__(self, classes: dict = None, default_class: str = None, folders: dict = None,
+                 extensions: dict = None, aging_seconds: float = None,
+                 folder_func: Optional[Callable[[str], Tuple[str, str]]] = None,
+                 route_func: Optional[Callable[[str], Optional[str]]] = None):
+        """
+        Args:
+            classes: Class name -> rank, lower ranks are sent first
+            default_class: Class of files no rule matches
+            folders: Contact or subfolder name -> class, matched case-insensitively
+            extensions: File extension (".pdf") -> class
+            aging_seconds: Seconds of waiting worth one class of priority, 0 for strict priorities
+            folder_func: Returns (contact_name, relative_folder) for a path, by default every
+                         folder name in the path is matched
+            route_func: Returns the class a routing rule assigns to a path, or None
+        """
+        self.classes = dict(classes if classes is not None else PRIORITY_CLASSES)
+        self.default_class = default_class or PRIORITY_DEFAULT_CLASS
+        self.folders = {name.casefold(): cls for name, cls in (folders if folders is not None else PRIORITY_FOLDERS).items()}
+        self.extensions = {ext.lower(): cls for ext, cls in (extensions if extensions is not None else PRIORITY_EXTENSIONS).items()}
+        self.aging_seconds = PRIORITY_AGING_SECONDS if aging_seconds is None else aging_seconds
+        self.folder_func = folder_func
+        self.route_func = route_func
+        for cls in [self.default_class, *self.folders.values(), *self.extensions.values()]:
+            if cls not in self.classes:
+                raise ValueError(f"Unknown priority class '{cls}', expected one of {sorted(self.classes)}")
+
+    @classmethod
+    def from_settings(cls, settings: dict = None, **kwargs) -> "PriorityPolicy":
+        """Build a policy from the config.yaml `priorities` section, falling back to the constants"""
+        try:
+            if settings is None:
+                settings = load_yaml_settings().get("priorities") or {}
+            return cls(
+                classes=settings.get("classes"),
+                default_class=settings.get("default_class"),
+                folders=settings.get("folders"),
+                extensions=settings.get("extensions"),
+                aging_seconds=settings.get("aging_seconds"),
+                **kwargs,
+            )
+        except Exception as e:
+            logger.log_error(e, "Invalid priority settings")
+            raise
+
+    def classify_file(self, file_path: str) -> str:
+        """Priority class of a single file"""
+        if self.route_func is not None:
+            try:
+                cls = self.route_func(file_path)
+            except Exception as e:
+                # Never fail the hand-off: the sender hits the same error and marks the file failed
+                logger.log_warning(f"Could not route {file_path} for its priority ({e}), using the folder and extension rules")
+                cls = None
+            if cls is not None:
+                if cls in self.classes:
+                    return cls
+                logger.log_warning(f"Unknown priority class '{cls}' routed for {file_path}, using the folder and extension rules")
+        if self.folders:
+            names = self._folder_names(file_path)
+            for name in names:
+                cls = self.folders.get(name.casefold())
+                if cls is not None:
+                    return cls
+        cls = self.extensions.get(os.path.splitext(file_path)[1].lower())
+        return cls if cls is not None else self.default_class
+
+    def classify(self, item: Any) -> str:
+        """Priority class of a file path or a batch of file paths"""
+        paths = [item] if isinstance(item, (str, os.PathLike)) else list(item)
+        return min((self.classify_file(str(path)) for path in paths), key=self.classes.__getitem__,
+                   default=self.default_class)
+
+    def sort_key(self, cls: str, enqueued_at: float) -> tuple:
+        """Queue ordering key of an item of class `cls` enqueued at `enqueued_at`"""
+        rank = self.classes[cls]
+        if self.aging_seconds > 0:
+            return (rank * self.aging_seconds + enqueued_at,)
+        return rank, enqueued_at
+
+    def _folder_names(self, file_path: str) -> Iterable[str]:
+        if self.folder_func is not None:
+            try:
+                contact_name, relative_folder = self.folder_func(file_path)
+                return [contact_name, *Path(relative_folder).parts]
+            except Exception:
+                pass  # A file that cannot be routed is matched on every folder name in its path
+        return Path(file_path).parent.parts
+
+
+class PriorityWorkQueue(WorkQueue):
+    """
+    WorkQueue that hands out the most urgent item first
+
+    Items are ordered by ``rank * aging_seconds + enqueued_at``. Because every waiting
+    item ages at the same rate this key never has to be recomputed: an item that has
+    waited `aging_seconds` ranks with a new item one class above it, so bulk work is
+    delayed but never starved. Items of the same class come out in FIFO order. With
+    aging_seconds set to 0 the classes are strict.
+    """
+
+    def __init__(self, policy: PriorityPolicy = None, maxsize: int = WORK_QUEUE_SIZE):
+        super().__init__(maxsize)
+        self.policy = policy or PriorityPolicy.from_settings()
+        self._queue = queue.PriorityQueue(maxsize)
+        self._sequence = itertools.count()
+        self._class_lock = threading.Lock()
+        self._class_stats = {cls: {"depth": 0, "dequeued": 0, "total_wait": 0.0, "max_wait": 0.0}
+                             for cls in self.policy.classes}
+
+    def _make_entry(self, item: Any, enqueued_at: float) -> tuple:
+        cls = self.policy.classify(item)
+        key = self.policy.sort_key(cls, enqueued_at)
+        with self._class_lock:
+            self._class_stats[cls]["depth"] += 1
+            depth = self._class_stats[cls]["depth"]
+        metrics.set_gauge("priority_queue_depth", depth, help_text="Items waiting per priority class", priority=cls)
+        return key, next(self._sequence), cls, item, enqueued_at
+
+    def _unpack_entry(self, entry: tuple) -> tuple:
+        _, _, cls, item, enqueued_at = entry
+        waited = time.time() - enqueued_at
+        with self._class_lock:
+            stats = self._class_stats[cls]
+            stats["depth"] -= 1
+            stats["dequeued"] += 1
+            stats["total_wait"] += waited
+            stats["max_wait"] = max(stats["max_wait"], waited)
+            depth = stats["depth"]
+        metrics.set_gauge("priority_queue_depth", depth, help_text="Items waiting per priority class", priority=cls)
+        metrics.observe("priority_wait_seconds", waited, help_text="Time items spent queued per priority class",
+                        priority=cls)
+        return item, enqueued_at
+
+    def class_stats(self) -> dict:
+        """Queue depth and wait times per priority class"""
+        with self._class_lock:
+            return {
+                cls: {
+                    "depth": stats["depth"],
+                    "dequeued": stats["dequeued"],
+                    "avg_wait_seconds": round(stats["total_wait"] / stats["dequeued"], 3) if stats["dequeued"] else 0.0,
+                    "max_wait_seconds": round(stats["max_wait"], 3),
+                }
+                for cls, stats in self._class_stats.items()
+            }
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["priorities"] = self.class_stats()
+        return stats
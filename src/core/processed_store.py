@@ -0,0 +1,167 @@
+"""
+Persistent store of files that were already processed
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from src.core.constants import *
+from src.core.logger import logger
+
+
+def file_content_hash(file_path: str) -> str:
+    """Return the SHA-256 of a file's content, read in 1 MB chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ProcessedFileStore:
+    """
+    Dedup store keyed by (path, size, mtime, optional content hash)
+
+    Records live in SQLite so they survive restarts. The most recently used records are
+    also kept in a bounded in-memory LRU, so lookups for active folders never touch the
+    database and memory stays flat however long the application runs. Records older than
+    `max_age` seconds, or beyond the newest `max_entries`, are evicted.
+    """
+
+    def __init__(self, db_path: str, max_entries: int = PROCESSED_STORE_MAX_ENTRIES,
+                 max_age: float = PROCESSED_STORE_MAX_AGE, cache_size: int = PROCESSED_CACHE_SIZE,
+                 use_hash: bool = PROCESSED_STORE_HASH):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.cache_size = cache_size
+        self.use_hash = use_hash
+        self._cache: "OrderedDict[str, Tuple[int, int, Optional[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pruned_at = 0.0
+        try:
+            self._connection = sqlite3.connect(db_path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS processed_files ("
+                " path TEXT PRIMARY KEY,"
+                " size INTEGER,"
+                " mtime_ns INTEGER,"
+                " content_hash TEXT,"
+                " processed_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS processed_files_processed_at ON processed_files (processed_at)"
+            )
+            self._connection.commit()
+            self.prune()
+        except Exception as e:
+            logger.log_error(e, f"Failed to open processed file store: {db_path}")
+            raise
+
+    def __contains__(self, file_path: str) -> bool:
+        """Check a path against its current size and mtime on disk"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return self._lookup(file_path) is not None
+        return self.contains(file_path, stat.st_size, stat.st_mtime_ns)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM processed_files").fetchone()[0]
+
+    def contains(self, file_path: str, size: int, mtime_ns: int) -> bool:
+        """Check whether this exact version of the file was already processed"""
+        record = self._lookup(file_path)
+        if record is None:
+            return False
+        recorded_size, recorded_mtime_ns, recorded_hash = record
+        if (recorded_size, recorded_mtime_ns) == (size, mtime_ns):
+            return True
+        # Sync clients often touch mtime without changing content, the hash tells them apart
+        if self.use_hash and recorded_hash and recorded_size == size:
+            try:
+                return file_content_hash(file_path) == recorded_hash
+            except OSError:
+                return False
+        return False
+
+    def add(self, file_path: str, size: int = None, mtime_ns: int = None) -> None:
+        """Record a file as processed"""
+        try:
+            if size is None or mtime_ns is None:
+                stat = os.stat(file_path)
+                size, mtime_ns = stat.st_size, stat.st_mtime_ns
+            content_hash = file_content_hash(file_path) if self.use_hash else None
+        except OSError:
+            content_hash = None
+        record = (size, mtime_ns, content_hash)
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO processed_files (path, size, mtime_ns, content_hash, processed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (file_path, size, mtime_ns, content_hash, time.time()),
+            )
+            self._connection.commit()
+            self._remember(file_path, record)
+        if time.time() - self._pruned_at > PROCESSED_STORE_PRUNE_INTERVAL:
+            self.prune()
+
+    def prune(self) -> int:
+        """Evict records older than max_age and the oldest records beyond max_entries"""
+        try:
+            with self._lock:
+                cursor = self._connection.execute(
+                    "DELETE FROM processed_files WHERE processed_at < ?", (time.time() - self.max_age,)
+                )
+                removed = cursor.rowcount
+                cursor = self._connection.execute(
+                    "DELETE FROM processed_files WHERE path IN ("
+                    " SELECT path FROM processed_files ORDER BY processed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+                removed += cursor.rowcount
+                self._connection.commit()
+                if removed:
+                    # Evicted rows may still be cached, rebuild lazily from the database
+                    self._cache.clear()
+                self._pruned_at = time.time()
+            if removed:
+                logger.log_info(f"Evicted {removed} old records from processed file store")
+            return removed
+        except Exception as e:
+            logger.log_error(e, "Failed to prune processed file store")
+            return 0
+
+    def close(self) -> None:
+        """Close the database connection"""
+        with self._lock:
+            self._connection.close()
+
+    def _lookup(self, file_path: str) -> Optional[Tuple[int, int, Optional[str]]]:
+        """Return (size, mtime_ns, content_hash) for a path, from the LRU or the database"""
+        with self._lock:
+            record = self._cache.get(file_path)
+            if record is not None:
+                self._cache.move_to_end(file_path)
+                return record
+            row = self._connection.execute(
+                "SELECT size, mtime_ns, content_hash FROM processed_files WHERE path = ?", (file_path,)
+            ).fetchone()
+            if row is None:
+                return None
+            record = tuple(row)
+            self._remember(file_path, record)
+            return record
+
+    def _remember(self, file_path: str, record: Tuple[int, int, Optional[str]]) -> None:
+        """Put a record in the LRU, evicting the least recently used one when full (lock held)"""
+        self._cache[file_path] = record
+        self._cache.move_to_end(file_path)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
@@ -0,0 +1,282 @@
+"""
+Retry policies, non-blocking retry scheduling and a circuit breaker for the sender
+"""
+
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+from src.core.constants import *
+from src.core.logger import logger
+from src.core.metrics import metrics
+
+
+class RetryPolicy:
+    """How often and how soon a failed send of one error class is retried"""
+
+    def __init__(self, max_attempts: int = MAX_RETRIES, base_delay: float = RETRY_DELAY,
+                 max_delay: float = RETRY_MAX_DELAY, backoff: float = RETRY_BACKOFF,
+                 jitter: float = RETRY_JITTER, trips_breaker: bool = True):
+        """
+        Args:
+            max_attempts: Attempts in total, 1 means no retries
+            base_delay: Seconds before the first retry
+            max_delay: Upper bound for a single delay
+            backoff: Multiplier applied for every further retry
+            jitter: Fraction (0-1) of each delay that is randomized
+            trips_breaker: Whether this failure says the transport is unhealthy
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.jitter = jitter
+        self.trips_breaker = trips_breaker
+
+    def delay(self, attempt: int, rng: random.Random = random) -> float:
+        """Seconds to wait after failed attempt number `attempt` (1-based)"""
+        delay = min(self.base_delay * self.backoff ** (attempt - 1), self.max_delay)
+        return delay * (1 - self.jitter * rng.random())
+
+
+class RetryPolicies:
+    """Pick the RetryPolicy for an exception by its class name, walking up its base classes"""
+
+    def __init__(self, overrides: Dict[str, dict] = None, default: RetryPolicy = None):
+        self.default = default or RetryPolicy()
+        self.policies = {
+            name: RetryPolicy(**{**_policy_settings(self.default), **settings})
+            for name, settings in (RETRY_POLICIES if overrides is None else overrides).items()
+        }
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> "RetryPolicies":
+        """Build the policies from the `retry_attempts`, `retry_delay` and `retry_policies` settings"""
+        default = RetryPolicy(max_attempts=settings.get("retry_attempts", MAX_RETRIES),
+                              base_delay=settings.get("retry_delay", RETRY_DELAY))
+        return cls(settings.get("retry_policies"), default)
+
+    def for_error(self, error: BaseException) -> RetryPolicy:
+        for cls in type(error).__mro__:
+            policy = self.policies.get(cls.__name__)
+            if policy is not None:
+                return policy
+        return self.default
+
+
+def _policy_settings(policy: RetryPolicy) -> dict:
+    return {
+        "max_attempts": policy.max_attempts, "base_delay": policy.base_delay, "max_delay": policy.max_delay,
+        "backoff": policy.backoff, "jitter": policy.jitter, "trips_breaker": policy.trips_breaker,
+    }
+
+
+class RetryScheduler:
+    """
+    Count attempts per item and hand failed items back to the queue after their backoff
+
+    Nothing sleeps on a sender thread: a timer thread (or the `timer` given, e.g. an
+    event loop) re-enqueues each item when its delay has passed, so other work keeps
+    flowing in the meantime.
+    """
+
+    def __init__(self, policies: RetryPolicies = None, requeue: Callable[[Any], Any] = None, seed: int = None,
+                 timer: Callable[..., Any] = None):
+        """
+        Args:
+            policies: Retry policy per error class
+            requeue: Puts an item back on the work queue, without one the caller waits itself
+            seed: Seed for the jitter
+            timer: timer(delay, func, *args) runs func(*args) after delay seconds,
+                   e.g. Orchestrator.call_later; without one a timer thread is used
+        """
+        self.policies = policies or RetryPolicies()
+        self.requeue = requeue
+        self.timer = timer
+        self._timed = 0
+        self._attempts: Dict[Hashable, int] = {}
+        self._heap: List[Tuple[float, int, Any]] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = True
+        self._random = random.Random(seed)
+        self.scheduled = 0
+        self.exhausted = 0
+
+    def attempts(self, item: Any) -> int:
+        with self._condition:
+            return self._attempts.get(_key(item), 0)
+
+    def succeeded(self, item: Any) -> None:
+        """Forget the attempts of an item that went through"""
+        with self._condition:
+            self._attempts.pop(_key(item), None)
+
+    def next_delay(self, item: Any, error: BaseException) -> Optional[float]:
+        """
+        Record a failed attempt, returns the backoff before the next one or None when
+        the item's policy allows no more attempts
+        """
+        policy = self.policies.for_error(error)
+        key = _key(item)
+        with self._condition:
+            attempt = self._attempts.get(key, 0) + 1
+            if attempt >= policy.max_attempts:
+                self._attempts.pop(key, None)
+                self.exhausted += 1
+                return None
+            self._attempts[key] = attempt
+            return policy.delay(attempt, self._random)
+
+    def schedule(self, item: Any, delay: float) -> None:
+        """Hand `item` to `requeue` after `delay` seconds"""
+        if self.timer is not None:
+            with self._condition:
+                if not self._running:
+                    # Stopped for shutdown, the item stays unfinished in the outbox
+                    return
+                self._timed += 1
+                self.scheduled += 1
+            self.timer(delay, self._fire, item)
+            metrics.inc("retries_scheduled_total", help_text="Failed sends scheduled for another attempt")
+            return
+        with self._condition:
+            heapq.heappush(self._heap, (time.time() + delay, next(self._sequence), item))
+            self.scheduled += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._running = True
+                self._thread = threading.Thread(target=self._run, name="retry-scheduler", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        metrics.inc("retries_scheduled_total", help_text="Failed sends scheduled for another attempt")
+
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._heap) + self._timed
+
+    def stop(self) -> None:
+        """Stop the timer thread, scheduled retries stay unfinished in the outbox"""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while self._running and (not self._heap or self._heap[0][0] > time.time()):
+                    timeout = self._heap[0][0] - time.time() if self._heap else None
+                    self._condition.wait(timeout)
+                if not self._running:
+                    return
+                _, _, item = heapq.heappop(self._heap)
+            self._requeue(item)
+
+    def _fire(self, item: Any) -> None:
+        """A retry handed to `timer` is due"""
+        with self._condition:
+            self._timed -= 1
+            if not self._running:
+                return
+        self._requeue(item)
+
+    def _requeue(self, item: Any) -> None:
+        try:
+            self.requeue(item)
+        except Exception as e:
+            logger.log_error(e, f"Failed to re-queue {item} for retry")
+
+
+def _key(item: Any) -> Hashable:
+    return tuple(item) if isinstance(item, list) else item
+
+
+class CircuitBreaker:
+    """
+    Pause all sends while the transport keeps failing
+
+    After `failure_threshold` consecutive failures the breaker opens and `allow()`
+    returns False. Once `reset_timeout` seconds have passed, the next `allow()` runs
+    `probe` (e.g. connect to WhatsApp): success closes the breaker, failure keeps it
+    open and doubles the wait before the next probe, up to `max_reset_timeout`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+
+    def __init__(self, probe: Callable[[], bool] = None, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_TIMEOUT, max_reset_timeout: float = CIRCUIT_MAX_RESET_TIMEOUT):
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._current_timeout = reset_timeout
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.probes = 0
+
+    def allow(self) -> bool:
+        """Whether a send may go ahead now, probes the transport when a probe is due"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if time.time() - self._opened_at < self._current_timeout:
+                return False
+            if self.probe is None:
+                # Without a probe the next real send is the probe: one more failure reopens
+                self._close()
+                self._failures = self.failure_threshold - 1
+                return True
+            self.probes += 1
+            # Hold the lock while probing so only one thread probes
+            healthy = self._run_probe()
+            if healthy:
+                logger.log_info("WhatsApp is healthy again, resuming sends")
+                self._close()
+                return True
+            self._current_timeout = min(self._current_timeout * 2, self.max_reset_timeout)
+            self._opened_at = time.time()
+            logger.log_warning(f"WhatsApp health probe failed, next probe in {self._current_timeout:.0f}s")
+            return False
+
+    def seconds_until_probe(self) -> float:
+        """Seconds until `allow()` would probe, 0 when closed"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0.0
+            return max(self._opened_at + self._current_timeout - time.time(), 0.0)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._close()
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == self.CLOSED and self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.time()
+                self._current_timeout = self.reset_timeout
+                self.opened += 1
+                metrics.set_gauge("circuit_open", 1, help_text="1 while sends are paused")
+                logger.log_warning(f"{self._failures} consecutive send failures, pausing sends for {self.reset_timeout}s")
+
+    def _close(self) -> None:
+        """Back to normal operation (lock held)"""
+        if self.state != self.CLOSED:
+            metrics.set_gauge("circuit_open", 0, help_text="1 while sends are paused")
+        self.state = self.CLOSED
+        self._failures = 0
+        self._current_timeout = self.reset_timeout
+
+    def _run_probe(self) -> bool:
+        try:
+            return bool(self.probe())
+        except Exception as e:
+            logger.log_error(e, "WhatsApp health probe raised")
+            return False
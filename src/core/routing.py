@@ -0,0 +1,180 @@
+"""
+Routing of file paths to their contact, template, link and priority through a path-component trie
+"""
+
+import os
+import urllib.parse
+from typing import Dict, Iterable, List, NamedTuple, Optional
+from src.core.constants import *
+from src.core.watch_roots import WatchRoot
+
+
+class Route(NamedTuple):
+    root: WatchRoot
+    contact: str
+    relative_folder: str
+    template_path: str
+    link: str  # SharePoint link to the contact's folder
+    priority: Optional[str]  # priority class set by a routing rule, None to let the priority policy decide
+
+
+class RoutingRule:
+    """
+    Overrides for every file below one folder
+
+    Rules nest: a rule on a deeper folder overrides the settings of rules above it,
+    settings it leaves unset are inherited.
+    """
+
+    def __init__(self, path: str, contact: str = None, template: str = None, link: str = None, priority: str = None):
+        """
+        Args:
+            path: Folder the rule applies to
+            contact: Send notifications for these files to this contact instead of the folder-derived one
+            template: Message template file to use instead of the watch root's
+            link: SharePoint link to use as is instead of root_path plus the contact folder
+            priority: Priority class of these files
+        """
+        self.path = str(path)
+        self.contact = contact
+        self.template = template
+        self.link = link
+        self.priority = priority
+
+    def __repr__(self) -> str:
+        return f"RoutingRule({self.path!r})"
+
+    @classmethod
+    def from_settings(cls, entry: dict, roots: List[WatchRoot], base_dir: str) -> "RoutingRule":
+        """
+        Build a rule from one entry of the config.yaml `routes` list
+
+        A relative `path` is taken relative to the folder of the watch root named by
+        `root`, by default the first watch root.
+        """
+        if not entry.get("path"):
+            raise ValueError(f"Each route needs a path: {entry}")
+        path = str(entry["path"])
+        if not os.path.isabs(path):
+            root_name = entry.get("root", roots[0].name)
+            matches = [root for root in roots if root.name == root_name]
+            if not matches:
+                raise ValueError(f"Route {path} refers to unknown watch root '{root_name}'")
+            path = os.path.join(matches[0].folder_to_watch, path)
+        template = entry.get("template")
+        if template and not os.path.isabs(template):
+            template = os.path.join(base_dir, template)
+        return cls(path, entry.get("contact"), template, entry.get("link"), entry.get("priority"))
+
+
+class _Node:
+    """One path component in the trie"""
+
+    __slots__ = ("children", "root", "rule")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.root: Optional[WatchRoot] = None
+        self.rule: Optional[RoutingRule] = None
+
+
+class RoutingTable:
+    """
+    Resolve file paths to a Route with one walk down a trie of path components
+
+    Watch roots and routing rules are compiled into a trie keyed by normalized path
+    components. Walking a file's folder down the trie finds its innermost watch root and
+    every rule on the way in a single pass. Results are memoized per folder, so the
+    files of a folder after the first cost one dictionary lookup.
+    """
+
+    def __init__(self, roots: Iterable[WatchRoot], rules: Iterable[RoutingRule] = (), cache_size: int = ROUTE_CACHE_SIZE):
+        """
+        Args:
+            roots: Watch roots, a path is routed by the innermost root containing it
+            rules: Overrides for folders inside the roots
+            cache_size: Folders whose route is memoized, the memo is cleared when it is full
+        """
+        self.roots = list(roots)
+        self.rules = list(rules)
+        self.cache_size = cache_size
+        self._trie = _Node()
+        self._cache: Dict[str, Route] = {}
+        for root in self.roots:
+            self._node_for(root.folder_to_watch).root = root
+        for rule in self.rules:
+            node = self._node_for(rule.path)
+            if node.rule is not None:
+                raise ValueError(f"Two routes use the same path: {rule.path}")
+            node.rule = rule
+        for rule in self.rules:
+            if not any(root.contains(rule.path) for root in self.roots):
+                raise ValueError(f"Route {rule.path} is not inside any watch root")
+
+    def resolve(self, file_path: str) -> Route:
+        """Route of a file, raises for files outside every watch root"""
+        folder = os.path.dirname(file_path)
+        route = self._cache.get(folder)
+        if route is None:
+            route = self._resolve_folder(folder, file_path)
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[folder] = route
+        return route
+
+    def root_for(self, file_path: str) -> WatchRoot:
+        """The innermost watch root containing a file"""
+        return self.resolve(file_path).root
+
+    def clear_cache(self) -> None:
+        self._cache.clear()
+
+    def _resolve_folder(self, folder: str, file_path: str) -> Route:
+        parts = _components(os.path.abspath(folder))
+        node = self._trie
+        root, root_depth, rules = None, 0, []
+        for depth, part in enumerate(parts, 1):
+            node = node.children.get(os.path.normcase(part))
+            if node is None:
+                break
+            if node.root is not None:
+                root, root_depth, rules = node.root, depth, []
+            if node.rule is not None and root is not None:
+                rules.append(node.rule)
+        if root is None:
+            raise Exception(f"File is not inside any watch root: {file_path}")
+
+        # The contact is counted from the root's own folder unless main_folder_name names another one
+        if os.path.normcase(root.main_folder_name) == os.path.normcase(parts[root_depth - 1]):
+            index = root_depth - 1
+        else:
+            try:
+                index = parts.index(root.main_folder_name)
+            except ValueError:
+                raise Exception(f"Could not find '{root.main_folder_name}' in path: {file_path}")
+        contact = parts[index + root.contact_level] if index + root.contact_level < len(parts) else None
+        relative_folder = os.path.join(*parts[root_depth:]) if len(parts) > root_depth else "."
+
+        template_path, link, priority = root.template_path, None, None
+        for rule in rules:
+            contact = rule.contact or contact
+            template_path = rule.template or template_path
+            link = rule.link or link
+            priority = rule.priority or priority
+        if contact is None:
+            raise Exception(f"No folder found {root.contact_level} level(s) below '{root.main_folder_name}' in path: {file_path}")
+        if link is None:
+            link = root.root_path + "/" + urllib.parse.quote(contact)
+        return Route(root, contact, relative_folder, template_path, link, priority)
+
+    def _node_for(self, path: str) -> _Node:
+        node = self._trie
+        for part in _components(os.path.abspath(path)):
+            node = node.children.setdefault(os.path.normcase(part), _Node())
+        return node
+
+
+def _components(path: str) -> List[str]:
+    """Split an absolute path into its drive/anchor and folder names"""
+    drive, rest = os.path.splitdrive(path)
+    return [drive + os.sep, *(part for part in rest.split(os.sep) if part)]
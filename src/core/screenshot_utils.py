@@ -4,32 +4,36 @@ Screenshot utility functions
 
 import os
 from datetime import datetime
-import pyautogui
 from src.core.constants import *
 from src.core.logger import logger
 
-def take_screenshot(error_context: str = None) -> str:
+def take_screenshot(error_context: str = None, screenshots_dir: str = SCREENSHOTS_DIR,
+                    prefix: str = "error_screenshot") -> str:
     """
     Take a screenshot and save it to the logs directory
-    
+
+    Encoding the PNG takes a while, use src.core.diagnostics to capture off the calling thread.
+
     Args:
         error_context: Optional context about the error for the filename
-        
+        screenshots_dir: Folder to save the screenshot in
+        prefix: Start of the file name, followed by the timestamp and context
+
     Returns:
         str: Path to the saved screenshot
     """
     try:
         # Create screenshots directory if it doesn't exist
-        screenshots_dir = os.path.join("logs", "screenshots")
         os.makedirs(screenshots_dir, exist_ok=True)
         
         # Generate filename with timestamp and context
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         context = f"_{error_context}" if error_context else ""
-        filename = f"error_screenshot_{timestamp}{context}.png"
+        filename = f"{prefix}_{timestamp}{context}.png"
         filepath = os.path.join(screenshots_dir, filename)
         
-        # Take screenshot
+        # Take screenshot (pyautogui probes the display on import, so only load it when needed)
+        import pyautogui
         screenshot = pyautogui.screenshot()
         screenshot.save(filepath)
         
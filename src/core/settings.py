@@ -0,0 +1,241 @@
+"""
+Access to the settings file (resources/config.yaml) and the layered settings built from it
+
+Settings are layered: built-in defaults, then config.yaml, then environment variables,
+then command-line overrides. This module must not import the logger: the logger reads
+its own settings from here.
+"""
+
+import os
+import sys
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+from src.core.constants import *
+
+SETTINGS_FILE = os.path.join("resources", "config.yaml")
+
+# Set by use_settings_file(), e.g. from the --config command-line option
+_settings_file_override: Optional[str] = None
+# Set by use_overrides() from the --set command-line options, for the logger which is set up before Config
+_command_line_overrides: Dict[str, Any] = {}
+
+
+class SettingsError(ValueError):
+    """The layered settings failed validation"""
+
+    def __init__(self, errors: List[str]):
+        super().__init__("Invalid settings: " + "; ".join(errors))
+        self.errors = errors
+
+
+class Setting(NamedTuple):
+    type: type
+    default: Any
+    env: Optional[str] = None  # environment variable overriding config.yaml
+    check: Optional[Callable[[Any], bool]] = None
+    rule: str = ""  # what `check` requires, for error messages
+
+
+def _positive(value) -> bool:
+    return value > 0
+
+
+def _not_negative(value) -> bool:
+    return value >= 0
+
+
+def _log_level(value) -> bool:
+    return value.upper() in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
+
+# Arguments of a RetryPolicy, the keys allowed in each `retry_policies` entry
+RETRY_POLICY_KEYS = ("max_attempts", "base_delay", "max_delay", "backoff", "jitter", "trips_breaker")
+
+# Every top-level key of config.yaml, with its default and the environment variable that overrides it
+SETTINGS_SCHEMA: Dict[str, Setting] = {
+    "folder_to_watch": Setting(str, DEFAULT_FOLDER_TO_WATCH, "DEFAULT_FOLDER_TO_WATCH"),
+    "root_path": Setting(str, DEFAULT_ROOT_PATH, "DEFAULT_ROOT_PATH"),
+    "TempMessageForGroupPath": Setting(str, DEFAULT_TEMP_MESSAGE_PATH, "TEMP_MESSAGE_PATH"),
+    "file_check_interval": Setting(float, FILE_CHECK_INTERVAL, "FILE_CHECK_INTERVAL", _positive, "greater than 0"),
+    "stability_quiet_period": Setting(float, STABILITY_QUIET_PERIOD, "STABILITY_QUIET_PERIOD", _not_negative, "at least 0"),
+    "file_patterns": Setting(list, FILE_PATTERNS, "FILE_PATTERNS"),
+    "retry_attempts": Setting(int, MAX_RETRIES, "RETRY_ATTEMPTS", _positive, "at least 1"),
+    "retry_delay": Setting(float, RETRY_DELAY, "RETRY_DELAY", _not_negative, "at least 0"),
+    "retry_policies": Setting(dict, RETRY_POLICIES),
+    "timeout": Setting(float, DEFAULT_TIMEOUT, "TIMEOUT", _positive, "greater than 0"),
+    "wait_time": Setting(float, DEFAULT_WAIT_TIME, "WAIT_TIME", _not_negative, "at least 0"),
+    "logging": Setting(dict, {}),
+    "priorities": Setting(dict, {}),
+    "file_filter": Setting(dict, {}),
+    "watch_roots": Setting(list, []),
+    "routes": Setting(list, []),
+}
+
+# Keys of the `logging` section, layered like the top-level settings and overridden with --set logging.<key>=...
+LOGGING_SCHEMA: Dict[str, Setting] = {
+    "level": Setting(str, LOG_LEVEL, "LOG_LEVEL", _log_level, "one of DEBUG, INFO, WARNING, ERROR, CRITICAL"),
+    "format": Setting(str, LOG_FORMAT, "LOG_FORMAT"),
+    "max_size": Setting(int, LOG_MAX_SIZE, "LOG_MAX_SIZE", _positive, "greater than 0"),
+    "backup_count": Setting(int, LOG_BACKUP_COUNT, "LOG_BACKUP_COUNT", _not_negative, "at least 0"),
+}
+
+
+def use_settings_file(path: Optional[str]) -> None:
+    """Read settings from `path` instead of resources/config.yaml, None restores the default"""
+    global _settings_file_override
+    _settings_file_override = os.path.abspath(path) if path else None
+
+
+def use_overrides(overrides: Optional[Dict[str, Any]]) -> None:
+    """Remember the command-line settings for load_logging_settings()"""
+    global _command_line_overrides
+    _command_line_overrides = dict(overrides or {})
+
+
+def settings_path() -> str:
+    """Location of config.yaml for a script run or a bundled executable"""
+    if _settings_file_override:
+        return _settings_file_override
+    if getattr(sys, 'frozen', False):
+        # The installer ships resources/ next to the executable
+        base_dir = os.path.dirname(sys.executable)
+    else:
+        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return os.path.join(base_dir, SETTINGS_FILE)
+
+
+def load_yaml_settings(path: str = None) -> dict:
+    """Read config.yaml, returns an empty dict if the file or pyyaml is missing"""
+    path = path or settings_path()
+    if not os.path.exists(path):
+        return {}
+    try:
+        import yaml
+    except ImportError:
+        return {}
+    with open(path, 'r', encoding='utf-8') as file:
+        return yaml.safe_load(file) or {}
+
+
+def settings_signature(path: str = None) -> Optional[tuple]:
+    """(mtime_ns, size) of the settings file, None if it does not exist"""
+    try:
+        stat = os.stat(path or settings_path())
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+
+def load_layered_settings(path: str = None, overrides: Dict[str, Any] = None,
+                          environ: Dict[str, str] = None) -> Dict[str, Any]:
+    """
+    Merge defaults, config.yaml, environment variables and `overrides`, then validate
+
+    Keys that are not in SETTINGS_SCHEMA are kept as they are. Values from the
+    environment and the command line are strings and converted to the setting's type.
+    The `logging` section is layered key by key, see LOGGING_SCHEMA.
+
+    Raises:
+        SettingsError: listing every invalid value
+    """
+    environ = os.environ if environ is None else environ
+    settings = {key: setting.default for key, setting in SETTINGS_SCHEMA.items()}
+    settings.update(load_yaml_settings(path))
+    errors = []
+    for key, setting in SETTINGS_SCHEMA.items():
+        if setting.env and setting.env in environ:
+            settings[key] = _parse_text(key, setting, environ[setting.env], errors)
+    for key, value in (overrides or {}).items():
+        if key.startswith("logging."):
+            continue  # Applied to the logging section below
+        setting = SETTINGS_SCHEMA.get(key)
+        settings[key] = _parse_text(key, setting, value, errors) if setting and isinstance(value, str) else value
+    for key, setting in SETTINGS_SCHEMA.items():
+        settings[key] = _validate(key, setting, settings[key], errors)
+    settings["logging"] = _layer_logging(settings["logging"], environ, overrides or {}, errors)
+    _validate_retry_policies(settings["retry_policies"], errors)
+    if errors:
+        raise SettingsError(errors)
+    return settings
+
+
+def load_logging_settings(path: str = None, overrides: Dict[str, Any] = None,
+                          environ: Dict[str, str] = None) -> Dict[str, Any]:
+    """
+    The layered `logging` section on its own, so other invalid settings do not keep the logger from starting
+
+    Raises:
+        SettingsError: listing every invalid logging value
+    """
+    environ = os.environ if environ is None else environ
+    overrides = _command_line_overrides if overrides is None else overrides
+    errors = []
+    configured = _validate("logging", SETTINGS_SCHEMA["logging"], load_yaml_settings(path).get("logging"), errors)
+    settings = _layer_logging(configured, environ, overrides, errors)
+    if errors:
+        raise SettingsError(errors)
+    return settings
+
+
+def unknown_settings(settings: Dict[str, Any]) -> List[str]:
+    """Keys not described by SETTINGS_SCHEMA, usually typos"""
+    return sorted(key for key in settings if key not in SETTINGS_SCHEMA)
+
+
+def _parse_text(key: str, setting: Setting, text: str, errors: List[str]) -> Any:
+    """Convert an environment or command-line string to the setting's type"""
+    if setting.type is str:
+        return text
+    if setting.type is list:
+        return [item.strip() for item in text.split(",") if item.strip()]
+    if setting.type is dict:
+        errors.append(f"{key} cannot be set from the environment or command line")
+        return setting.default
+    try:
+        return setting.type(text)
+    except ValueError:
+        errors.append(f"{key} must be a {setting.type.__name__}, got {text!r}")
+        return setting.default
+
+
+def _validate(key: str, setting: Setting, value: Any, errors: List[str]) -> Any:
+    """Check a value's type and range, ints are accepted for floats"""
+    if value is None and setting.type in (list, dict):
+        return setting.type()
+    if setting.type is float and isinstance(value, int) and not isinstance(value, bool):
+        value = float(value)
+    if not isinstance(value, setting.type) or isinstance(value, bool):
+        errors.append(f"{key} must be a {setting.type.__name__}, got {value!r}")
+        return setting.default
+    if setting.check is not None and not setting.check(value):
+        errors.append(f"{key} must be {setting.rule}, got {value!r}")
+    return value
+
+
+def _validate_retry_policies(policies: Dict[str, Any], errors: List[str]) -> None:
+    """Check that every retry policy only sets RetryPolicy arguments"""
+    for name, policy in policies.items():
+        if not isinstance(policy, dict):
+            errors.append(f"retry_policies.{name} must be a dict, got {policy!r}")
+            continue
+        for key in policy:
+            if key not in RETRY_POLICY_KEYS:
+                errors.append(f"retry_policies.{name} has unknown key '{key}', expected one of {', '.join(RETRY_POLICY_KEYS)}")
+
+
+def _layer_logging(configured: Dict[str, Any], environ: Dict[str, str], overrides: Dict[str, Any],
+                   errors: List[str]) -> Dict[str, Any]:
+    """Layer the logging section: defaults, config.yaml, environment, then logging.<key> overrides"""
+    settings = {key: setting.default for key, setting in LOGGING_SCHEMA.items()}
+    settings.update(configured)
+    for key, setting in LOGGING_SCHEMA.items():
+        name = f"logging.{key}"
+        if setting.env and setting.env in environ:
+            settings[key] = _parse_text(name, setting, environ[setting.env], errors)
+        if name in overrides:
+            value = overrides[name]
+            settings[key] = _parse_text(name, setting, value, errors) if isinstance(value, str) else value
+        settings[key] = _validate(name, setting, settings[key], errors)
+    for name in overrides:
+        if name.startswith("logging.") and name[len("logging."):] not in LOGGING_SCHEMA:
+            errors.append(f"{name} is not a logging setting, expected one of {', '.join(LOGGING_SCHEMA)}")
+    return settings
@@ -0,0 +1,160 @@
+"""
+Detection of files that have finished being written
+"""
+
+import heapq
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from src.core.constants import *
+from src.core.logger import logger
+
+if sys.platform == "win32":
+    import ctypes
+    from ctypes import wintypes
+
+    _kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    _kernel32.CreateFileW.argtypes = [wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD, wintypes.LPVOID,
+                                      wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE]
+    _kernel32.CreateFileW.restype = wintypes.HANDLE
+    _kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+    _GENERIC_READ = 0x80000000
+    _OPEN_EXISTING = 3
+    _FILE_ATTRIBUTE_NORMAL = 0x80
+    _INVALID_HANDLE_VALUE = wintypes.HANDLE(-1).value
+    _ERROR_SHARING_VIOLATION = 32
+    _ERROR_LOCK_VIOLATION = 33
+
+
+def exclusive_open_probe(file_path: str) -> bool:
+    """
+    Return False while another process still has the file open
+
+    On Windows the file is opened with share mode 0, which fails with a sharing violation
+    as long as a writer (Word, Excel, the OneDrive client) holds a handle to it. Other
+    platforms have no mandatory locks, there the probe always passes and stability rests
+    on size and mtime alone.
+    """
+    if sys.platform != "win32":
+        return True
+    handle = _kernel32.CreateFileW(file_path, _GENERIC_READ, 0, None, _OPEN_EXISTING, _FILE_ATTRIBUTE_NORMAL, None)
+    if handle == _INVALID_HANDLE_VALUE:
+        error = ctypes.get_last_error()
+        if error in (_ERROR_SHARING_VIOLATION, _ERROR_LOCK_VIOLATION):
+            return False
+        # Missing files and access errors are reported by the caller's own stat/open
+        return True
+    _kernel32.CloseHandle(handle)
+    return True
+
+
+class StabilityDetector:
+    """
+    Decide when a detected file is complete
+
+    A file is stable once its size and mtime were observed unchanged for `quiet_period`
+    seconds and the exclusive-open probe passes. Files that are not stable yet are kept
+    as pending together with the time they should be looked at again; `next_deadline()`
+    lets the watcher sleep exactly until then instead of polling for them. Held files
+    (empty placeholders) are re-checked with a growing interval and dropped after
+    `max_hold` seconds.
+    """
+
+    def __init__(self, quiet_period: float = STABILITY_QUIET_PERIOD,
+                 probe: Callable[[str], bool] = exclusive_open_probe,
+                 max_recheck_interval: float = PLACEHOLDER_MAX_RECHECK_INTERVAL,
+                 max_hold: float = PLACEHOLDER_MAX_HOLD):
+        self.quiet_period = quiet_period
+        self.probe = probe
+        self.max_recheck_interval = max_recheck_interval
+        self.max_hold = max_hold
+        self._pending: Dict[str, Tuple[int, int, float]] = {}  # path -> (size, mtime_ns, unchanged since)
+        self._held: Dict[str, Tuple[float, float]] = {}  # path -> (held since, re-check interval)
+        self._deadlines: List[Tuple[float, str]] = []  # heap of (check at, path)
+        self._lock = threading.Lock()
+        self.emitted = 0
+        self.probe_failures = 0
+
+    def observe(self, file_path: str, size: int, mtime_ns: int, now: float = None) -> bool:
+        """
+        Record an observation of a file, returns True once it is stable
+
+        A file that is reported stable is no longer tracked.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._held.pop(file_path, None)
+            previous = self._pending.get(file_path)
+            if previous is None or previous[:2] != (size, mtime_ns):
+                # New or still changing: the quiet period starts over
+                self._schedule(file_path, size, mtime_ns, now, now + self.quiet_period)
+                return False
+            unchanged_since = previous[2]
+            if now - unchanged_since < self.quiet_period:
+                self._schedule(file_path, size, mtime_ns, unchanged_since, unchanged_since + self.quiet_period)
+                return False
+
+        if not self.probe(file_path):
+            self.probe_failures += 1
+            logger.log_debug("File is still open by another process: %s", file_path)
+            with self._lock:
+                self._schedule(file_path, size, mtime_ns, unchanged_since, now + self.quiet_period)
+            return False
+
+        with self._lock:
+            self._pending.pop(file_path, None)
+            self.emitted += 1
+        return True
+
+    def hold(self, file_path: str, size: int, mtime_ns: int, now: float = None) -> bool:
+        """
+        Keep a file pending without letting it become stable, e.g. an empty placeholder
+
+        Each hold doubles the time until the file is looked at again, from the quiet period
+        up to `max_recheck_interval`. Returns False, and stops tracking the file, once it
+        has been held for `max_hold` seconds.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            held_since, interval = self._held.get(file_path, (now, 0.0))
+            if now - held_since >= self.max_hold:
+                self._held.pop(file_path, None)
+                self._pending.pop(file_path, None)
+                return False
+            interval = min(max(interval * 2, self.quiet_period, 1.0), self.max_recheck_interval)
+            self._held[file_path] = (held_since, interval)
+            self._schedule(file_path, size, mtime_ns, now, now + interval)
+        return True
+
+    def due(self, now: float = None) -> List[str]:
+        """Pending files whose next check is due"""
+        now = time.time() if now is None else now
+        due = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _, file_path = heapq.heappop(self._deadlines)
+                if file_path in self._pending and file_path not in due:
+                    due.append(file_path)
+        return due
+
+    def next_deadline(self) -> Optional[float]:
+        """Time of the earliest pending check, None if nothing is pending"""
+        with self._lock:
+            while self._deadlines and self._deadlines[0][1] not in self._pending:
+                heapq.heappop(self._deadlines)
+            return self._deadlines[0][0] if self._deadlines else None
+
+    def forget(self, file_path: str) -> None:
+        """Stop tracking a file, e.g. because it was deleted"""
+        with self._lock:
+            self._pending.pop(file_path, None)
+            self._held.pop(file_path, None)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _schedule(self, file_path: str, size: int, mtime_ns: int, unchanged_since: float, check_at: float) -> None:
+        """Remember the file's signature and when to look at it again (lock held)"""
+        self._pending[file_path] = (size, mtime_ns, unchanged_since)
+        heapq.heappush(self._deadlines, (check_at, file_path))
@@ -0,0 +1,154 @@
+"""
+Compiled message templates with hot reload
+"""
+
+import os
+import re
+import threading
+from typing import Dict, List
+from src.core.constants import *
+from src.core.logger import logger
+
+
+class CompiledTemplate:
+    """
+    A message template parsed once into literal text and placeholder slots
+
+    Rendering fills the slots and joins the parts in a single pass instead of copying
+    the whole message once per placeholder. Placeholders without a value are kept as-is.
+    """
+
+    def __init__(self, text: str, placeholders: Dict[str, str] = MESSAGE_PLACEHOLDERS, name: str = None):
+        self.name = name
+        self.text = text
+        tokens = {token: key for key, token in placeholders.items()}
+        pattern = re.compile("|".join(re.escape(token) for token in tokens))
+        self._parts: List[str] = []
+        self._slots: List[tuple] = []
+        position = 0
+        for match in pattern.finditer(text):
+            self._parts.append(text[position:match.start()])
+            self._slots.append((len(self._parts), tokens[match.group(0)]))
+            self._parts.append(match.group(0))
+            position = match.end()
+        self._parts.append(text[position:])
+
+    @property
+    def placeholders(self) -> List[str]:
+        """Names of the placeholders used by this template"""
+        return [key for _, key in self._slots]
+
+    def render(self, values: Dict[str, str]) -> str:
+        parts = list(self._parts)
+        for index, key in self._slots:
+            value = values.get(key)
+            if value is not None:
+                parts[index] = value
+        return "".join(parts)
+
+
+class _TemplateFile:
+    """A compiled template and the file state it was compiled from"""
+
+    __slots__ = ("path", "mtime_ns", "size", "template")
+
+    def __init__(self, path: str, mtime_ns: int, size: int, template: CompiledTemplate):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.template = template
+
+
+class TemplateRegistry:
+    """
+    Named templates loaded from a template directory and recompiled when their file changes
+
+    Every ``*.txt`` file in the directory is a template named after its file stem. A folder
+    gets the template named after its deepest folder component that has one (so a contact
+    folder or a specific subfolder can have its own wording), otherwise the default template.
+    Files are only re-read when their mtime or size changes, so edits apply without a restart.
+    """
+
+    def __init__(self, default_path: str, template_dir: str = None):
+        self.default_path = os.path.abspath(default_path)
+        self.template_dir = os.path.abspath(template_dir or os.path.dirname(self.default_path))
+        self.default_name = os.path.splitext(os.path.basename(self.default_path))[0]
+        self._lock = threading.Lock()
+        self._files: Dict[str, _TemplateFile] = {}
+        self._names: Dict[str, str] = {}
+        self._dir_mtime_ns = None
+        self.reloads = 0
+
+    def get(self, name: str = None) -> CompiledTemplate:
+        """Return a template by name (the default template if name is None)"""
+        path = self.default_path if name in (None, self.default_name) else self._template_names().get(name)
+        if path is None:
+            raise KeyError(f"No message template named '{name}' in {self.template_dir}")
+        return self._load(path, name or self.default_name)
+
+    def for_folder(self, relative_folder: str) -> CompiledTemplate:
+        """Return the most specific template for a folder path relative to the watched folder"""
+        names = self._template_names()
+        if names:
+            for component in reversed(re.split(r"[\\/]", relative_folder)):
+                if component and component != self.default_name and component in names:
+                    return self._load(names[component], component)
+        return self.get()
+
+    def names(self) -> List[str]:
+        """Names of all templates in the template directory"""
+        return sorted(self._template_names())
+
+    def _template_names(self) -> Dict[str, str]:
+        """Map template names to paths, re-listing the directory only when it changed"""
+        try:
+            mtime_ns = os.stat(self.template_dir).st_mtime_ns
+        except OSError:
+            return {}
+        with self._lock:
+            if mtime_ns != self._dir_mtime_ns:
+                self._names = {
+                    os.path.splitext(entry.name)[0]: entry.path
+                    for entry in os.scandir(self.template_dir)
+                    if entry.is_file() and entry.name.lower().endswith(".txt")
+                }
+                self._dir_mtime_ns = mtime_ns
+            return self._names
+
+    def _load(self, path: str, name: str) -> CompiledTemplate:
+        """Return the compiled template for a file, recompiling it if the file changed"""
+        try:
+            stat = os.stat(path)
+            with self._lock:
+                cached = self._files.get(path)
+                if cached is not None and (cached.mtime_ns, cached.size) == (stat.st_mtime_ns, stat.st_size):
+                    return cached.template
+            with open(path, 'r', encoding='utf-8') as file:
+                template = CompiledTemplate(file.read(), name=name)
+            with self._lock:
+                if cached is not None:
+                    self.reloads += 1
+                    logger.log_info(f"Reloaded message template '{name}' from {path}")
+                else:
+                    logger.log_info(f"Loaded message template '{name}' from {path}")
+                self._files[path] = _TemplateFile(path, stat.st_mtime_ns, stat.st_size, template)
+            return template
+        except Exception as e:
+            logger.log_error(e, f"Failed to load message template: {path}")
+            raise
+
+
+_registries: Dict[str, TemplateRegistry] = {}
+_registry_lock = threading.Lock()
+
+
+def get_template_registry(default_path: str = None) -> TemplateRegistry:
+    """Return the registry for a default template (the configured one if omitted), creating it on first use"""
+    with _registry_lock:
+        if default_path is None:
+            from src.core.config import config
+            default_path = config.TempMessageForGroupPath
+        registry = _registries.get(default_path)
+        if registry is None:
+            registry = _registries[default_path] = TemplateRegistry(default_path)
+        return registry
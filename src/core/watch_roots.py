@@ -0,0 +1,96 @@
+"""
+Watch roots: folders watched by one process, each with its own template, link base, contact rule and file filter
+"""
+
+import os
+from pathlib import Path
+from typing import List
+from src.core.constants import *
+from src.core.file_filter import FileFilter
+
+
+class WatchRoot:
+    """
+    One watched folder tree
+
+    The contact a file belongs to is the folder `contact_level` levels below the folder
+    named `main_folder_name` in the file's path (by default the first folder below the
+    watched folder itself).
+    """
+
+    def __init__(self, name: str, folder_to_watch: str, root_path: str, template_path: str,
+                 main_folder_name: str = None, contact_level: int = 1, file_filter: FileFilter = None):
+        """
+        Args:
+            name: Unique name, used in logs and for the root's saved directory index
+            folder_to_watch: Folder whose subfolders are watched
+            root_path: SharePoint base URL the contact folder is appended to in links
+            template_path: Default message template for this root
+            main_folder_name: Folder name the contact level is counted from,
+                              defaults to the last component of `folder_to_watch`
+            contact_level: How many folders below `main_folder_name` the contact folder is
+            file_filter: Which files in this root are notified
+        """
+        if contact_level < 1:
+            raise ValueError(f"contact_level of watch root '{name}' must be at least 1")
+        self.name = name
+        self.folder_to_watch = str(folder_to_watch)
+        self.root_path = root_path.rstrip("/")
+        self.template_path = str(template_path)
+        self.main_folder_name = main_folder_name or Path(self.folder_to_watch).name
+        self.contact_level = contact_level
+        self.file_filter = file_filter or FileFilter()
+        self._prefix = os.path.normcase(os.path.abspath(self.folder_to_watch))
+
+    def __repr__(self) -> str:
+        return f"WatchRoot({self.name!r}, {self.folder_to_watch!r})"
+
+    def update_from(self, other: "WatchRoot") -> None:
+        """Take over the settings of a reloaded root for the same folder"""
+        self.root_path = other.root_path
+        self.template_path = other.template_path
+        self.main_folder_name = other.main_folder_name
+        self.contact_level = other.contact_level
+        self.file_filter = other.file_filter
+
+    @property
+    def index_file(self) -> str:
+        """File name of this root's saved directory index in the data folder"""
+        if self.name == DEFAULT_WATCH_ROOT_NAME:
+            return SNAPSHOT_INDEX_FILE
+        stem, extension = os.path.splitext(SNAPSHOT_INDEX_FILE)
+        return f"{stem}_{self.name}{extension}"
+
+    def contains(self, file_path: str) -> bool:
+        """Whether a path lies inside this root"""
+        path = os.path.normcase(os.path.abspath(file_path))
+        return path == self._prefix or path.startswith(self._prefix + os.sep)
+
+    @classmethod
+    def from_settings(cls, entry: dict, base_dir: str, defaults: "WatchRoot") -> "WatchRoot":
+        """Build a root from one entry of the config.yaml `watch_roots` list"""
+        if not entry.get("name") or not entry.get("folder_to_watch"):
+            raise ValueError(f"Each watch root needs a name and a folder_to_watch: {entry}")
+        template_path = entry.get("template", defaults.template_path)
+        if not os.path.isabs(template_path):
+            template_path = os.path.join(base_dir, template_path)
+        return cls(
+            name=str(entry["name"]),
+            folder_to_watch=entry["folder_to_watch"],
+            root_path=entry.get("root_path", defaults.root_path),
+            template_path=template_path,
+            main_folder_name=entry.get("main_folder_name"),
+            contact_level=int(entry.get("contact_level", 1)),
+            file_filter=FileFilter.from_settings(entry.get("file_filter"), defaults.file_filter),
+        )
+
+
+def validate_watch_roots(roots: List[WatchRoot]) -> None:
+    """Reject configurations with duplicate names or folders"""
+    names = [root.name for root in roots]
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise ValueError(f"Duplicate watch root names: {', '.join(sorted(duplicates))}")
+    folders = [os.path.normcase(os.path.abspath(root.folder_to_watch)) for root in roots]
+    if len(set(folders)) != len(folders):
+        raise ValueError("Two watch roots use the same folder_to_watch")
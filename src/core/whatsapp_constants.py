@@ -2,10 +2,24 @@
 WhatsApp Desktop Constants
 """
 
+import os
+
 # Application Constants
 WHATSAPP_APP_ID = "5319275A.WhatsAppDesktop_cv1g1gvanyjgm!App"
 WHATSAPP_WINDOW_TITLE = "WhatsApp"
 WAIT_TIME = 30  # seconds
+SESSION_IDLE_TIMEOUT = 10 * 60  # seconds without sends before WhatsApp is closed
+SESSION_IDLE_CHECK_INTERVAL = 30  # seconds between checks for an idle session
+
+# Transport Constants
+WHATSAPP_TRANSPORT = os.getenv('WHATSAPP_TRANSPORT', "desktop")  # desktop or fake
+FAKE_TRANSPORT_LATENCY = float(os.getenv('FAKE_TRANSPORT_LATENCY', 0))  # seconds per step
+FAKE_TRANSPORT_FAILURE_RATE = float(os.getenv('FAKE_TRANSPORT_FAILURE_RATE', 0))  # 0-1
+
+# Contact Resolution Constants
+CONTACT_CACHE_FILE = "contact_cache.json"  # in the data folder
+CONTACT_ALIASES_FILE = "contact_aliases.yaml"  # optional, next to config.yaml
+CONTACT_MISS_TTL = 10 * 60  # seconds a contact that could not be found is failed without searching
 
 # UI Element Constants
 SEARCH_BOX_AUTO_ID = "SearchQueryTextBox"
@@ -21,7 +35,14 @@ SEND_BUTTON_AUTO_ID = "RightButton"
 SEND_BUTTON_CLASS = "Button"
 
 # Timing Constants
-SEARCH_DELAY = 2  # seconds
-CLICK_DELAY = 0.5  # seconds
-CHAT_OPEN_DELAY = 2  # seconds
-MESSAGE_SEND_DELAY = 1  # seconds 
\ No newline at end of file
+# Upper bounds for condition-based waits. Steps return as soon as the UI is in the
+# expected state; the optional checks never wait longer than the old fixed sleeps did.
+SEARCH_TIMEOUT = 5  # seconds for search results to show the contact
+CLICK_TIMEOUT = 0.5  # seconds for focus, clearing and clipboard updates
+CHAT_OPEN_TIMEOUT = 2  # seconds for the clicked chat to become active
+MESSAGE_SEND_TIMEOUT = 1  # seconds for the input box to empty after sending
+WAIT_INITIAL_INTERVAL = 0.02  # seconds between the first condition checks
+WAIT_MAX_INTERVAL = 0.25  # seconds, cap for the exponential backoff
+WAIT_BACKOFF = 2  # interval multiplier after every failed check
+WAIT_STATS_SAMPLES = 200  # recent wait durations kept per step
+ELEMENT_FIND_TIMEOUT = 5  # seconds to resolve a UI element that is not cached yet 
\ No newline at end of file
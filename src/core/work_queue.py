@@ -0,0 +1,113 @@
+"""
+Bounded work queue between file detection and sending
+"""
+
+import queue
+import threading
+import time
+from typing import Any
+from src.core.constants import *
+from src.core.logger import logger
+from src.core.metrics import metrics
+
+REQUEUED = "requeued"  # handler result: the item was handed back to the queue for another attempt
+
+
+class WorkQueue:
+    """
+    Bounded FIFO of detected files with backpressure metrics
+
+    The watcher only pays for an enqueue, so detection keeps running while senders are
+    busy. When the queue is full the producer blocks (backpressure) instead of dropping
+    work, and the time it spent blocked is recorded.
+    """
+
+    def __init__(self, maxsize: int = WORK_QUEUE_SIZE):
+        self.maxsize = maxsize
+        self._queue = queue.Queue(maxsize)
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.dequeued = 0
+        self.completed = 0
+        self.failed = 0
+        self.requeued = 0
+        self.blocked_puts = 0
+        self.blocked_seconds = 0.0
+        self.high_watermark = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def put(self, item: Any) -> bool:
+        """Enqueue an item, blocking while the queue is full"""
+        entry = self._make_entry(item, time.time())
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            logger.log_warning(f"Work queue is full ({self.maxsize} items), waiting for senders to catch up")
+            blocked_since = time.time()
+            self._queue.put(entry)
+            with self._lock:
+                self.blocked_puts += 1
+                self.blocked_seconds += time.time() - blocked_since
+        with self._lock:
+            self.enqueued += 1
+            self.high_watermark = max(self.high_watermark, self._queue.qsize())
+        metrics.set_gauge("work_queue_depth", self._queue.qsize(), help_text="Items waiting for a sender")
+        return True
+
+    def get(self, timeout: float = None) -> Any:
+        """Dequeue the oldest item, raises queue.Empty after `timeout` seconds"""
+        entry = self._queue.get(timeout=timeout)
+        item, enqueued_at = self._unpack_entry(entry)
+        waited = time.time() - enqueued_at
+        with self._lock:
+            self.dequeued += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        metrics.set_gauge("work_queue_depth", self._queue.qsize(), help_text="Items waiting for a sender")
+        metrics.observe("work_queue_wait_seconds", waited, help_text="Time items spent queued")
+        return item
+
+    def _make_entry(self, item: Any, enqueued_at: float) -> tuple:
+        """What is stored in the underlying queue for `item`"""
+        return item, enqueued_at
+
+    def _unpack_entry(self, entry: tuple) -> tuple:
+        """Return (item, enqueued_at) from a stored entry"""
+        return entry
+
+    def task_done(self, success: bool = True, requeued: bool = False) -> None:
+        """Mark a dequeued item as finished, or as handed back to the queue for a retry"""
+        with self._lock:
+            if requeued:
+                self.requeued += 1
+            elif success:
+                self.completed += 1
+            else:
+                self.failed += 1
+        self._queue.task_done()
+
+    def join(self) -> None:
+        """Block until every queued item has been processed"""
+        self._queue.join()
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        """Snapshot of the queue depth and backpressure counters"""
+        with self._lock:
+            return {
+                "depth": self._queue.qsize(),
+                "maxsize": self.maxsize,
+                "high_watermark": self.high_watermark,
+                "enqueued": self.enqueued,
+                "dequeued": self.dequeued,
+                "completed": self.completed,
+                "failed": self.failed,
+                "requeued": self.requeued,
+                "blocked_puts": self.blocked_puts,
+                "blocked_seconds": round(self.blocked_seconds, 3),
+                "avg_wait_seconds": round(self.total_wait_seconds / self.dequeued, 3) if self.dequeued else 0.0,
+                "max_wait_seconds": round(self.max_wait_seconds, 3),
+            }
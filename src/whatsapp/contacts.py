@@ -0,0 +1,153 @@
+"""
+Resolution of folder-derived contact names to WhatsApp chat titles
+"""
+
+import json
+import os
+import threading
+import time
+import unicodedata
+from typing import Dict, NamedTuple, Optional
+from src.core.logger import logger
+from src.core.settings import load_yaml_settings, settings_path
+from src.core.whatsapp_constants import *
+from src.whatsapp.transport import ContactNotFoundError
+
+
+def normalize_contact_name(name: str) -> str:
+    """Canonical form of a folder name: NFC normalized with whitespace collapsed"""
+    return " ".join(unicodedata.normalize("NFC", name).split())
+
+
+class ResolvedContact(NamedTuple):
+    title: str  # what to search for in WhatsApp
+    exact: bool  # whether the chat title must equal `title`
+    source: str  # "alias", "cache" or "folder"
+
+
+class ContactResolver:
+    """
+    Map contact folder names to WhatsApp chat titles
+
+    Lookup order is the alias file (folder name -> chat title, maintained by hand), then
+    the cache of titles confirmed by earlier sends, then the folder name itself. Aliases
+    and cached titles are matched exactly, so repeat sends never fall back to a fuzzy
+    search. Names that could not be found are remembered for CONTACT_MISS_TTL seconds
+    and fail immediately instead of waiting for another search timeout.
+    """
+
+    def __init__(self, cache_path: str, aliases_path: str = None, miss_ttl: float = CONTACT_MISS_TTL):
+        self.cache_path = cache_path
+        self.aliases_path = aliases_path
+        self.miss_ttl = miss_ttl
+        self._lock = threading.Lock()
+        self._cache: Dict[str, str] = self._load_cache()
+        self._aliases: Dict[str, str] = {}
+        self._aliases_signature = None
+        self._misses: Dict[str, float] = {}
+        self.hits = 0
+        self.misses_reported = 0
+
+    def resolve(self, contact_name: str) -> ResolvedContact:
+        """
+        Return what to search for, raises ContactNotFoundError for a recent miss
+        """
+        key = normalize_contact_name(contact_name)
+        aliases = self._current_aliases()
+        with self._lock:
+            missed_at = self._misses.get(key)
+            if missed_at is not None:
+                if time.time() - missed_at < self.miss_ttl:
+                    self.misses_reported += 1
+                    raise ContactNotFoundError(f"Could not find contact: {contact_name} (not found recently)")
+                del self._misses[key]
+            if key in aliases:
+                self.hits += 1
+                return ResolvedContact(aliases[key], True, "alias")
+            if key in self._cache:
+                self.hits += 1
+                return ResolvedContact(self._cache[key], True, "cache")
+        return ResolvedContact(key, False, "folder")
+
+    def confirm(self, contact_name: str, chat_title: str) -> None:
+        """Remember the chat title a folder name opened"""
+        key = normalize_contact_name(contact_name)
+        with self._lock:
+            self._misses.pop(key, None)
+            if self._cache.get(key) == chat_title:
+                return
+            self._cache[key] = chat_title
+            self._save_cache()
+
+    def forget(self, contact_name: str) -> None:
+        """Drop a cached title, e.g. because the chat was renamed"""
+        key = normalize_contact_name(contact_name)
+        with self._lock:
+            if self._cache.pop(key, None) is not None:
+                self._save_cache()
+
+    def record_miss(self, contact_name: str) -> None:
+        """Remember that no chat matched this name"""
+        with self._lock:
+            self._misses[normalize_contact_name(contact_name)] = time.time()
+
+    def _current_aliases(self) -> Dict[str, str]:
+        """The alias file's mapping, re-read when the file changes"""
+        if not self.aliases_path:
+            return self._aliases
+        try:
+            stat = os.stat(self.aliases_path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+        if signature != self._aliases_signature:
+            aliases = {}
+            if signature is not None:
+                try:
+                    loaded = load_yaml_settings(self.aliases_path) or {}
+                    aliases = {normalize_contact_name(str(name)): str(title) for name, title in loaded.items()}
+                    logger.log_info(f"Loaded {len(aliases)} contact aliases from {self.aliases_path}")
+                except Exception as e:
+                    logger.log_error(e, f"Failed to load contact aliases from {self.aliases_path}")
+                    aliases = self._aliases
+            self._aliases = aliases
+            self._aliases_signature = signature
+        return self._aliases
+
+    def _load_cache(self) -> Dict[str, str]:
+        if not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as file:
+                return dict(json.load(file))
+        except Exception as e:
+            logger.log_error(e, f"Ignoring unreadable contact cache: {self.cache_path}")
+            return {}
+
+    def _save_cache(self) -> None:
+        """Write the cache atomically (lock held)"""
+        try:
+            temp_path = f"{self.cache_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(self._cache, file, ensure_ascii=False, indent=1, sort_keys=True)
+            os.replace(temp_path, self.cache_path)
+        except Exception as e:
+            logger.log_error(e, f"Failed to save contact cache to {self.cache_path}")
+
+
+_resolver: Optional[ContactResolver] = None
+_resolver_lock = threading.Lock()
+
+
+def get_contact_resolver() -> ContactResolver:
+    """The application's contact resolver, created on first use"""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                from src.core.config import config
+                _resolver = ContactResolver(
+                    os.path.join(config.data_dir, CONTACT_CACHE_FILE),
+                    os.path.join(os.path.dirname(settings_path()), CONTACT_ALIASES_FILE),
+                )
+    return _resolver
@@ -6,8 +6,11 @@ import time
 import os
 import subprocess
 import re
+import tempfile
+from typing import Optional
 from pywinauto.application import Application
-from pywinauto.findwindows import find_windows
+from pywinauto.controls.uiawrapper import UIAWrapper
+from pywinauto.findwindows import find_elements, find_windows
 from pywinauto.keyboard import send_keys
 from pywinauto.timings import wait_until
 import pyperclip
@@ -15,17 +18,39 @@ import time
 from pywinauto.keyboard import send_keys
 
 from src.core.logger import logger
+from src.core.metrics import metrics
 from src.core.whatsapp_constants import *
+from src.whatsapp.transport import ContactNotFoundError, WhatsAppTransport
+from src.whatsapp.waits import WaitTimeoutError, wait_for
+
+class WhatsAppDesktop(WhatsAppTransport):
+    """WhatsApp Desktop driven through UI Automation (pywinauto)"""
+
+    name = "desktop"
+
+    # Search criteria of the elements every send uses, resolved once per session
+    ELEMENTS = {
+        "search_box": {"auto_id": SEARCH_BOX_AUTO_ID, "class_name": SEARCH_BOX_CLASS},
+        "chat_list": {"auto_id": CHAT_LIST_AUTO_ID, "class_name": CHAT_LIST_CLASS, "title": CHAT_LIST_TITLE},
+        "message_box": {"auto_id": MESSAGE_BOX_AUTO_ID, "class_name": MESSAGE_BOX_CLASS},
+        "send_button": {"auto_id": SEND_BUTTON_AUTO_ID, "class_name": SEND_BUTTON_CLASS},
+    }
 
-class WhatsAppDesktop:
     def __init__(self):
         self.app = None
         self.main_window = None
+        self._window = None
+        self._element_cache = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_invalidations = 0
 
+    @metrics.timed("whatsapp_step", step="connect")
     def connect(self) -> bool:
         """Connect to WhatsApp desktop application or launch it if not running"""
         try:
             logger.log_info("Attempting to connect to WhatsApp...")
+            self._clear_element_cache()
             # Try to find existing WhatsApp window
             try:
                 self.app = Application(backend="uia").connect(title=WHATSAPP_WINDOW_TITLE)
@@ -65,6 +90,17 @@ class WhatsAppDesktop:
             logger.log_error(e, "Failed to connect to WhatsApp desktop")
             raise
 
+    def is_connected(self) -> bool:
+        """Cheap health check: the main window is still there and responding"""
+        try:
+            return self.main_window is not None and self.main_window.exists(timeout=0)
+        except Exception:
+            return False
+
+    def close(self) -> bool:
+        """Close WhatsApp application"""
+        return self.close_application()
+
     def close_application(self) -> bool:
         """Close WhatsApp application"""
         try:
@@ -78,6 +114,8 @@ class WhatsAppDesktop:
                 pass
 
             # Clear the references
+            logger.log_info(f"UI element cache stats: {self.element_cache_stats()}")
+            self._clear_element_cache()
             self.main_window = None
             self.app = None
             
@@ -88,8 +126,9 @@ class WhatsAppDesktop:
             logger.log_error(e, "Failed to close WhatsApp")
             raise
 
-    def open_chat(self, contact_name: str) -> bool:
-        """Open a chat with the specified contact"""
+    @metrics.timed("whatsapp_step", step="open_chat")
+    def open_chat(self, contact_name: str, exact: bool = False) -> bool:
+        """Open a chat with the specified contact, `exact` skips the substring match"""
         try:
             logger.log_info(f"Attempting to open chat with {contact_name}...")
             if not self.main_window:
@@ -97,65 +136,65 @@ class WhatsAppDesktop:
 
             # Find the search box
             logger.log_info("Looking for search box...")
-            search_box = self.main_window.child_window(
-                auto_id=SEARCH_BOX_AUTO_ID,
-                class_name=SEARCH_BOX_CLASS
-            )
+            search_box = self._element("search_box")
             
-            if not search_box.exists():
+            if search_box is None:
                 raise Exception("Could not find search box")
             
             # Focus and clear the search box
             logger.log_info("Clearing search box...")
             search_box.set_focus()
-            time.sleep(CLICK_DELAY)
+            wait_for(search_box.has_keyboard_focus, CLICK_TIMEOUT, "search_box_focus", required=False)
             search_box.type_keys('^a{BACKSPACE}')
-            time.sleep(CLICK_DELAY)
+            wait_for(lambda: not _element_text(search_box), CLICK_TIMEOUT, "search_box_clear", required=False)
             
             # Type the contact name
             logger.log_info(f"Typing contact name: {contact_name}")
             search_box.type_keys(contact_name, with_spaces=True)
-            time.sleep(SEARCH_DELAY)
             
             try:
                 # Find the ChatList
                 logger.log_info("Looking for chat list...")
-                chat_list = self.main_window.child_window(
-                    auto_id=CHAT_LIST_AUTO_ID,
-                    class_name=CHAT_LIST_CLASS,
-                    title=CHAT_LIST_TITLE
-                )
+                chat_list = self._element("chat_list")
                 
-                if not chat_list.exists():
+                if chat_list is None:
                     raise Exception("Could not find chat list")
 
                 # Find the contact
                 logger.log_info(f"Searching for contact: {contact_name}")
-                contact_element = chat_list.child_window(
-                    auto_id=CONTACT_TITLE_AUTO_ID,
-                    class_name=CONTACT_TITLE_CLASS,
-                    title_re=f".*{contact_name}.*",
-                    top_level_only=False,
-                    found_index=0
-                )
-
-                if contact_element.exists() and contact_element.is_visible():
-                    logger.log_info("Contact found, attempting to open chat...")
-                    # Click the parent ListItem
-                    parent = contact_element.parent()
-                    if parent and parent.element_info.control_type == "ListItem":
-                        parent.click_input()
-                        time.sleep(CHAT_OPEN_DELAY)
-                        logger.log_info("Chat opened successfully")
-                        return True
-                    else:
-                        # If parent check fails, try clicking the contact element directly
-                        contact_element.click_input()
-                        time.sleep(CHAT_OPEN_DELAY)
-                        logger.log_info("Chat opened successfully (direct click)")
+                found = []
+
+                def contact_visible():
+                    contact = self._find_contact(chat_list, contact_name, exact)
+                    if contact is not None and contact.is_visible():
+                        found.append(contact)
                         return True
-                
-                raise Exception(f"Could not find contact: {contact_name}")
+                    return False
+
+                # Wait for the search results instead of sleeping a fixed time
+                try:
+                    wait_for(contact_visible, SEARCH_TIMEOUT, "search_results")
+                except WaitTimeoutError:
+                    raise ContactNotFoundError(f"Could not find contact: {contact_name}")
+                contact_element = found[0]
+                self.last_chat_title = contact_element.window_text() or contact_name
+
+                logger.log_info("Contact found, attempting to open chat...")
+                # Click the parent ListItem
+                parent = contact_element.parent()
+                if parent and parent.element_info.control_type == "ListItem":
+                    parent.click_input()
+                    wait_for(lambda: parent.is_selected() and self._element("message_box", 0) is not None,
+                             CHAT_OPEN_TIMEOUT, "chat_open", required=False)
+                    logger.log_info("Chat opened successfully")
+                    return True
+                else:
+                    # If parent check fails, try clicking the contact element directly
+                    contact_element.click_input()
+                    wait_for(lambda: self._element("message_box", 0) is not None,
+                             CHAT_OPEN_TIMEOUT, "chat_open", required=False)
+                    logger.log_info("Chat opened successfully (direct click)")
+                    return True
                 
             except Exception as e:
                 logger.log_error(e, f"Failed to find and click contact: {contact_name}")
@@ -165,6 +204,7 @@ class WhatsAppDesktop:
             logger.log_error(e, f"Failed to open chat with {contact_name}")
             raise
 
+    @metrics.timed("whatsapp_step", step="send_message")
     def send_message(self, message: str) -> bool:
         """Send a message in the current chat"""
         try:
@@ -174,49 +214,44 @@ class WhatsAppDesktop:
 
             # Find the message input box
             logger.log_info("Looking for message input box...")
-            message_box = self.main_window.child_window(
-                auto_id=MESSAGE_BOX_AUTO_ID,
-                class_name=MESSAGE_BOX_CLASS
-            )
+            message_box = self._element("message_box")
             
-            if not message_box.exists():
+            if message_box is None:
                 raise Exception("Could not find message input box")
                 
             # Focus and clear existing text
             logger.log_info("Clearing message input box...")
             message_box.set_focus()
-            time.sleep(CLICK_DELAY)
+            wait_for(message_box.has_keyboard_focus, CLICK_TIMEOUT, "message_box_focus", required=False)
             message_box.type_keys('^a{BACKSPACE}')
-            time.sleep(CLICK_DELAY)
+            wait_for(lambda: not _element_text(message_box), CLICK_TIMEOUT, "message_box_clear", required=False)
 
             # Copy the message to clipboard
             logger.log_info("Copying message to clipboard...")
             pyperclip.copy(message)
-            time.sleep(CLICK_DELAY)  # Wait for clipboard to be ready
+            wait_for(lambda: pyperclip.paste() == message, CLICK_TIMEOUT, "clipboard_ready", required=False)
             logger.log_info(f"Message copied to clipboard: {message}")
 
             # Paste the message
             logger.log_info("Focusing on message input box...")
             message_box.click_input()
-            time.sleep(CLICK_DELAY)
+            wait_for(message_box.has_keyboard_focus, CLICK_TIMEOUT, "message_box_focus", required=False)
 
             logger.log_info("Pasting message into input box...")
             send_keys('^v')  # Ctrl + V to paste
-            time.sleep(CLICK_DELAY)         
+            wait_for(lambda: bool(_element_text(message_box)), CLICK_TIMEOUT, "message_pasted", required=False)
             
             # Find and click the send button
             logger.log_info("Looking for send button...")
-            send_button = self.main_window.child_window(
-                auto_id=SEND_BUTTON_AUTO_ID,
-                class_name=SEND_BUTTON_CLASS
-            )
+            send_button = self._element("send_button")
             
-            if not send_button.exists():
+            if send_button is None:
                 raise Exception("Could not find send button")
                 
             logger.log_info("Clicking send button...")
             send_button.click_input()
-            time.sleep(MESSAGE_SEND_DELAY)
+            # The input box empties once WhatsApp has taken the message
+            wait_for(lambda: not _element_text(message_box), MESSAGE_SEND_TIMEOUT, "message_sent", required=False)
             
             logger.log_info("Message sent successfully")
             return True
@@ -224,3 +259,104 @@ class WhatsAppDesktop:
         except Exception as e:
             logger.log_error(e, "Failed to send message")
             raise
+
+    def element_tree(self, depth: int = None) -> Optional[str]:
+        """The WhatsApp window's control identifiers as text"""
+        if not self.main_window:
+            return None
+        try:
+            # pywinauto only prints the identifiers to stdout or a file
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "element_tree.txt")
+                self.main_window.print_control_identifiers(depth=depth, filename=path)
+                with open(path, 'r', encoding='utf-8', errors='replace') as file:
+                    return file.read()
+        except Exception as e:
+            logger.log_error(e, "Failed to dump WhatsApp element tree")
+            return None
+
+    def element_cache_stats(self) -> dict:
+        """Hit/miss counters of the UI element cache"""
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "invalidations": self.cache_invalidations,
+            "cached": len(self._element_cache),
+        }
+
+    def _element(self, key: str, timeout: float = ELEMENT_FIND_TIMEOUT):
+        """
+        Return the resolved wrapper for one of ELEMENTS, or None if it cannot be found
+
+        Wrappers are reused while their UIA runtime id still matches, which costs one
+        property read instead of a search through the whole WhatsApp element tree.
+        """
+        self._validate_window()
+        cached = self._element_cache.get(key)
+        if cached is not None:
+            wrapper, runtime_id = cached
+            if _runtime_id(wrapper) == runtime_id:
+                self.cache_hits += 1
+                metrics.inc("ui_element_lookups_total", result="hit")
+                return wrapper
+            del self._element_cache[key]
+            self.cache_invalidations += 1
+
+        self.cache_misses += 1
+        metrics.inc("ui_element_lookups_total", result="miss")
+        try:
+            wrapper = self.main_window.child_window(**self.ELEMENTS[key]).wait("exists", timeout=timeout)
+        except Exception:
+            return None
+        self._element_cache[key] = (wrapper, _runtime_id(wrapper))
+        return wrapper
+
+    def _validate_window(self) -> None:
+        """Drop every cached element when the main window was recreated"""
+        if self._window is not None and _runtime_id(self._window[0]) == self._window[1]:
+            return
+        if self._element_cache:
+            self.cache_invalidations += len(self._element_cache)
+            self._element_cache.clear()
+        window = self.main_window.wrapper_object()
+        self._window = (window, _runtime_id(window))
+
+    def _clear_element_cache(self) -> None:
+        self._element_cache.clear()
+        self._window = None
+
+    def _find_contact(self, chat_list, contact_name: str, exact: bool = False):
+        """
+        Search the chat list (not the whole window) for the contact's title element
+
+        An exact title match is preferred. Unless `exact` is set, a title containing the
+        name is accepted as well; the name is escaped so characters like "(" or "." in
+        case names are matched literally.
+        """
+        criteria = dict(
+            parent=chat_list.element_info,
+            auto_id=CONTACT_TITLE_AUTO_ID,
+            class_name=CONTACT_TITLE_CLASS,
+            top_level_only=False,
+            backend="uia"
+        )
+        elements = find_elements(title=contact_name, **criteria)
+        if not elements and not exact:
+            elements = find_elements(title_re=f".*{re.escape(contact_name)}.*", **criteria)
+        return UIAWrapper(elements[0]) if elements else None
+
+
+def _runtime_id(wrapper):
+    """UIA runtime id of a wrapper, None once the element is gone"""
+    try:
+        return tuple(wrapper.element_info.runtime_id)
+    except Exception:
+        return None
+
+
+def _element_text(element) -> str:
+    """Return the text typed into an edit control, falling back to its window text"""
+    try:
+        return element.get_value() or ""
+    except Exception:
+        return element.window_text() or ""
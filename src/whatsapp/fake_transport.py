@@ -0,0 +1,123 @@
+"""
+Deterministic in-memory WhatsApp transport for load tests and CI
+"""
+
+import random
+import threading
+import time
+from typing import Iterable, List, NamedTuple, Optional
+from src.core.logger import logger
+from src.core.metrics import metrics
+from src.whatsapp.transport import ContactNotFoundError, WhatsAppTransport
+
+
+class FakeTransportError(Exception):
+    """Failure injected by FakeTransport"""
+
+
+class SentMessage(NamedTuple):
+    contact_name: str
+    message: str
+    sent_at: float
+
+
+class FakeTransport(WhatsAppTransport):
+    """
+    WhatsApp backend that records messages instead of driving a UI
+
+    Every step sleeps for `latency` seconds (plus up to `jitter` seconds), and fails with
+    FakeTransportError with probability `failure_rate` or always for steps listed in
+    `fail_steps`. Randomness comes from a seeded generator so runs are reproducible.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, connect_latency: float = 0.0,
+                 failure_rate: float = 0.0, fail_steps: Iterable[str] = (), contacts: Optional[Iterable[str]] = None,
+                 seed: int = 0):
+        """
+        Args:
+            latency: Seconds each open_chat/send_message call takes
+            jitter: Extra random seconds added to each step
+            connect_latency: Seconds connect() takes, e.g. to mimic an application launch
+            failure_rate: Probability (0-1) that any step fails
+            fail_steps: Steps that always fail ("connect", "open_chat", "send_message")
+            contacts: Known chat titles, None accepts every contact
+            seed: Seed for the latency jitter and failure injection
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.connect_latency = connect_latency
+        self.failure_rate = failure_rate
+        self.fail_steps = set(fail_steps)
+        self.contacts = set(contacts) if contacts is not None else None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.connected = False
+        self.current_chat = None
+        self.sent: List[SentMessage] = []
+        self.calls = {"connect": 0, "open_chat": 0, "send_message": 0, "close": 0}
+        self.failures = 0
+
+    @metrics.timed("whatsapp_step", step="connect")
+    def connect(self) -> bool:
+        self._step("connect", self.connect_latency)
+        self.connected = True
+        self.current_chat = None
+        return True
+
+    @metrics.timed("whatsapp_step", step="open_chat")
+    def open_chat(self, contact_name: str, exact: bool = False) -> bool:
+        self._require_connection()
+        self._step("open_chat", self.latency)
+        chat_title = contact_name
+        if self.contacts is not None:
+            if exact or contact_name in self.contacts:
+                matches = [contact_name] if contact_name in self.contacts else []
+            else:
+                matches = sorted(title for title in self.contacts if contact_name in title)
+            if not matches:
+                raise ContactNotFoundError(f"Could not find contact: {contact_name}")
+            chat_title = matches[0]
+        self.current_chat = chat_title
+        self.last_chat_title = chat_title
+        return True
+
+    @metrics.timed("whatsapp_step", step="send_message")
+    def send_message(self, message: str) -> bool:
+        self._require_connection()
+        if self.current_chat is None:
+            raise FakeTransportError("No chat is open")
+        self._step("send_message", self.latency)
+        with self._lock:
+            self.sent.append(SentMessage(self.current_chat, message, time.time()))
+        return True
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def close(self) -> bool:
+        self.calls["close"] += 1
+        self.connected = False
+        self.current_chat = None
+        return True
+
+    def element_tree(self, depth: int = None) -> Optional[str]:
+        return f"connected={self.connected} current_chat={self.current_chat} calls={dict(self.calls)}\n"
+
+    def _require_connection(self):
+        if not self.connected:
+            raise FakeTransportError("Fake transport is not connected")
+
+    def _step(self, step: str, latency: float) -> None:
+        """Count the call, sleep for its latency and inject failures"""
+        with self._lock:
+            self.calls[step] += 1
+            delay = latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = step in self.fail_steps or (self.failure_rate and self._random.random() < self.failure_rate)
+        if delay:
+            time.sleep(delay)
+        if fail:
+            self.failures += 1
+            logger.log_debug("Fake transport injected a failure in %s", step)
+            raise FakeTransportError(f"Injected failure in {step}")
@@ -5,106 +5,152 @@ WhatsApp message sender
 from pathlib import Path
 from src.core.config import config
 from src.core.logger import logger
-from src.whatsapp.desktop_utils import WhatsAppDesktop
-import urllib.parse
+from src.core.metrics import metrics
+from src.core.outbox import RENDERED, SENDING, Outbox
+from src.core.templates import get_template_registry
+from src.whatsapp.contacts import ContactResolver, ResolvedContact, get_contact_resolver, normalize_contact_name
+from src.whatsapp.session import WhatsAppSession, get_session
+from src.whatsapp.transport import ContactNotFoundError, WhatsAppTransport
 from datetime import datetime
 from hijri_converter import convert
-import os
 from src.core.constants import *
 
 class WhatsAppSender:
-    def __init__(self):
-        self.whatsapp = WhatsAppDesktop()
+    def __init__(self, session: WhatsAppSession = None, outbox: Outbox = None, resolver: ContactResolver = None):
+        # All senders share one long-lived WhatsApp session unless told otherwise
+        self.session = session or get_session()
+        # Delivery progress is recorded in the outbox when one is given
+        self.outbox = outbox
+        self.resolver = resolver or get_contact_resolver()
 
     def send_message_to_contact(self, contact_name: str, message: str) -> bool:
         """Send a message to a contact via WhatsApp"""
         try:
-            # Connect to WhatsApp
-            if not self.whatsapp.connect():
-                return False
+            # Contacts that were just not found fail here, before WhatsApp is touched
+            resolved = self.resolver.resolve(contact_name)
+            missing = None
 
-            # Open chat
-            if not self.whatsapp.open_chat(contact_name):
-                self.whatsapp.close_application()
-                return False
+            # The session connects (or reconnects) WhatsApp and keeps it open afterwards
+            with self.session.acquire() as whatsapp:
+                try:
+                    # Open chat
+                    opened = self._open_chat(whatsapp, contact_name, resolved)
+                except ContactNotFoundError as e:
+                    # A missing chat says nothing about the session, keep WhatsApp open
+                    missing = e
+                else:
+                    if not opened:
+                        self.session.reset_after_failure()
+                        return False
+
+                    # Send message
+                    if not whatsapp.send_message(message):
+                        self.session.reset_after_failure()
+                        return False
 
-            # Send message
-            if not self.whatsapp.send_message(message):
-                self.whatsapp.close_application()
-                return False
+            if missing is not None:
+                self.resolver.record_miss(contact_name)
+                raise missing
 
             logger.log_info(f"Successfully sent message to {contact_name}")
-            
-            # Close WhatsApp after sending
-            self.whatsapp.close_application()
             return True
 
         except Exception as e:
             logger.log_error(e, f"Failed to send message to {contact_name}")
-            self.whatsapp.close_application()
             raise 
 
+    def _open_chat(self, whatsapp: WhatsAppTransport, contact_name: str, resolved: ResolvedContact) -> bool:
+        """Open the resolved chat and remember its title for the next send"""
+        try:
+            opened = whatsapp.open_chat(resolved.title, exact=resolved.exact)
+        except ContactNotFoundError:
+            if resolved.source != "cache":
+                raise
+            # The chat was renamed since it was cached, search by folder name again
+            logger.log_warning(f"Cached chat '{resolved.title}' for {contact_name} no longer exists, searching again")
+            self.resolver.forget(contact_name)
+            resolved = ResolvedContact(normalize_contact_name(contact_name), False, "folder")
+            opened = whatsapp.open_chat(resolved.title, exact=False)
+        if opened:
+            chat_title = whatsapp.last_chat_title or resolved.title
+            if chat_title != resolved.title:
+                logger.log_info(f"Contact {contact_name} resolved to chat '{chat_title}'")
+            self.resolver.confirm(contact_name, chat_title)
+        return opened
+
     def notify_file_ready(self, file_path: str) -> bool:
         """Notify contact about files being ready"""
+        return self.notify_files_ready([file_path])
+
+    def notify_files_ready(self, file_paths: list) -> bool:
+        """Send one notification for a batch of files that belong to the same contact"""
+        file_path = file_paths[0]
         try:
-            contact_name, folder_name = self._get_contact_name_and_relative_folder(file_path)
-            parent_folder = Path(file_path).parent
-            files = []
-            for pattern in config.file_patterns:
-                files.extend(parent_folder.glob(pattern))
-            Folder_Name_Encoded = urllib.parse.quote(contact_name)
-            full_sharepoint_path = config.root_path + "/" + Folder_Name_Encoded
-
-            if config.TempMessageForGroupPath:
-                logger.log_info(f"Using custom message template from {os.path.abspath(config.TempMessageForGroupPath)}")
-                with open(os.path.abspath(config.TempMessageForGroupPath), 'r', encoding='utf-8') as file:
-                    lines = file.readlines()
-                    message_content = ''.join(lines)
-                    today_gregorian = datetime.today()
-                    hijri_date = convert.Gregorian(today_gregorian.year, today_gregorian.month, today_gregorian.day).to_hijri()
-                    formatted_message = message_content.replace('{memo_date}', f"*{hijri_date.day}/{hijri_date.month}/{hijri_date.year}*") \
-                                                    .replace('{memo_gregorian_date}', f"*{today_gregorian.strftime(GREGORIAN_DATE_FORMAT)}*") \
-                                                    .replace('{folder_name}', f"*_{folder_name}_*") \
-                                                    .replace('{memo_link}', f"*{full_sharepoint_path}*") \
-                                                    .replace('{file_name}', f"*{', '.join(f.name for f in files)}*")
-                    message = f"{formatted_message}"
-            return self.send_message_to_contact(contact_name, message)
+            with metrics.span("render"):
+                route = config.route_for(file_path)
+                contact_name, folder_name = route.contact, route.relative_folder
+                template = get_template_registry(route.template_path).for_folder(folder_name)
+                parent_folders = [Path(file_path).parent]
+                for other_path in file_paths[1:]:
+                    other = config.route_for(other_path)
+                    if other.contact != contact_name or other.root is not route.root:
+                        raise Exception(f"Batch mixes contacts '{contact_name}' and '{other.contact}'")
+                    if Path(other_path).parent not in parent_folders:
+                        parent_folders.append(Path(other_path).parent)
+                        folder_name = f"{folder_name}, {other.relative_folder}"
+                files = []
+                for parent_folder in parent_folders:
+                    files.extend(Path(path) for path in route.root.file_filter.matching_files(parent_folder))
+
+                today_gregorian = datetime.today()
+                hijri_date = convert.Gregorian(today_gregorian.year, today_gregorian.month, today_gregorian.day).to_hijri()
+                message = template.render({
+                    "memo_date": f"*{hijri_date.day}/{hijri_date.month}/{hijri_date.year}*",
+                    "memo_gregorian_date": f"*{today_gregorian.strftime(GREGORIAN_DATE_FORMAT)}*",
+                    "folder_name": f"*_{folder_name}_*",
+                    "memo_link": f"*{route.link}*",
+                    "file_name": f"*{', '.join(f.name for f in files)}*",
+                })
+            if self.outbox is not None:
+                self.outbox.mark(file_paths, RENDERED)
+            with metrics.span("send"):
+                if self.outbox is not None:
+                    self.outbox.mark(file_paths, SENDING)
+                return self.send_message_to_contact(contact_name, message)
         except Exception as e:
-            logger.log_error(e, f"Failed to notify about files in {file_path}")
-            self.whatsapp.close_application()
+            logger.log_error(e, f"Failed to notify about files in {', '.join(file_paths)}")
             raise
 
+    def get_batch_key(self, file_path: str) -> str:
+        """Files with the same key can share one notification: same watch root and contact"""
+        route = config.route_for(file_path)
+        return f"{route.root.name}/{route.contact}"
+
+    def get_contact_and_folder(self, file_path: str) -> tuple:
+        """Return (contact_name, relative_folder) for a file"""
+        return self._get_contact_name_and_relative_folder(file_path)
+
     def _get_contact_name_and_relative_folder(self, file_path: str) -> tuple:
         """
         Extract contact name and full relative folder path from file path
         Returns tuple of (contact_name, relative_folder_path)
         """
         try:
-            path = Path(file_path)
-            abs_path = path.absolute()
-            parts = abs_path.parts
-            try:
-                index = parts.index(MAIN_WATCH_FOLDER_NAME)
-                if index + 1 < len(parts):
-                    contact_name = parts[index + 1]
-                else:
-                    raise Exception(f"No folder found after '{MAIN_WATCH_FOLDER_NAME}' in path: {file_path}")
-            except ValueError:
-                raise Exception(f"Could not find '{MAIN_WATCH_FOLDER_NAME}' in path: {file_path}")
-            main_folder = Path(config.folder_to_watch)
-            try:
-                relative_folder = str(path.parent.relative_to(main_folder))
-            except Exception:
-                relative_folder = path.parent.name
-            logger.log_info(f"Contact name: {contact_name}, Relative folder: {relative_folder} from path: {file_path}")
+            # Each watch root has its own rule for which folder is the contact, routes may override it
+            route = config.route_for(file_path)
+            contact_name, relative_folder = route.contact, route.relative_folder
+            logger.log_debug("Contact name: %s, Relative folder: %s from path: %s", contact_name, relative_folder, file_path)
             return contact_name, relative_folder
         except Exception as e:
             logger.log_error(e, f"Error extracting names from file path: {file_path}")
             raise
 
-# Create global sender instance
-sender = WhatsAppSender()
+_sender = None
+
 
 def send_file_via_whatsapp(file_path: str) -> bool:
     """Wrapper function for backward compatibility"""
-    return sender.notify_file_ready(file_path) 
\ No newline at end of file
+    global _sender
+    if _sender is None:
+        _sender = WhatsAppSender()
+    return _sender.notify_file_ready(file_path) 
\ No newline at end of file
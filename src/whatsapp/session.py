@@ -0,0 +1,125 @@
+"""
+Long-lived WhatsApp session shared by all sends
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+from src.core.logger import logger
+from src.core.whatsapp_constants import *
+from src.whatsapp.transport import WhatsAppTransport, create_transport
+
+
+class WhatsAppSession:
+    """
+    Keep one connected WhatsApp transport alive across sends
+
+    The application is launched on first use and health-checked before every send.
+    After a failed send it is closed so the next send starts from a clean window.
+    It is only closed otherwise by close_if_idle() after `idle_timeout` seconds without
+    work, so consecutive messages cost a chat switch instead of an application start.
+    The session starts no thread of its own: close_if_idle() is called periodically on
+    the WhatsApp UI executor, like every other UI call.
+
+    With `keep_failure_tree` set, the element tree is dumped right before a failed send
+    resets the session, on the sending thread and under the session lock, and kept
+    for diagnostics until the next acquire.
+    """
+
+    def __init__(self, transport_factory: Callable[[], WhatsAppTransport] = create_transport,
+                 idle_timeout: float = SESSION_IDLE_TIMEOUT):
+        self.transport_factory = transport_factory
+        self.idle_timeout = idle_timeout
+        self.transport = None
+        self._lock = threading.RLock()
+        self._last_used = 0.0
+        self.connects = 0
+        self.reconnects = 0
+        self.keep_failure_tree = False
+        self.tree_depth = None
+        self._failure_tree: Optional[str] = None
+
+    @contextmanager
+    def acquire(self):
+        """Yield a connected transport, one user at a time"""
+        with self._lock:
+            self._failure_tree = None
+            try:
+                yield self._ensure_connected()
+            except Exception:
+                self.reset_after_failure()
+                raise
+            finally:
+                self._last_used = time.time()
+
+    def reset(self) -> None:
+        """Close the application so the next acquire reconnects from scratch"""
+        with self._lock:
+            if self.transport is None:
+                return
+            try:
+                self.transport.close()
+            except Exception as e:
+                logger.log_error(e, "Failed to close WhatsApp while resetting session")
+            self.transport = None
+
+    def reset_after_failure(self) -> None:
+        """Reset after a failed send, keeping the element tree first when asked to"""
+        with self._lock:
+            if self.keep_failure_tree and self.transport is not None:
+                try:
+                    self._failure_tree = self.transport.element_tree(self.tree_depth)
+                except Exception as e:
+                    logger.log_error(e, "Failed to dump WhatsApp element tree")
+            self.reset()
+
+    def take_failure_tree(self) -> Optional[str]:
+        """The element tree kept by the last failed send, None if there is none"""
+        with self._lock:
+            tree, self._failure_tree = self._failure_tree, None
+            return tree
+
+    def probe(self) -> bool:
+        """Health check for the circuit breaker: connect (or reconnect) WhatsApp if needed"""
+        with self.acquire() as transport:
+            return transport.is_connected()
+
+    def close(self) -> None:
+        """Close the session, e.g. on shutdown"""
+        with self._lock:
+            self.reset()
+
+    def _ensure_connected(self) -> WhatsAppTransport:
+        """Return the current transport if healthy, otherwise (re)connect"""
+        if self.transport is not None and self.transport.is_connected():
+            return self.transport
+        if self.transport is not None:
+            logger.log_warning("WhatsApp session is no longer healthy, reconnecting...")
+            self.reconnects += 1
+        transport = self.transport_factory()
+        transport.connect()
+        self.transport = transport
+        self.connects += 1
+        return transport
+
+    def close_if_idle(self) -> None:
+        """Close WhatsApp when nothing was sent for `idle_timeout` seconds, 0 keeps it open"""
+        with self._lock:
+            if self.idle_timeout <= 0 or self.transport is None or time.time() - self._last_used < self.idle_timeout:
+                return
+            logger.log_info(f"No messages for {self.idle_timeout:.0f} seconds, closing WhatsApp")
+            self.reset()
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> WhatsAppSession:
+    """Return the process-wide WhatsApp session, creating it on first use"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = WhatsAppSession()
+        return _session
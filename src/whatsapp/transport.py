@@ -0,0 +1,72 @@
+"""
+Transport interface between WhatsAppSender and a WhatsApp backend
+"""
+
+from abc import ABC, abstractmethod
+from typing import Optional
+from src.core.logger import logger
+from src.core.whatsapp_constants import *
+
+
+class ContactNotFoundError(Exception):
+    """The requested chat does not exist in WhatsApp"""
+
+
+class WhatsAppTransport(ABC):
+    """
+    The operations WhatsAppSender needs from a WhatsApp backend
+
+    Implementations raise on failure, like WhatsAppDesktop always has.
+    """
+
+    name = "transport"
+    # Title of the chat the last open_chat call opened, the canonical name of that contact
+    last_chat_title = None
+
+    @abstractmethod
+    def connect(self) -> bool:
+        """Connect to (or launch) the backend"""
+
+    @abstractmethod
+    def open_chat(self, contact_name: str, exact: bool = False) -> bool:
+        """
+        Open the chat with the given contact
+
+        With `exact` the chat title must equal `contact_name`, otherwise it only has to
+        contain it. Raises ContactNotFoundError when no chat matches.
+        """
+
+    @abstractmethod
+    def send_message(self, message: str) -> bool:
+        """Send a message in the currently open chat"""
+
+    @abstractmethod
+    def is_connected(self) -> bool:
+        """Cheap health check used before reusing a connection"""
+
+    @abstractmethod
+    def close(self) -> bool:
+        """Disconnect from (or close) the backend"""
+
+    def element_tree(self, depth: int = None) -> Optional[str]:
+        """Text dump of the backend's UI state for diagnostics, None if unsupported"""
+        return None
+
+
+def create_transport(name: str = WHATSAPP_TRANSPORT) -> WhatsAppTransport:
+    """
+    Build a transport by name
+
+    Args:
+        name: "desktop" for WhatsApp Desktop UI automation (Windows only) or
+              "fake" for the in-memory backend used on CI and in benchmarks
+    """
+    if name == "desktop":
+        # Imported lazily: pywinauto only exists on Windows
+        from src.whatsapp.desktop_utils import WhatsAppDesktop
+        return WhatsAppDesktop()
+    if name == "fake":
+        from src.whatsapp.fake_transport import FakeTransport
+        return FakeTransport(latency=FAKE_TRANSPORT_LATENCY, failure_rate=FAKE_TRANSPORT_FAILURE_RATE)
+    logger.log_error(None, f"Unknown WhatsApp transport: {name}")
+    raise ValueError(f"Unknown WhatsApp transport: {name}")
@@ -0,0 +1,97 @@
+"""
+Condition-based waiting for UI automation steps
+"""
+
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Callable
+from src.core.logger import logger
+from src.core.metrics import metrics
+from src.core.whatsapp_constants import *
+
+
+class WaitTimeoutError(Exception):
+    """Raised when a required condition does not become true in time"""
+
+
+class WaitStats:
+    """Observed wait durations per step, used to tune the timeouts from real data"""
+
+    def __init__(self, samples: int = WAIT_STATS_SAMPLES):
+        self._lock = threading.Lock()
+        self._durations = defaultdict(lambda: deque(maxlen=samples))
+        self._counts = defaultdict(int)
+        self._timeouts = defaultdict(int)
+
+    def record(self, name: str, duration: float, timed_out: bool) -> None:
+        with self._lock:
+            self._durations[name].append(duration)
+            self._counts[name] += 1
+            if timed_out:
+                self._timeouts[name] += 1
+
+    def summary(self) -> dict:
+        """Count, timeouts and p50/p95/max of the recent samples for every step"""
+        with self._lock:
+            result = {}
+            for name, durations in self._durations.items():
+                ordered = sorted(durations)
+                result[name] = {
+                    "count": self._counts[name],
+                    "timeouts": self._timeouts[name],
+                    "p50": round(ordered[len(ordered) // 2], 3),
+                    "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+                    "max": round(ordered[-1], 3),
+                }
+            return result
+
+    def log_summary(self) -> None:
+        summary = self.summary()
+        if summary:
+            logger.log_info(f"UI wait times (seconds): {summary}")
+
+
+wait_stats = WaitStats()
+
+
+def wait_for(condition: Callable[[], bool], timeout: float, name: str, required: bool = True) -> float:
+    """
+    Poll `condition` with exponential backoff until it returns True
+
+    Starts at WAIT_INITIAL_INTERVAL and doubles up to WAIT_MAX_INTERVAL, so a responsive UI
+    is detected within milliseconds while a slow one is not hammered. Exceptions from the
+    condition count as "not yet", UIA elements are often briefly unavailable while redrawn.
+
+    Args:
+        condition: Callable returning True once the expected UI state is reached
+        timeout: Maximum seconds to wait
+        name: Step name used for the wait statistics
+        required: Raise WaitTimeoutError on timeout, otherwise log a warning and continue
+
+    Returns:
+        float: Seconds waited
+    """
+    start = time.perf_counter()
+    interval = WAIT_INITIAL_INTERVAL
+    while True:
+        try:
+            if condition():
+                elapsed = time.perf_counter() - start
+                wait_stats.record(name, elapsed, False)
+                metrics.observe("ui_wait_seconds", elapsed, help_text="UI condition wait time", step=name)
+                return elapsed
+        except Exception:
+            pass
+
+        elapsed = time.perf_counter() - start
+        remaining = timeout - elapsed
+        if remaining <= 0:
+            wait_stats.record(name, elapsed, True)
+            metrics.inc("ui_wait_timeouts_total", help_text="UI condition waits that timed out", step=name)
+            if required:
+                raise WaitTimeoutError(f"Timed out after {timeout}s waiting for {name}")
+            logger.log_warning(f"Timed out after {timeout}s waiting for {name}, continuing")
+            return elapsed
+        time.sleep(min(interval, remaining))
+        interval = min(interval * WAIT_BACKOFF, WAIT_MAX_INTERVAL)